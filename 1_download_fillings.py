@@ -2,6 +2,7 @@ import os
 from bs4 import BeautifulSoup
 import re
 from secedgar import FilingType, CompanyFilings
+from instrumentation import traced
 
 # Function to read file content with error handling
 def read_file(file_path):
@@ -25,28 +26,42 @@ def save_html(html_content, output_path):
     except Exception as e:
         print(f"Error saving HTML to {output_path}: {e}")
 
+# Companies whose latest filing is downloaded
+CIK_LOOKUP = [
+    'aapl', 'msft', 'fb', 'amzn', 'goog', 'tsla', 'brk-a', 
+    'v', 'jnj', 'wmt', 'jpm', 'nvda', 'pg', 'hd', 'dis', 
+    'pypl', 'cmcsa', 'adbe', 'nflx', 'intc', 'csco', 'pfe',
+    'ko', 'pep', 'dell', 'mrk', 'xom', 'nke', 'ibm', 'orcl', 
+    'crm', 'c', 'ba', 'mcd', 'cost', 'abt', 'cvx', 'lloyd', 
+    'ms', 'hsbc', 'hpe', 'gs', 'bac', 'wfc', 'axp', 'tsm', 
+    'hdb', 'sne', 'unh', 'mpc',  'fxe', 'uup', 'fxb', 'fxc',
+    'fxa', 'fxy', 'fxf', 'cew', 'cyb', 'icln', 'googl', 'baba', 
+    'nflx', 'bidu', 'twtr', 'spot', 'uber', 
+    'lyft', 'snap', 'zm', 'docu', 'sq', 'shop', 'roku', 
+    'amd', 'avgo', 'qcom', 'mu', 'mrna', 'regn', 'amgn', 
+    't', 'vz', 'tmus', 'sbux', 'nke', 'lmt', 'rtx', 
+    'cat', 'mmm'
+]
+FILING_TYPE = FilingType.FILING_10Q
+USER_AGENT = "Your Name (your.email@example.com)"
+
+# Function to download the latest filings of one company into ticker_dir
+@traced("download", company="ticker")
+def download_ticker(ticker, ticker_dir, count=1):
+    all_filings = CompanyFilings(
+        cik_lookup=[ticker],
+        filing_type=FILING_TYPE,
+        user_agent=USER_AGENT,
+        count=count
+    )
+    os.makedirs(ticker_dir, exist_ok=True)
+    all_filings.save(ticker_dir)
+
 # Function to download filings if not already downloaded
 def download_filings():
     save_dir = "annual_reports"
-    cik_lookup = [
-        'aapl', 'msft', 'fb', 'amzn', 'goog', 'tsla', 'brk-a', 
-        'v', 'jnj', 'wmt', 'jpm', 'nvda', 'pg', 'hd', 'dis', 
-        'pypl', 'cmcsa', 'adbe', 'nflx', 'intc', 'csco', 'pfe',
-        'ko', 'pep', 'dell', 'mrk', 'xom', 'nke', 'ibm', 'orcl', 
-        'crm', 'c', 'ba', 'mcd', 'cost', 'abt', 'cvx', 'lloyd', 
-        'ms', 'hsbc', 'hpe', 'gs', 'bac', 'wfc', 'axp', 'tsm', 
-        'hdb', 'sne', 'unh', 'mpc',  'fxe', 'uup', 'fxb', 'fxc',
-        'fxa', 'fxy', 'fxf', 'cew', 'cyb', 'icln', 'googl', 'baba', 
-        'nflx', 'bidu', 'twtr', 'spot', 'uber', 
-        'lyft', 'snap', 'zm', 'docu', 'sq', 'shop', 'roku', 
-        'amd', 'avgo', 'qcom', 'mu', 'mrna', 'regn', 'amgn', 
-        't', 'vz', 'tmus', 'sbux', 'nke', 'lmt', 'rtx', 
-        'cat', 'mmm'
-    ]
-    filing_type = FilingType.FILING_10Q
-    user_agent = "Your Name (your.email@example.com)"
 
-    for ticker in cik_lookup:
+    for ticker in CIK_LOOKUP:
         ticker_dir = os.path.join(save_dir, ticker)
         
         # Check if filings are already downloaded
@@ -56,14 +71,7 @@ def download_filings():
         
         # Download filings
         try:
-            all_filings = CompanyFilings(
-                cik_lookup=[ticker],
-                filing_type=filing_type,
-                user_agent=user_agent,
-                count=1
-            )
-            os.makedirs(ticker_dir, exist_ok=True)
-            all_filings.save(ticker_dir)
+            download_ticker(ticker, ticker_dir)
             print(f"Downloaded and saved filings for '{ticker}' in '{ticker_dir}'")
         except Exception as e:
             print(f"Error downloading filings for '{ticker}': {e}")
@@ -1,6 +1,6 @@
 import os
 from bs4 import BeautifulSoup
-from secedgar import FilingType, CompanyFilings
+from instrumentation import count, traced
 
 # Function to read file content with error handling
 def read_file(file_path):
@@ -49,6 +49,9 @@ def log_processed_file(file_name, log_file):
 
 # Function to download filings with error handling
 def download_filings():
+    # Imported here so the conversion functions work offline without secedgar installed
+    from secedgar import FilingType, CompanyFilings
+
     cik_lookup = [
         'aapl', 'msft', 'fb', 'amzn', 'goog', 'tsla', 'brk-a', 
         'v', 'jnj', 'wmt', 'jpm', 'nvda', 'pg', 'hd', 'dis', 
@@ -90,6 +93,18 @@ def download_filings():
         except Exception as e:
             print(f"Error downloading filings for {cik}: {e}")
 
+# Function to convert one downloaded filing to HTML; returns False when it could not be parsed
+@traced("convert", file="file_path")
+def convert_filing(file_path, output_html_path):
+    content = read_file(file_path)
+    count("bytes_read", len(content) if content else 0)
+    parsed_content = generate_html(content) if content else None
+    if not parsed_content:
+        return False
+    os.makedirs(os.path.dirname(output_html_path), exist_ok=True)
+    save_html(parsed_content, output_html_path)
+    return True
+
 # Function to convert downloaded filings to HTML with logging
 def convert_filings_to_html():
     directory = "annual_reports"
@@ -105,13 +120,9 @@ def convert_filings_to_html():
                     continue
 
                 file_path = os.path.join(root, file)
-                content = read_file(file_path)
-                parsed_content = generate_html(content)
-                
-                if parsed_content:
-                    output_html_path = os.path.join(output_directory, os.path.relpath(file_path, directory)).replace(".txt", ".html")
-                    os.makedirs(os.path.dirname(output_html_path), exist_ok=True)
-                    save_html(parsed_content, output_html_path)
+                output_html_path = os.path.join(output_directory, os.path.relpath(file_path, directory)).replace(".txt", ".html")
+
+                if convert_filing(file_path, output_html_path):
                     print(f"Saved to {output_html_path}")
 
                     log_processed_file(file, log_file)
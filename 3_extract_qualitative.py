@@ -3,6 +3,7 @@ import re
 import logging
 from lxml import etree
 from html import unescape
+from instrumentation import count, traced
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -17,8 +18,11 @@ FX_KEYWORDS = {kw.lower() for kw in [
 ]}
 
 # Function to extract FX-related content and metadata from a large HTML file
+@traced("extract", file="html_path")
 def extract_fx_related_content_large_file(html_path):
     try:
+        count("bytes_read", os.path.getsize(html_path))
+        paragraphs_seen = 0
         fx_related_paragraphs = set()
         company_name = "Unknown Company"
         document_year = "Unknown Year"
@@ -32,6 +36,7 @@ def extract_fx_related_content_large_file(html_path):
                 company_name = element.text.strip()
             elif element.tag in ['p', 'div', 'span']:
                 paragraph_text = unescape(' '.join(element.itertext()).strip())
+                paragraphs_seen += 1
                 if is_meaningful_and_contains_keywords(paragraph_text):
                     cleaned_paragraph = clean_text(paragraph_text)
                     fx_related_paragraphs.add(cleaned_paragraph)
@@ -41,6 +46,8 @@ def extract_fx_related_content_large_file(html_path):
                 del element.getparent()[0]
 
         document_year = extract_year_from_file(html_path)
+        count("paragraphs_seen", paragraphs_seen)
+        count("paragraphs_kept", len(fx_related_paragraphs))
 
         return company_name, document_year, '\n\n'.join(fx_related_paragraphs)
     except Exception as e:
@@ -91,34 +98,42 @@ def process_html_files(directory, qualitative_output_directory):
             continue
         
         if os.path.isdir(company_path):
-            logging.info(f"Processing directory: {company_path}")
-
-            all_fx_paragraphs = set()
-
-            for root, _, files in os.walk(company_path):
-                logging.info(f"Traversing directory: {root}")
-                for file in files:
-                    if file.endswith(".html"):
-                        html_path = os.path.join(root, file)
-                        logging.info(f"Processing file: {html_path}")
-
-                        company_name, document_year, fx_paragraphs = extract_fx_related_content_large_file(html_path)
-                        if fx_paragraphs:
-                            all_fx_paragraphs.update(fx_paragraphs.split('\n\n'))
-
-            if all_fx_paragraphs:
-                all_fx_paragraphs_combined = '\n\n'.join(all_fx_paragraphs)
-                qualitative_output_text_path = os.path.join(output_company_path, f"{company_name}_{document_year}_fx_risk_text.txt")
-                os.makedirs(os.path.dirname(qualitative_output_text_path), exist_ok=True)
-                save_text(all_fx_paragraphs_combined, qualitative_output_text_path)
-                logging.info(f"Saved FX-related text to {qualitative_output_text_path}")
-
-# Directories
-html_directory = 'parsed_reports_html'
-qualitative_output_directory = 'extracted_qualitative_data'
-
-# Ensure the output directory exists
-os.makedirs(qualitative_output_directory, exist_ok=True)
-
-# Process all HTML files and extract FX risk-related text
-process_html_files(html_directory, qualitative_output_directory)
+            extract_company(company_path, output_company_path)
+
+# Function to extract the FX-related text of one company's HTML filings; returns the saved path or None
+@traced("extract_company", company="company_path")
+def extract_company(company_path, output_company_path):
+    logging.info(f"Processing directory: {company_path}")
+
+    all_fx_paragraphs = set()
+
+    for root, _, files in os.walk(company_path):
+        logging.info(f"Traversing directory: {root}")
+        for file in files:
+            if file.endswith(".html"):
+                html_path = os.path.join(root, file)
+                logging.info(f"Processing file: {html_path}")
+
+                company_name, document_year, fx_paragraphs = extract_fx_related_content_large_file(html_path)
+                if fx_paragraphs:
+                    all_fx_paragraphs.update(fx_paragraphs.split('\n\n'))
+
+    if all_fx_paragraphs:
+        all_fx_paragraphs_combined = '\n\n'.join(all_fx_paragraphs)
+        qualitative_output_text_path = os.path.join(output_company_path, f"{company_name}_{document_year}_fx_risk_text.txt")
+        os.makedirs(os.path.dirname(qualitative_output_text_path), exist_ok=True)
+        save_text(all_fx_paragraphs_combined, qualitative_output_text_path)
+        logging.info(f"Saved FX-related text to {qualitative_output_text_path}")
+        return qualitative_output_text_path
+    return None
+
+if __name__ == "__main__":
+    # Directories
+    html_directory = 'parsed_reports_html'
+    qualitative_output_directory = 'extracted_qualitative_data'
+
+    # Ensure the output directory exists
+    os.makedirs(qualitative_output_directory, exist_ok=True)
+
+    # Process all HTML files and extract FX risk-related text
+    process_html_files(html_directory, qualitative_output_directory)
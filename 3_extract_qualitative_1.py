@@ -3,6 +3,7 @@ import re
 import logging
 from lxml import etree
 from html import unescape
+from instrumentation import count, traced
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -32,8 +33,11 @@ def categorize_fx_risk(paragraph_text):
     return "general_fx_risk"
 
 # Function to extract FX-related content and metadata from a large HTML file
+@traced("extract", file="html_path")
 def extract_fx_related_content_large_file(html_path):
     try:
+        count("bytes_read", os.path.getsize(html_path))
+        paragraphs_seen = 0
         fx_related_paragraphs = {}
         company_name = "Unknown Company"
         document_year = "Unknown Year"
@@ -50,6 +54,7 @@ def extract_fx_related_content_large_file(html_path):
                     company_name = current_section
             elif element.tag in ['p', 'div', 'span']:
                 paragraph_text = unescape(' '.join(element.itertext()).strip())
+                paragraphs_seen += 1
                 if is_meaningful_and_contains_keywords(paragraph_text):
                     cleaned_paragraph = clean_text(paragraph_text)
                     category = categorize_fx_risk(paragraph_text)
@@ -63,6 +68,8 @@ def extract_fx_related_content_large_file(html_path):
                 del element.getparent()[0]
 
         document_year = extract_year_from_file(html_path)
+        count("paragraphs_seen", paragraphs_seen)
+        count("paragraphs_kept", sum(len(paragraphs) for paragraphs in fx_related_paragraphs.values()))
 
         combined_paragraphs = "\n\n".join(
             f"Category: {category}\n\n" + "\n\n".join(paragraphs)
@@ -141,12 +148,13 @@ def process_html_files(directory, qualitative_output_directory):
                 save_text(all_fx_paragraphs_combined, qualitative_output_text_path)
                 logging.info(f"Saved FX-related text to {qualitative_output_text_path}")
 
-# Directories
-html_directory = 'parsed_reports_html'
-qualitative_output_directory = 'extracted_qualitative_data_1'
+if __name__ == "__main__":
+    # Directories
+    html_directory = 'parsed_reports_html'
+    qualitative_output_directory = 'extracted_qualitative_data_1'
 
-# Ensure the output directory exists
-os.makedirs(qualitative_output_directory, exist_ok=True)
+    # Ensure the output directory exists
+    os.makedirs(qualitative_output_directory, exist_ok=True)
 
-# Process all HTML files and extract FX risk-related text
-process_html_files(html_directory, qualitative_output_directory)
+    # Process all HTML files and extract FX risk-related text
+    process_html_files(html_directory, qualitative_output_directory)
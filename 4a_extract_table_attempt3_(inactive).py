@@ -129,12 +129,13 @@ def process_html_files(input_directory, output_directory):
                             base_filename = os.path.splitext(file)[0]
                             save_tables_as_csv(geographic_revenue_tables, os.path.join(ticker_output_directory, base_filename))
 
-# Directories
-html_directory = 'parsed_reports_html'
-output_directory = 'extracted_geo_data'
+if __name__ == "__main__":
+    # Directories
+    html_directory = 'parsed_reports_html'
+    output_directory = 'extracted_geo_data'
 
-# Ensure the output directory exists
-os.makedirs(output_directory, exist_ok=True)
+    # Ensure the output directory exists
+    os.makedirs(output_directory, exist_ok=True)
 
-# Process all HTML files and extract geographic revenue tables
-process_html_files(html_directory, output_directory)
+    # Process all HTML files and extract geographic revenue tables
+    process_html_files(html_directory, output_directory)
@@ -1,8 +1,8 @@
 import os
 import re
-import requests
 from dotenv import load_dotenv
 from pdf_generation import save_output_to_pdf
+from fx_rates import get_default_provider
 import openai
 
 # Load environment variables from the .env file
@@ -37,15 +37,9 @@ def detect_currencies(text):
 def get_real_time_exchange_rates(base_currency, target_currencies, api_url):
     """
     Fetches real-time exchange rates for the base currency against target currencies.
+    The rate table is fetched once per run and shared through the provider's cache.
     """
-    try:
-        response = requests.get(f"{api_url}/{base_currency}")
-        response.raise_for_status()  # Raise an HTTPError for bad responses
-        data = response.json()
-        return {currency: data['rates'].get(currency, 'N/A') for currency in target_currencies}
-    except requests.exceptions.RequestException as e:
-        print(f"Error fetching exchange rates: {e}")
-        return {}
+    return get_default_provider(api_url).get_exchange_rates(base_currency, target_currencies)
 
 def retrieve_industry_benchmarks():
     """
@@ -1,21 +1,114 @@
 import os
 import re
+import csv
+import threading
 import requests
 from dotenv import load_dotenv
-from pdf_generation import save_output_to_pdf
-from docsx_generation import save_output_to_docx
+from fx_rates import get_default_provider
+from async_runner import run_analysis_jobs
+from batch_api import BatchClient, load_state, make_custom_id, reset_batch, run_batch
+from response_cache import ResponseCache, make_cache_key
+from chunking import chunk_by_tokens, count_tokens, map_chunks
+from context_retrieval import EmbeddingReranker, select_context
+from streaming import MetricsTable, StreamError, stream_to_file
+from llm_backends import BackendError, get_backend
+from render_queue import RENDER_TIMES_NAME, RenderQueue
+from instrumentation import count, span, traced, tracer
+from structured_output import (JSON_OUTPUT_INSTRUCTION, analysis_to_markdown, parse_analysis,
+                               response_format, save_analysis_json, write_results_table)
 import openai
 
 # Load environment variables from the .env file
 load_dotenv()
 
-# Retrieve the OpenAI API key from environment variables
-openai_api_key = os.getenv('OPENAI_API_KEY')
-if not openai_api_key:
-    raise ValueError("Please set the OpenAI API key in environment variables")
-
-# Initialize the OpenAI client with the API key
-openai.api_key = openai_api_key
+# Model and system message used for every FX risk analysis request
+MODEL_NAME = "gpt-4o-mini"
+SYSTEM_MESSAGE = "You are an expert financial analyst specializing in FX risk management."
+
+# 'markdown' keeps the free-form report; 'json' requests schema-constrained JSON that is validated,
+# stored per company and collected into a results table
+OUTPUT_FORMAT = os.getenv('FX_OUTPUT_FORMAT', 'markdown')
+if OUTPUT_FORMAT == 'json':
+    ANALYSIS_SYSTEM_MESSAGE = f"{SYSTEM_MESSAGE} {JSON_OUTPUT_INSTRUCTION}"
+    GENERATION_PARAMS = {"response_format": response_format()}
+else:
+    ANALYSIS_SYSTEM_MESSAGE = SYSTEM_MESSAGE
+    GENERATION_PARAMS = {}
+
+# 'openai' uses the OpenAI SDK; any other name ('hf-inference', 'transformers', 'mock', or an
+# OpenAI-compatible server via 'openai-http') routes sync-mode and map-stage calls through llm_backends
+LLM_BACKEND = os.getenv('FX_LLM_BACKEND', 'openai')
+
+# Documents above the prompt budget are condensed chunk by chunk before the final analysis
+PROMPT_TOKEN_BUDGET = int(os.getenv('FX_PROMPT_TOKEN_BUDGET', 60000))
+CHUNK_TOKEN_BUDGET = int(os.getenv('FX_CHUNK_TOKEN_BUDGET', 6000))
+MAP_WORKERS = int(os.getenv('FX_MAP_WORKERS', 4))
+
+# Optional relevance-ranked context selection: 'bm25', 'rerank' (BM25 + local embeddings) or '' to send everything
+CONTEXT_SELECTION = os.getenv('FX_CONTEXT_SELECTION', '')
+CONTEXT_TOP_K = int(os.getenv('FX_CONTEXT_TOP_K', 5))
+CONTEXT_TOKEN_BUDGET = int(os.getenv('FX_CONTEXT_TOKEN_BUDGET', 8000))
+
+# Token accounting per company (summed over its filings), written to token_usage.csv at the end of the run
+token_usage = {}
+token_usage_lock = threading.Lock()
+
+# The API key, model backend, response cache, reranker and render queue are created on first use
+# rather than at import, because spawned render workers re-import this script
+_shared_objects = {}
+_shared_lock = threading.RLock()
+
+def _shared(name, create):
+    with _shared_lock:
+        if name not in _shared_objects:
+            _shared_objects[name] = create()
+        return _shared_objects[name]
+
+def _load_openai_api_key():
+    # Retrieve the OpenAI API key from environment variables
+    openai_api_key = os.getenv('OPENAI_API_KEY')
+    if not openai_api_key:
+        raise ValueError("Please set the OpenAI API key in environment variables")
+    # Initialize the OpenAI client with the API key
+    openai.api_key = openai_api_key
+    return openai_api_key
+
+def get_openai_api_key():
+    return _shared("openai_api_key", _load_openai_api_key)
+
+def get_llm_backend():
+    """
+    The llm_backends backend selected by FX_LLM_BACKEND, or None when calls go through the OpenAI SDK.
+    """
+    if LLM_BACKEND == 'openai':
+        return None
+    return _shared("llm_backend", lambda: get_backend(
+        'openai' if LLM_BACKEND == 'openai-http' else LLM_BACKEND,
+        **({"model": os.getenv('FX_LLM_MODEL')} if os.getenv('FX_LLM_MODEL') else {})))
+
+def get_model_id():
+    llm_backend = get_llm_backend()
+    return MODEL_NAME if llm_backend is None else f"{llm_backend.name}:{llm_backend.model}"
+
+def response_cache_key(messages, generation_params=None):
+    # Every mode keys responses by the same model id, so sync, stream, async and batch runs share the cache
+    return make_cache_key(get_model_id(), messages, generation_params or {})
+
+def get_response_cache():
+    # Persistent cache of responses keyed by a hash of model, messages and generation parameters
+    return _shared("response_cache", lambda: ResponseCache(
+        os.getenv('FX_RESPONSE_CACHE', 'llm_response_cache.sqlite'),
+        max_bytes=int(os.getenv('FX_RESPONSE_CACHE_MAX_MB', 512)) * 1024 * 1024))
+
+def get_context_reranker():
+    return _shared("context_reranker", lambda: EmbeddingReranker() if CONTEXT_SELECTION == 'rerank' else None)
+
+def get_render_queue():
+    # PDF and DOCX reports render in worker processes while the next analysis runs;
+    # FX_RENDER_WORKERS=0 renders inline; at most FX_RENDER_MAX_PENDING files wait to be rendered
+    return _shared("render_queue", lambda: RenderQueue(
+        int(os.environ['FX_RENDER_WORKERS']) if os.getenv('FX_RENDER_WORKERS') else None,
+        max_pending=int(os.getenv('FX_RENDER_MAX_PENDING', 16))))
 
 def preprocess_text(text):
     """
@@ -38,15 +131,9 @@ def detect_currencies(text):
 def get_real_time_exchange_rates(base_currency, target_currencies, api_url):
     """
     Fetches real-time exchange rates for the base currency against target currencies.
+    The rate table is fetched once per run and shared through the provider's cache.
     """
-    try:
-        response = requests.get(f"{api_url}/{base_currency}")
-        response.raise_for_status()  # Raise an HTTPError for bad responses
-        data = response.json()  # Parse the JSON response
-        return {currency: data['rates'].get(currency, 'N/A') for currency in target_currencies}  # Map exchange rates to target currencies
-    except requests.exceptions.RequestException as e:
-        print(f"Error fetching exchange rates: {e}")
-        return {}
+    return get_default_provider(api_url).get_exchange_rates(base_currency, target_currencies)
 
 def retrieve_industry_benchmarks():
     """
@@ -198,18 +285,121 @@ def create_fx_risk_prompt(document_content, base_currency, exchange_rate_data, b
 
 
 
-def rate_fx_risk(document_content, base_currency, api_url, company_name):
+def create_extraction_prompt(chunk, company_name):
     """
-    Main function to analyze and rate FX risk using OpenAI's GPT.
+    Map-stage prompt: pulls the FX-relevant facts out of one chunk of a long filing.
     """
-    # Preprocess text
-    cleaned_content = preprocess_text(document_content)
-    
-    # Detect currencies mentioned in the document
-    detected_currencies = detect_currencies(cleaned_content)
+    return f"""
+    You are reading one excerpt of a financial filing for {company_name}. Extract only the facts relevant to
+    FX (foreign exchange) risk: currencies and their share of revenue, costs or transactions, foreign operations,
+    hedging instruments and hedging ratios, sensitivity figures, and management's statements on currency risk.
+    Keep every number exactly as stated. Reply with concise bullet points, or with "None" if the excerpt has no such facts.
+
+    **Excerpt:**
+    {chunk}
+    """
+
+def count_sent_tokens(messages_list):
+    # Counted where requests actually go out, so responses served from the cache send nothing
+    count("tokens_sent", sum(count_tokens(message['content'], MODEL_NAME)
+                             for messages in messages_list for message in messages))
+
+@traced("llm_call")
+def call_chat_model(messages, generation_params=None):
+    """
+    Sends the messages to the chat model, serving repeated requests from the response cache.
+    """
+    generation_params = generation_params or {}
+    response_cache = get_response_cache()
+    llm_backend = get_llm_backend()
+
+    # Reuse the stored response when nothing that affects the completion has changed
+    cache_key = response_cache_key(messages, generation_params)
+    cached_content = response_cache.get(cache_key)
+    if cached_content is not None:
+        count("cache_hits")
+        return cached_content
+    count("cache_misses")
+    count_sent_tokens([messages])
+
+    if llm_backend is None:
+        get_openai_api_key()
+        completion = openai.ChatCompletion.create(
+            model=MODEL_NAME,
+            messages=messages,
+            **generation_params
+        )
+        content = completion.choices[0].message['content']
+    else:
+        content = llm_backend.generate(messages, **generation_params)
+    response_cache.put(cache_key, content, get_model_id())
+    return content
+
+def extraction_messages(chunk, company_name):
+    return [
+        {"role": "system", "content": SYSTEM_MESSAGE},
+        {"role": "user", "content": create_extraction_prompt(chunk, company_name)}
+    ]
+
+def extract_chunk_facts(chunk, company_name, cached_only=False):
+    """
+    Map step for one chunk. With cached_only the notes must already be in the response cache
+    (written by run_map_jobs); a missing entry counts as a failed chunk instead of an API call.
+    """
+    messages = extraction_messages(chunk, company_name)
+    if cached_only:
+        notes = get_response_cache().get(response_cache_key(messages))
+        if notes is None:
+            return ""
+    else:
+        try:
+            notes = call_chat_model(messages)
+        except (openai.error.OpenAIError, BackendError) as e:
+            print(f"{company_name}: chunk extraction failed: {e}")
+            return ""
+    return "" if notes.strip().lower() == "none" else notes
+
+def select_document_content(document_content):
+    """
+    Applies the optional context selection and returns (content, token count, chunks), where
+    chunks is [] unless the content exceeds the prompt budget and has to be condensed first.
+    """
+    # Keep only the paragraphs that rank highest against the analysis instructions
+    if CONTEXT_SELECTION:
+        document_content = select_context(document_content, CONTEXT_TOP_K, CONTEXT_TOKEN_BUDGET, MODEL_NAME,
+                                          get_context_reranker())
+    document_tokens = count_tokens(document_content, MODEL_NAME)
+    chunks = chunk_by_tokens(document_content, CHUNK_TOKEN_BUDGET, MODEL_NAME) if document_tokens > PROMPT_TOKEN_BUDGET else []
+    return document_content, document_tokens, chunks
+
+def condense_document(chunks, company_name, cached_only=False):
+    """
+    Extracts FX facts from the chunks of a long filing in parallel and returns the combined notes.
+    """
+    notes = map_chunks(chunks, lambda chunk: extract_chunk_facts(chunk, company_name, cached_only), MAP_WORKERS)
+    map_prompt_tokens = sum(count_tokens(create_extraction_prompt(chunk, company_name), MODEL_NAME) for chunk in chunks)
+    return '\n\n'.join(note for note in notes if note), len(chunks), map_prompt_tokens
+
+@traced("prepare_prompt", company="company_name")
+def build_fx_risk_messages(document_content, base_currency, api_url, company_name, cached_only=False):
+    """
+    Preprocesses the document and builds the chat messages for the FX risk analysis.
+    With cached_only the map step reads chunk notes from the cache instead of calling the model.
+    """
+    # Detect currencies mentioned anywhere in the document
+    detected_currencies = detect_currencies(preprocess_text(document_content))
     if base_currency in detected_currencies:
         detected_currencies.remove(base_currency)  # Avoid redundant exchange rate retrieval for the base currency
 
+    # Condense filings that would not fit the prompt budget (map step); the analysis below is the reduce step
+    document_content, document_tokens, chunks = select_document_content(document_content)
+    chunk_count, map_prompt_tokens = 1, 0
+    if chunks:
+        document_content, chunk_count, map_prompt_tokens = condense_document(chunks, company_name, cached_only)
+
+    # Preprocess text
+    cleaned_content = preprocess_text(document_content)
+
     # Fetch real-time exchange rates for the detected currencies
     exchange_rate_data = get_real_time_exchange_rates(base_currency, detected_currencies, api_url)
 
@@ -219,66 +409,325 @@ def rate_fx_risk(document_content, base_currency, api_url, company_name):
     # Create a prompt for GPT to generate the FX risk analysis
     fx_risk_prompt = create_fx_risk_prompt(cleaned_content, base_currency, exchange_rate_data, benchmarks, company_name)
 
+    usage = {
+        "documents": 1,
+        "document_tokens": document_tokens,
+        "chunks": chunk_count,
+        "map_prompt_tokens": map_prompt_tokens,
+        "analysis_prompt_tokens": count_tokens(ANALYSIS_SYSTEM_MESSAGE + fx_risk_prompt, MODEL_NAME),
+    }
+    with token_usage_lock:
+        totals = token_usage.setdefault(company_name, dict.fromkeys(usage, 0))
+        for key, value in usage.items():
+            totals[key] += value
+    count("chunks", chunk_count)
+
+    return [
+        {"role": "system", "content": ANALYSIS_SYSTEM_MESSAGE},
+        {"role": "user", "content": fx_risk_prompt}
+    ]
+
+@traced("analyze", company="company_name")
+def rate_fx_risk(document_content, base_currency, api_url, company_name):
+    """
+    Main function to analyze and rate FX risk using OpenAI's GPT.
+    """
+    messages = build_fx_risk_messages(document_content, base_currency, api_url, company_name)
+
     # Generate the analysis using OpenAI's GPT model
     try:
-        completion = openai.ChatCompletion.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "You are an expert financial analyst specializing in FX risk management."},
-                {"role": "user", "content": fx_risk_prompt}
-            ]
-        )
-        return completion.choices[0].message['content']
-    except openai.error.OpenAIError as e:
+        return call_chat_model(messages, GENERATION_PARAMS)
+    except (openai.error.OpenAIError, BackendError) as e:
         return f"An error occurred while generating the response: {e}"
 
-# Root directory containing the subfolders
-input_root_directory = '/Users/vanessasutandar/Downloads/financial_reports/extracted_qualitative_data/'
-
-# Root directory for saving the output
-output_root_directory = '/Users/vanessasutandar/Downloads/financial_reports/fx_risk_analysis_output/'
-
-# Create the output root directory if it doesn't exist
-if not os.path.exists(output_root_directory):
-    os.makedirs(output_root_directory)
-
-# Iterate through each subfolder in the root directory
-for company_folder in os.listdir(input_root_directory):
-    company_folder_path = os.path.join(input_root_directory, company_folder)
-    
-    # Check if it's a directory
-    if os.path.isdir(company_folder_path):
-        # Create a corresponding output directory
-        output_company_folder = os.path.join(output_root_directory, company_folder)
-        if not os.path.exists(output_company_folder):
-            os.makedirs(output_company_folder)
+def save_token_usage(output_root_directory):
+    """
+    Writes the per-company token accounting collected during the run.
+    """
+    if not token_usage:
+        return
+    output_path = os.path.join(output_root_directory, "token_usage.csv")
+    with open(output_path, 'w', newline='', encoding='utf-8') as file:
+        writer = csv.writer(file)
+        writer.writerow(['Company', 'Documents', 'Document Tokens', 'Chunks', 'Map Prompt Tokens', 'Analysis Prompt Tokens'])
+        for company_name, usage in token_usage.items():
+            writer.writerow([company_name, usage['documents'], usage['document_tokens'], usage['chunks'],
+                             usage['map_prompt_tokens'], usage['analysis_prompt_tokens']])
+    print(f"Token usage saved to {output_path}")
+
+def iter_company_documents(input_root_directory, output_root_directory):
+    """
+    Yields (company_name, file_path, output_company_folder) for every extracted text file.
+    """
+    # Iterate through each subfolder in the root directory
+    for company_folder in os.listdir(input_root_directory):
+        company_folder_path = os.path.join(input_root_directory, company_folder)
         
-        # Iterate through each file in the company folder
-        for filename in os.listdir(company_folder_path):
-            file_path = os.path.join(company_folder_path, filename)
+        # Check if it's a directory
+        if os.path.isdir(company_folder_path):
+            # Create a corresponding output directory
+            output_company_folder = os.path.join(output_root_directory, company_folder)
+            if not os.path.exists(output_company_folder):
+                os.makedirs(output_company_folder)
             
-            # Only process text files
-            if filename.endswith('.txt'):
-                # Extract the company name from the folder name
-                company_name = company_folder.upper()
-
-                # Read the content of the file
-                with open(file_path, 'r') as file:
-                    fx_risk_document_content = file.read()
-
-                # Define the API URL and base currency
-                api_url = "https://api.exchangerate-api.com/v4/latest"
-                base_currency = 'USD'
-
-                # Perform FX risk rating
-                fx_risk_rating = rate_fx_risk(fx_risk_document_content, base_currency, api_url, company_name)
-                print(company_name)
-                print(fx_risk_rating)
-
-                # Define the output file paths
-                pdf_output_path = os.path.join(output_company_folder, f"{company_name}_FX_Risk_Analysis_Report.pdf")
-                docx_output_path = os.path.join(output_company_folder, f"{company_name}_FX_Risk_Analysis_Report.docx")
-
-                # Save the output to PDF and DOCX in the corresponding folder
-                save_output_to_pdf("FX Risk Analysis Report", fx_risk_rating, company_name, pdf_output_path)
-                save_output_to_docx("FX Risk Analysis Report", fx_risk_rating, company_name, docx_output_path)
\ No newline at end of file
+            # Iterate through each file in the company folder
+            for filename in os.listdir(company_folder_path):
+                # Only process text files
+                if filename.endswith('.txt'):
+                    # Extract the company name from the folder name
+                    yield company_folder.upper(), os.path.join(company_folder_path, filename), output_company_folder
+
+def read_document(file_path):
+    with open(file_path, 'r') as file:
+        return file.read()
+
+def save_reports(fx_risk_rating, company_name, output_company_folder):
+    """
+    Queues the analysis for PDF and DOCX rendering into the company's output folder.
+    In JSON mode the response is validated and stored first, and the reports are rendered from the JSON.
+    """
+    if OUTPUT_FORMAT == 'json':
+        try:
+            analysis = parse_analysis(fx_risk_rating)
+        except ValueError as e:
+            print(f"{company_name}: {e}")
+            return
+        save_analysis_json(analysis, company_name, output_company_folder)
+        fx_risk_rating = analysis_to_markdown(analysis)
+
+    # Define the output file paths
+    pdf_output_path = os.path.join(output_company_folder, f"{company_name}_FX_Risk_Analysis_Report.pdf")
+    docx_output_path = os.path.join(output_company_folder, f"{company_name}_FX_Risk_Analysis_Report.docx")
+
+    # Render the PDF and DOCX in the background so the next API call is not held up
+    get_render_queue().submit("FX Risk Analysis Report", fx_risk_rating, company_name, pdf_output_path, docx_output_path)
+
+def run_sync_analysis(input_root_directory, output_root_directory, base_currency, api_url):
+    """
+    Analyzes one document at a time with the synchronous OpenAI client.
+    """
+    for company_name, file_path, output_company_folder in iter_company_documents(input_root_directory, output_root_directory):
+        # Perform FX risk rating
+        fx_risk_rating = rate_fx_risk(read_document(file_path), base_currency, api_url, company_name)
+        print(company_name)
+        print(fx_risk_rating)
+        save_reports(fx_risk_rating, company_name, output_company_folder)
+
+def serve_cached_jobs(jobs, on_result):
+    """
+    Answers jobs whose response is already cached and returns the ones that still need an API call.
+    """
+    pending = []
+    for job in jobs:
+        job['cache_key'] = response_cache_key(job['messages'], GENERATION_PARAMS)
+        cached_content = get_response_cache().get(job['cache_key'])
+        if cached_content is not None:
+            on_result(job, cached_content, None)
+        else:
+            pending.append(job)
+    return pending
+
+def run_streaming_analysis(input_root_directory, output_root_directory, base_currency, api_url):
+    """
+    Streams each response into a partial file as it arrives and records latency metrics.
+    An interrupted run resumes from the partial output instead of regenerating it.
+    """
+    metrics = MetricsTable(os.path.join(output_root_directory, "llm_metrics.csv"))
+    api_base = os.getenv('OPENAI_API_BASE', 'https://api.openai.com/v1')
+    for company_name, file_path, output_company_folder in iter_company_documents(input_root_directory, output_root_directory):
+        messages = build_fx_risk_messages(read_document(file_path), base_currency, api_url, company_name)
+        cache_key = response_cache_key(messages, GENERATION_PARAMS)
+        fx_risk_rating = get_response_cache().get(cache_key)
+        if fx_risk_rating is None:
+            partial_path = os.path.join(output_company_folder, f"{company_name}_FX_Risk_Analysis.partial.md")
+            try:
+                with span("llm_call", company=company_name):
+                    count_sent_tokens([messages])
+                    # A JSON answer cannot be continued from a prefill, so JSON mode regenerates instead
+                    fx_risk_rating = stream_to_file(messages, partial_path, api_base, get_openai_api_key(), MODEL_NAME,
+                                                    company_name, metrics, GENERATION_PARAMS,
+                                                    resume=OUTPUT_FORMAT != 'json')
+            except (requests.exceptions.RequestException, StreamError) as e:
+                print(f"{company_name}: stream interrupted, partial output kept in {partial_path}: {e}")
+                continue
+            get_response_cache().put(cache_key, fx_risk_rating, get_model_id())
+        print(company_name)
+        print(fx_risk_rating)
+        save_reports(fx_risk_rating, company_name, output_company_folder)
+
+def map_step_jobs(documents):
+    """
+    Chunk extraction jobs for every document above the prompt budget whose notes are not cached yet,
+    so async and batch mode run the map step through their own runner instead of serial calls.
+    """
+    jobs = {}
+    for company_name, file_path, _ in documents:
+        _, _, chunks = select_document_content(read_document(file_path))
+        for chunk in chunks:
+            messages = extraction_messages(chunk, company_name)
+            cache_key = response_cache_key(messages)
+            if cache_key not in jobs and get_response_cache().get(cache_key) is None:
+                jobs[cache_key] = {"id": f"map-{cache_key[:32]}", "messages": messages,
+                                   "cache_key": cache_key, "company_name": company_name}
+    return list(jobs.values())
+
+def on_map_result(job, content, error):
+    # Chunk notes are handed to the reduce step through the response cache
+    if error is not None:
+        print(f"{job['company_name']}: chunk extraction failed: {error}")
+        return
+    get_response_cache().put(job['cache_key'], content, get_model_id())
+
+def async_runner_settings():
+    return {
+        "api_base": os.getenv('OPENAI_API_BASE', 'https://api.openai.com/v1'),
+        "api_key": get_openai_api_key(),
+        "model": MODEL_NAME,
+        "max_in_flight": int(os.getenv('FX_MAX_IN_FLIGHT', 8)),
+        "requests_per_minute": int(os.getenv('FX_REQUESTS_PER_MINUTE', 500)),
+        "tokens_per_minute": int(os.getenv('FX_TOKENS_PER_MINUTE', 200000)),
+    }
+
+def run_async_analysis(input_root_directory, output_root_directory, base_currency, api_url):
+    """
+    Keeps several requests in flight at once and saves each report as soon as its response arrives.
+    Chunk extraction for long filings runs first through the same runner.
+    """
+    documents = list(iter_company_documents(input_root_directory, output_root_directory))
+    map_jobs = map_step_jobs(documents)
+    if map_jobs:
+        with span("async_requests", stage="map"):
+            count_sent_tokens(job['messages'] for job in map_jobs)
+            stats = run_analysis_jobs(map_jobs, on_map_result, generation_params={}, **async_runner_settings())
+        print(f"Async chunk extraction finished: {stats}")
+
+    jobs = []
+    for company_name, file_path, output_company_folder in documents:
+        jobs.append({
+            "id": company_name,
+            "messages": build_fx_risk_messages(read_document(file_path), base_currency, api_url, company_name,
+                                               cached_only=True),
+            "output_folder": output_company_folder,
+        })
+
+    def on_result(job, content, error):
+        if error is not None:
+            print(f"{job['id']}: an error occurred while generating the response: {error}")
+            return
+        get_response_cache().put(job['cache_key'], content, get_model_id())
+        print(job['id'])
+        print(content)
+        save_reports(content, job['id'], job['output_folder'])
+
+    jobs = serve_cached_jobs(jobs, on_result)
+    with span("async_requests", stage="analysis"):
+        count_sent_tokens(job['messages'] for job in jobs)
+        stats = run_analysis_jobs(jobs, on_result, generation_params=GENERATION_PARAMS, **async_runner_settings())
+    print(f"Async analysis finished: {stats}")
+
+def finish_recorded_batch(work_directory, client, on_result, poll_interval):
+    """
+    Waits for the batch recorded in work_directory (if any), ingests its remaining results and
+    clears it, so the caller can work out which jobs are still missing and submit a new batch.
+    """
+    state_path = os.path.join(work_directory, "batch_state.json")
+    if os.path.exists(state_path) and load_state(state_path)['batch_id']:
+        run_batch([], work_directory, client, MODEL_NAME, on_result, poll_interval=poll_interval)
+    reset_batch(work_directory)
+
+def run_batch_analysis(input_root_directory, output_root_directory, base_currency, api_url):
+    """
+    Submits every document through the OpenAI Batch API and writes the reports once results are in.
+    Long filings first go through a chunk extraction batch in <output>/batch/map. Re-running first
+    finishes the recorded batches, then submits new batches only for responses still missing.
+    """
+    client = BatchClient(os.getenv('OPENAI_API_BASE', 'https://api.openai.com/v1'), get_openai_api_key())
+    poll_interval = int(os.getenv('FX_BATCH_POLL_INTERVAL', 60))
+    documents = list(iter_company_documents(input_root_directory, output_root_directory))
+    batch_directory = os.path.join(output_root_directory, "batch")
+    map_directory = os.path.join(batch_directory, "map")
+    # Results of a recorded batch go into the response cache before deciding which notes are still missing
+    finish_recorded_batch(map_directory, client, on_map_result, poll_interval)
+    map_jobs = map_step_jobs(documents)
+    if map_jobs:
+        with span("batch_requests", stage="map"):
+            count_sent_tokens(job['messages'] for job in map_jobs)
+            run_batch(map_jobs, map_directory, client, MODEL_NAME, on_map_result, poll_interval=poll_interval)
+
+    def on_result(job, content, error):
+        if error is not None:
+            print(f"{job['company_name']}: batch request failed: {error}")
+            return
+        get_response_cache().put(job['cache_key'], content, get_model_id())
+        save_reports(content, job['company_name'], job['output_folder'])
+
+    # Likewise for the analysis batch: its reports are written and cached, failed documents are resubmitted
+    finish_recorded_batch(batch_directory, client, on_result, poll_interval)
+
+    jobs = []
+    for company_name, file_path, output_company_folder in documents:
+        jobs.append({
+            "id": make_custom_id(os.path.basename(output_company_folder), file_path),
+            "messages": build_fx_risk_messages(read_document(file_path), base_currency, api_url, company_name,
+                                               cached_only=True),
+            "company_name": company_name,
+            "output_folder": output_company_folder,
+        })
+
+    jobs = serve_cached_jobs(jobs, on_result)
+    if not jobs:
+        print("All responses served from the cache; no batch submitted")
+        return
+
+    with span("batch_requests", stage="analysis"):
+        count_sent_tokens(job['messages'] for job in jobs)
+        run_batch(jobs, batch_directory, client, MODEL_NAME, on_result,
+                  poll_interval=poll_interval, generation_params=GENERATION_PARAMS)
+
+if __name__ == "__main__":
+    # Root directory containing the subfolders
+    input_root_directory = '/Users/vanessasutandar/Downloads/financial_reports/extracted_qualitative_data/'
+
+    # Root directory for saving the output
+    output_root_directory = '/Users/vanessasutandar/Downloads/financial_reports/fx_risk_analysis_output/'
+
+    # Create the output root directory if it doesn't exist
+    if not os.path.exists(output_root_directory):
+        os.makedirs(output_root_directory)
+
+    # Define the API URL and base currency
+    api_url = "https://api.exchangerate-api.com/v4/latest"
+    base_currency = 'USD'
+
+    # Fail fast on a missing API key, before any document is read
+    if LLM_BACKEND == 'openai':
+        get_openai_api_key()
+
+    render_queue = get_render_queue()
+    render_queue.times_path = os.path.join(output_root_directory, RENDER_TIMES_NAME)
+    # FX_DOCX_CONSOLIDATED=1 also writes every company's report into one DOCX
+    if os.getenv('FX_DOCX_CONSOLIDATED') == '1':
+        render_queue.consolidated_path = os.path.join(output_root_directory, "FX_Risk_Analysis_All_Companies.docx")
+
+    # Fetch the rate table once up front; every document then reads it from the shared cache
+    get_default_provider(api_url).prefetch([base_currency])
+
+    # Select how the LLM stage runs: 'sync' (one request at a time), 'stream' (sync with streamed,
+    # resumable output), 'async' (bounded concurrency) or 'batch' (OpenAI Batch API)
+    analysis_mode = os.getenv('FX_ANALYSIS_MODE', 'sync')
+
+    if analysis_mode == 'async':
+        run_async_analysis(input_root_directory, output_root_directory, base_currency, api_url)
+    elif analysis_mode == 'stream':
+        run_streaming_analysis(input_root_directory, output_root_directory, base_currency, api_url)
+    elif analysis_mode == 'batch':
+        run_batch_analysis(input_root_directory, output_root_directory, base_currency, api_url)
+    else:
+        run_sync_analysis(input_root_directory, output_root_directory, base_currency, api_url)
+
+    render_queue.close()
+    save_token_usage(output_root_directory)
+    if OUTPUT_FORMAT == 'json':
+        write_results_table(output_root_directory)
+    print(get_response_cache().summary())
+    print(tracer.summary())
@@ -1,68 +1,118 @@
 import os
-import fitz  # PyMuPDF
+import json
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
+from structured_output import load_results_table, to_compiled_columns
+from report_parsing import FX_RISK_FIELDS, PDF_BACKEND, extract_text, parse_labelled_fields
+from instrumentation import count, traced, tracer
+
+COMPILED_CSV_NAME = "FX_Risk_Analysis_Compiled_coba_coba.csv"
+# Parsed rows by PDF path, so re-compiling only parses new or changed reports
+COMPILE_CACHE_NAME = "compile_cache.json"
+# Bump when text extraction or field parsing changes in a way FX_RISK_FIELDS does not show
+# (e.g. normalize_layout or LabelScanner); cached rows from another parser version are discarded
+PARSER_VERSION = 2
 
 def extract_text_from_pdf(pdf_path):
-    pdf_document = fitz.open(pdf_path)
-    text = ""
-    for page_num in range(pdf_document.page_count):
-        page = pdf_document.load_page(page_num)
-        text += page.get_text()
-    return text
+    return extract_text(pdf_path)
 
 def parse_fx_risk_analysis(text):
-    company_info = {
-        "Company": extract_value(text, "Company:"),
-        "Category": extract_value(text, "Category:"),
-        "Sub-Category": extract_value(text, "Sub-Category:"),
-        "Overall_Rating": extract_value(text, "Overall FX Risk Rating"),
-        "Hedging_Ratio": extract_value(text, "Hedging Ratio"),
-        "Best_Scenario_number": extract_value(text, "Best-Case Scenario"),
-        "Best_Scenario_text": extract_value(text, "Best-Case Scenario Impact"),
-        "Worst_Scenario_number": extract_value(text, "Worst-Case Scenario"),
-        "Worst_Scenario_text": extract_value(text, "Worst-Case Scenario Impact"),
-        "Likely_Scenario_number": extract_value(text, "Most Likely Scenario"),
-        "Likely_Scenario_text": extract_value(text, "Most Likely Scenario Impact"),
-        "Translational_Rating": extract_value(text, "Translational Risk"),
-        "Translational_Reason": extract_value(text, "Assessment"),
-        "Transactional_Rating": extract_value(text, "Transactional Risk"),
-        "Transactional_Reason": extract_value(text, "Assessment"),
-        "Economic_Category": extract_value(text, "Economic Risk"),
-        "Economic_Reason": extract_value(text, "Assessment"),
-        "Distribution_of_Revenue_by_Currency": extract_value(text, "Key Currencies Exposure"),
-        "Hedging_Strategy_Type": extract_value(text, "Hedging Ratio"),
-        "Mitigation_Strategies": extract_value(text, "Mitigation Strategies"),
-        "FX_Sensitivity_Analysis": extract_value(text, "Sensitivity Analysis"),
-        "Industry_Benchmarking": extract_value(text, "Industry Benchmarking"),
-        "Historical_FX_Impact": extract_value(text, "Historical Data Analysis"),
-        "Real_Time_Data_Integration": extract_value(text, "Real-Time Data Integration"),
-    }
+    return parse_labelled_fields(text)
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+@traced("compile_parse", file="pdf_path")
+def parse_pdf(pdf_path):
+    count("bytes_read", os.path.getsize(pdf_path))
+    company_info = parse_fx_risk_analysis(extract_text_from_pdf(pdf_path))
+    company_info['Company'] = os.path.basename(os.path.dirname(pdf_path))  # Set company name from the folder name
     return company_info
 
-def extract_value(text, label):
-    try:
-        start = text.index(label) + len(label)
-        end = text.index("\n", start)
-        return text[start:end].strip()
-    except ValueError:
-        return "No Information/Not Found"
+def parser_fingerprint():
+    """
+    Identifies the parser that produced the cached rows: the version, the field table and the PDF backend.
+    """
+    description = json.dumps([PARSER_VERSION, FX_RISK_FIELDS, PDF_BACKEND], sort_keys=True)
+    return hashlib.sha256(description.encode('utf-8')).hexdigest()
+
+def load_compile_cache(cache_path):
+    if os.path.exists(cache_path):
+        with open(cache_path, 'r', encoding='utf-8') as file:
+            cache = json.load(file)
+        if cache.get("parser") == parser_fingerprint():
+            return cache["reports"]
+        print("Parser changed since the last compile; every report is parsed again")
+    return {}
+
+def save_compile_cache(cache, cache_path):
+    tmp_path = cache_path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as file:
+        json.dump({"parser": parser_fingerprint(), "reports": cache}, file, indent=2)
+    os.replace(tmp_path, cache_path)
 
-def process_all_pdfs(base_directory):
-    data = []
+def find_changed_pdfs(base_directory, cache):
+    """
+    Returns (pdf paths, paths to parse). A PDF is reused from the cache when its size and
+    modification time are unchanged, or when its content hash still matches.
+    """
+    pdf_paths, changed = [], []
     for root, dirs, files in os.walk(base_directory):
-        for file in files:
-            if file.endswith(".pdf"):
-                pdf_path = os.path.join(root, file)
-                text = extract_text_from_pdf(pdf_path)
-                company_info = parse_fx_risk_analysis(text)
-                company_info['Company'] = os.path.basename(root)  # Set company name from the folder name
-                data.append(company_info)
-    
-    df = pd.DataFrame(data)
-    output_path = os.path.join(base_directory, "FX_Risk_Analysis_Compiled_coba_coba.csv")
+        for file in sorted(files):
+            if not file.endswith(".pdf"):
+                continue
+            pdf_path = os.path.join(root, file)
+            pdf_paths.append(pdf_path)
+            stat = os.stat(pdf_path)
+            entry = cache.get(pdf_path)
+            if entry and entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime:
+                continue
+            sha256 = file_sha256(pdf_path)
+            if entry and entry["sha256"] == sha256:
+                entry.update(size=stat.st_size, mtime=stat.st_mtime)
+                continue
+            cache[pdf_path] = {"sha256": sha256, "size": stat.st_size, "mtime": stat.st_mtime, "row": None}
+            changed.append(pdf_path)
+    return pdf_paths, changed
+
+def process_all_pdfs(base_directory, max_workers=None):
+    # JSON-mode runs already store every analysis in a results table; read it instead of re-parsing
+    # PDFs unless a report is newer than the table
+    results_table = load_results_table(base_directory)
+    output_path = os.path.join(base_directory, COMPILED_CSV_NAME)
+    if results_table is not None:
+        to_compiled_columns(results_table).to_csv(output_path, index=False)
+        print(f"Data compiled from the results table and saved to {output_path}")
+        return
+
+    cache_path = os.path.join(base_directory, COMPILE_CACHE_NAME)
+    cache = load_compile_cache(cache_path)
+    pdf_paths, changed = find_changed_pdfs(base_directory, cache)
+
+    # Text extraction dominates, so new or changed reports are parsed in separate processes
+    if len(changed) > 1:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            rows = list(executor.map(parse_pdf, changed, chunksize=4))
+    else:
+        rows = [parse_pdf(pdf_path) for pdf_path in changed]
+    for pdf_path, row in zip(changed, rows):
+        cache[pdf_path]["row"] = row
+
+    # Reports that no longer exist are dropped from the cache and the output
+    cache = {pdf_path: cache[pdf_path] for pdf_path in pdf_paths}
+    save_compile_cache(cache, cache_path)
+
+    df = pd.DataFrame([cache[pdf_path]["row"] for pdf_path in pdf_paths])
     df.to_csv(output_path, index=False)
-    print(f"Data compiled and saved to {output_path}")
+    print(f"Data compiled and saved to {output_path} ({len(changed)} of {len(pdf_paths)} reports parsed)")
 
-# Example usage:
-base_directory = "/Users/vanessasutandar/Downloads/financial_reports/fx_risk_analysis_output"
-process_all_pdfs(base_directory)
+if __name__ == "__main__":
+    # Example usage:
+    base_directory = "/Users/vanessasutandar/Downloads/financial_reports/fx_risk_analysis_output"
+    process_all_pdfs(base_directory)
+    print(tracer.summary())
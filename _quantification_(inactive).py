@@ -5,9 +5,6 @@ import pandas as pd
 input_folder_path = '/Users/vanessasutandar/Downloads/financial_reports/quantitative'
 output_folder_path = '/Users/vanessasutandar/Downloads/financial_reports/output'
 
-# Ensure the output directory exists
-os.makedirs(output_folder_path, exist_ok=True)
-
 # Function to calculate year-over-year growth rate
 def calculate_growth_rate(data, column_name):
     if column_name not in data.columns:
@@ -81,25 +78,29 @@ def analyze_company(company_name, balance_sheet_path, cash_flow_path, income_sta
     
     return combined_metrics
 
-# List to store summary for each company
-all_summaries = []
+if __name__ == "__main__":
+    # Ensure the output directory exists
+    os.makedirs(output_folder_path, exist_ok=True)
+
+    # List to store summary for each company
+    all_summaries = []
 
-# Loop through each company folder and analyze
-for filename in os.listdir(input_folder_path):
-    if 'balance_sheet' in filename:
-        company_name = filename.split('_')[0]
-        balance_sheet_path = os.path.join(input_folder_path, f"{company_name}_balance_sheet.csv")
-        cash_flow_path = os.path.join(input_folder_path, f"{company_name}_cash_flow.csv")
-        income_statement_path = os.path.join(input_folder_path, f"{company_name}_income_statement.csv")
+    # Loop through each company folder and analyze
+    for filename in os.listdir(input_folder_path):
+        if 'balance_sheet' in filename:
+            company_name = filename.split('_')[0]
+            balance_sheet_path = os.path.join(input_folder_path, f"{company_name}_balance_sheet.csv")
+            cash_flow_path = os.path.join(input_folder_path, f"{company_name}_cash_flow.csv")
+            income_statement_path = os.path.join(input_folder_path, f"{company_name}_income_statement.csv")
 
-        summary = analyze_company(company_name, balance_sheet_path, cash_flow_path, income_statement_path)
-        if summary is not None:
-            all_summaries.append(summary)
+            summary = analyze_company(company_name, balance_sheet_path, cash_flow_path, income_statement_path)
+            if summary is not None:
+                all_summaries.append(summary)
 
-# Only concatenate if there are valid summaries
-if all_summaries:
-    combined_summary = pd.concat(all_summaries, keys=[f"{company_name}" for company_name in os.listdir(input_folder_path) if 'balance_sheet' in company_name.split('_')[0]])
-    combined_summary_filename = os.path.join(output_folder_path, "all_companies_summary.csv")
-    combined_summary.to_csv(combined_summary_filename, index=True)
-else:
-    print("No valid summaries were generated due to missing columns.")
+    # Only concatenate if there are valid summaries
+    if all_summaries:
+        combined_summary = pd.concat(all_summaries, keys=[f"{company_name}" for company_name in os.listdir(input_folder_path) if 'balance_sheet' in company_name.split('_')[0]])
+        combined_summary_filename = os.path.join(output_folder_path, "all_companies_summary.csv")
+        combined_summary.to_csv(combined_summary_filename, index=True)
+    else:
+        print("No valid summaries were generated due to missing columns.")
@@ -0,0 +1,205 @@
+import asyncio
+import random
+import time
+import logging
+import datetime
+import email.utils
+import aiohttp
+
+# Status codes worth retrying: rate limiting and transient server errors
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+class RetryableError(Exception):
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """
+    Continuous-refill token bucket expressed as a budget per minute.
+    """
+
+    def __init__(self, per_minute, capacity=None):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity or per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount=1):
+        amount = min(amount, self.capacity)  # A single oversized request must still be able to go out
+        async with self._lock:
+            self._refill()
+            while self.tokens < amount:
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= amount
+
+
+def parse_retry_after(value):
+    """
+    Seconds to wait from a Retry-After header, given either as seconds or as an HTTP date;
+    None when it is missing or unreadable.
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=datetime.timezone.utc)
+    return max(0.0, (retry_at - datetime.datetime.now(datetime.timezone.utc)).total_seconds())
+
+
+def estimate_tokens(messages, max_tokens=0):
+    """
+    Rough token estimate (about 4 characters per token) used to pace the tokens-per-minute budget.
+    """
+    characters = sum(len(message['content']) for message in messages)
+    return characters // 4 + (max_tokens or 0)
+
+
+class AsyncAnalysisRunner:
+    """
+    Runs chat completion jobs against an OpenAI-compatible endpoint with bounded concurrency.
+
+    Up to `max_in_flight` requests are outstanding at once. Separate requests-per-minute and
+    tokens-per-minute buckets pace submissions, and 429/5xx responses are retried with
+    jittered exponential backoff (honouring Retry-After when the server sends it).
+    """
+
+    def __init__(self, api_base, api_key, model="gpt-4o-mini", max_in_flight=8,
+                 requests_per_minute=500, tokens_per_minute=200000, max_retries=6,
+                 base_delay=1.0, max_delay=60.0, timeout=300, generation_params=None):
+        self.url = f"{api_base.rstrip('/')}/chat/completions"
+        self.headers = {"Authorization": f"Bearer {api_key}"}
+        self.model = model
+        self.max_in_flight = max_in_flight
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.timeout = timeout
+        self.generation_params = generation_params or {}
+        self.stats = {"completed": 0, "failed": 0, "retries": 0, "handler_errors": 0}
+
+    def _backoff(self, attempt, retry_after=None):
+        if retry_after is not None:
+            return min(self.max_delay, retry_after)
+        # Full jitter: spread retries so concurrent workers do not hammer the API in lockstep
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    async def _post(self, session, messages):
+        payload = {"model": self.model, "messages": messages, **self.generation_params}
+        async with session.post(self.url, json=payload, headers=self.headers) as response:
+            if response.status in RETRYABLE_STATUS:
+                raise RetryableError(f"HTTP {response.status}",
+                                     parse_retry_after(response.headers.get("Retry-After")))
+            response.raise_for_status()
+            data = await response.json(content_type=None)
+        try:
+            return data['choices'][0]['message']['content']
+        except (KeyError, IndexError, TypeError) as e:
+            raise ValueError(f"Malformed completion response: {e!r}") from e
+
+    async def _run_job(self, session, semaphore, request_bucket, token_bucket, job, on_result):
+        estimated = estimate_tokens(job['messages'], self.generation_params.get('max_tokens'))
+        content, error = None, None
+        async with semaphore:
+            for attempt in range(self.max_retries + 1):
+                await request_bucket.acquire()
+                await token_bucket.acquire(estimated)
+                started = time.monotonic()
+                try:
+                    content = await self._post(session, job['messages'])
+                    break
+                except (RetryableError, aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                    error = e
+                    if attempt == self.max_retries:
+                        break
+                    self.stats["retries"] += 1
+                    delay = self._backoff(attempt, getattr(e, 'retry_after', None))
+                    logging.warning(f"Retrying {job['id']} in {delay:.1f}s after error: {e}")
+                    await asyncio.sleep(delay)
+                except (aiohttp.ClientError, ValueError) as e:
+                    # Client errors other than connection failures and unreadable bodies are not retried
+                    error = e
+                    break
+            job['latency'] = time.monotonic() - started
+
+        if content is not None:
+            self.stats["completed"] += 1
+            error = None
+        else:
+            self.stats["failed"] += 1
+            logging.error(f"Job {job['id']} failed: {error}")
+
+        # Persist off the event loop so report writing does not stall other requests
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(None, on_result, job, content, error)
+        except Exception as e:
+            logging.error(f"Result handler failed for {job['id']}: {e}")
+            self.stats["handler_errors"] += 1
+            if content is not None:
+                self.stats["completed"] -= 1
+                self.stats["failed"] += 1
+                await loop.run_in_executor(None, self._report_failure, on_result, job, e)
+
+    @staticmethod
+    def _report_failure(on_result, job, error):
+        try:
+            on_result(job, None, error)
+        except Exception as e:
+            logging.error(f"Result handler failed for {job['id']}: {e}")
+
+    async def _run_job_safely(self, session, semaphore, request_bucket, token_bucket, job, on_result):
+        # One job going wrong in an unexpected way is reported for that job only; the run goes on
+        try:
+            await self._run_job(session, semaphore, request_bucket, token_bucket, job, on_result)
+        except Exception as e:
+            logging.error(f"Job {job['id']} failed: {e}")
+            self.stats["failed"] += 1
+            await asyncio.get_running_loop().run_in_executor(None, self._report_failure, on_result, job, e)
+
+    async def run(self, jobs, on_result):
+        """
+        Runs every job and calls on_result(job, content, error) as each one completes.
+        A job that fails, or whose on_result raises, is reported as on_result(job, None, error)
+        without stopping the others.
+        """
+        semaphore = asyncio.Semaphore(self.max_in_flight)
+        request_bucket = TokenBucket(self.requests_per_minute)
+        token_bucket = TokenBucket(self.tokens_per_minute)
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        connector = aiohttp.TCPConnector(limit=self.max_in_flight)
+        async with aiohttp.ClientSession(timeout=timeout, connector=connector) as session:
+            await asyncio.gather(*(
+                self._run_job_safely(session, semaphore, request_bucket, token_bucket, job, on_result)
+                for job in jobs
+            ))
+        return self.stats
+
+
+def run_analysis_jobs(jobs, on_result, **runner_kwargs):
+    """
+    Synchronous entry point for scripts: runs all jobs and returns the runner statistics.
+    """
+    runner = AsyncAnalysisRunner(**runner_kwargs)
+    started = time.monotonic()
+    stats = asyncio.run(runner.run(jobs, on_result))
+    stats["wall_time"] = time.monotonic() - started
+    return stats
@@ -0,0 +1,192 @@
+import os
+import re
+import json
+import time
+import requests
+
+# Batch states after which polling stops
+TERMINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+
+def make_custom_id(company_folder, file_path):
+    """
+    Builds a stable custom_id from the ticker folder and the extracted text file name,
+    so the same document always maps to the same batch line across runs.
+    """
+    stem = os.path.splitext(os.path.basename(file_path))[0]
+    return re.sub(r'[^A-Za-z0-9_.-]', '-', f"{company_folder.lower()}__{stem}")
+
+
+def write_batch_requests(jobs, requests_path, model, generation_params=None):
+    """
+    Writes one /v1/chat/completions request per job in the Batch API JSONL format.
+    """
+    os.makedirs(os.path.dirname(requests_path) or ".", exist_ok=True)
+    with open(requests_path, 'w', encoding='utf-8') as file:
+        for job in jobs:
+            body = {"model": model, "messages": job['messages'], **(generation_params or {})}
+            file.write(json.dumps({
+                "custom_id": job['id'],
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": body,
+            }) + "\n")
+    return requests_path
+
+
+def load_state(state_path):
+    if os.path.exists(state_path):
+        with open(state_path, 'r', encoding='utf-8') as file:
+            return json.load(file)
+    return {"batch_id": None, "input_file_id": None, "output_file_id": None,
+            "status": None, "jobs": {}, "ingested": []}
+
+
+def save_state(state, state_path):
+    # Write through a temporary file so an interruption never leaves a truncated state file
+    tmp_path = state_path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as file:
+        json.dump(state, file, indent=2)
+    os.replace(tmp_path, state_path)
+
+
+def parse_batch_result(line):
+    """
+    Returns (custom_id, content, error) for one line of a batch output file.
+    """
+    record = json.loads(line)
+    custom_id = record.get('custom_id')
+    if record.get('error'):
+        return custom_id, None, record['error'].get('message', str(record['error']))
+    response = record.get('response') or {}
+    if response.get('status_code') != 200:
+        return custom_id, None, f"HTTP {response.get('status_code')}: {response.get('body')}"
+    return custom_id, response['body']['choices'][0]['message']['content'], None
+
+
+def ingest_batch_results(results_path, state, on_result, state_path=None):
+    """
+    Hands every not-yet-ingested result to on_result(job, content, error).
+
+    Progress is recorded in the state after each result, so an interrupted ingest
+    resumes where it stopped instead of re-rendering finished reports.
+    """
+    ingested = set(state['ingested'])
+    count = 0
+    with open(results_path, 'r', encoding='utf-8') as file:
+        for line in file:
+            if not line.strip():
+                continue
+            custom_id, content, error = parse_batch_result(line)
+            if custom_id in ingested or custom_id not in state['jobs']:
+                continue
+            job = dict(state['jobs'][custom_id], id=custom_id)
+            on_result(job, content, error)
+            ingested.add(custom_id)
+            state['ingested'].append(custom_id)
+            count += 1
+            if state_path:
+                save_state(state, state_path)
+    return count
+
+
+class BatchClient:
+    """
+    Thin client for the OpenAI Files and Batches endpoints.
+    """
+
+    def __init__(self, api_base, api_key, session=None):
+        self.api_base = api_base.rstrip('/')
+        self.session = session or requests.Session()
+        self.session.headers["Authorization"] = f"Bearer {api_key}"
+
+    def upload_file(self, path):
+        with open(path, 'rb') as file:
+            response = self.session.post(f"{self.api_base}/files", data={"purpose": "batch"},
+                                         files={"file": (os.path.basename(path), file)})
+        response.raise_for_status()
+        return response.json()['id']
+
+    def create_batch(self, input_file_id, completion_window="24h"):
+        response = self.session.post(f"{self.api_base}/batches", json={
+            "input_file_id": input_file_id,
+            "endpoint": "/v1/chat/completions",
+            "completion_window": completion_window,
+        })
+        response.raise_for_status()
+        return response.json()
+
+    def get_batch(self, batch_id):
+        response = self.session.get(f"{self.api_base}/batches/{batch_id}")
+        response.raise_for_status()
+        return response.json()
+
+    def download_file(self, file_id, path):
+        with self.session.get(f"{self.api_base}/files/{file_id}/content", stream=True) as response:
+            response.raise_for_status()
+            tmp_path = path + ".tmp"
+            with open(tmp_path, 'wb') as file:
+                for block in response.iter_content(chunk_size=1 << 16):
+                    file.write(block)
+        os.replace(tmp_path, path)
+        return path
+
+
+def reset_batch(work_directory):
+    """
+    Removes the state and files of a finished batch, so the next run_batch in work_directory
+    submits a new batch instead of picking up the old one. Other files in the directory are kept.
+    """
+    for name in ("batch_state.json", "requests.jsonl", "output_file.jsonl", "error_file.jsonl"):
+        path = os.path.join(work_directory, name)
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def run_batch(jobs, work_directory, client, model, on_result, poll_interval=60, generation_params=None):
+    """
+    Submits all jobs as one batch, polls until it finishes and ingests the results.
+
+    Every step is recorded in work_directory/batch_state.json. Re-running after an
+    interruption picks up the existing batch instead of submitting a new one; call
+    reset_batch once a batch is finished and ingested to submit the next one.
+    """
+    os.makedirs(work_directory, exist_ok=True)
+    state_path = os.path.join(work_directory, "batch_state.json")
+    state = load_state(state_path)
+
+    if state['batch_id'] is None:
+        state['jobs'] = {job['id']: {k: v for k, v in job.items() if k not in ('id', 'messages')}
+                         for job in jobs}
+        requests_path = write_batch_requests(jobs, os.path.join(work_directory, "requests.jsonl"),
+                                             model, generation_params)
+        if state['input_file_id'] is None:
+            state['input_file_id'] = client.upload_file(requests_path)
+            save_state(state, state_path)
+        batch = client.create_batch(state['input_file_id'])
+        state['batch_id'] = batch['id']
+        state['status'] = batch['status']
+        save_state(state, state_path)
+        print(f"Submitted batch {batch['id']} with {len(jobs)} requests")
+
+    while state['status'] not in TERMINAL_STATUSES:
+        batch = client.get_batch(state['batch_id'])
+        state['status'] = batch['status']
+        state['output_file_id'] = batch.get('output_file_id')
+        state['error_file_id'] = batch.get('error_file_id')
+        save_state(state, state_path)
+        print(f"Batch {state['batch_id']}: {batch['status']} {batch.get('request_counts', {})}")
+        if state['status'] not in TERMINAL_STATUSES:
+            time.sleep(poll_interval)
+
+    ingested = 0
+    for key in ('output_file_id', 'error_file_id'):
+        if not state.get(key):
+            continue
+        results_path = os.path.join(work_directory, f"{key.replace('_id', '')}.jsonl")
+        if not os.path.exists(results_path):
+            client.download_file(state[key], results_path)
+        ingested += ingest_batch_results(results_path, state, on_result, state_path)
+
+    print(f"Batch {state['batch_id']} {state['status']}: ingested {ingested} results")
+    return state
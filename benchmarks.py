@@ -0,0 +1,337 @@
+import os
+import sys
+import json
+import time
+import random
+import hashlib
+import logging
+import resource
+import importlib
+import subprocess
+import multiprocessing
+
+# Corpus shape for `python benchmarks.py`; the same settings always generate the same files
+BENCH_COMPANIES = int(os.getenv('FX_BENCH_COMPANIES', 6))
+BENCH_SIZE_KB = int(os.getenv('FX_BENCH_SIZE_KB', 400))
+BENCH_DEPTH = int(os.getenv('FX_BENCH_DEPTH', 6))
+BENCH_TABLES = int(os.getenv('FX_BENCH_TABLES', 10))
+BENCH_FX_DENSITY = float(os.getenv('FX_BENCH_FX_DENSITY', 0.2))
+BENCH_SEED = int(os.getenv('FX_BENCH_SEED', 0))
+BENCH_HISTORY = os.getenv('FX_BENCH_HISTORY', 'benchmark_history.json')
+# Each stage runs this many times and the fastest is kept
+BENCH_REPEAT = int(os.getenv('FX_BENCH_REPEAT', 3))
+# A stage is reported as a regression when it is this much slower than the last comparable run
+BENCH_TOLERANCE = float(os.getenv('FX_BENCH_TOLERANCE', 0.2))
+
+SECTIONS = ["Item 1. Financial Statements", "Item 2. Management's Discussion and Analysis",
+            "Item 3. Quantitative and Qualitative Disclosures About Market Risk", "Item 4. Controls and Procedures"]
+
+FX_SENTENCES = [
+    "Our foreign exchange exposure arises mainly from net sales denominated in {currency}.",
+    "We use forward contract hedging to reduce the currency risk on forecasted purchases.",
+    "Translation exposure results from consolidating subsidiaries whose functional currency is the {currency}.",
+    "A 10% strengthening of the U.S. dollar against the {currency} would have reduced operating income by ${amount} million.",
+    "Transaction exposure on intercompany balances is offset where possible through a natural hedge.",
+    "The notional amount of outstanding foreign currency derivatives was ${amount} million at quarter end.",
+]
+
+# Filler avoids every FX keyword so fx_density alone decides how many paragraphs are extracted
+FILLER_SENTENCES = [
+    "Operating costs increased {pct}% compared with the same quarter last year.",
+    "Inventory levels were broadly unchanged during the period.",
+    "Research and development expenses grew as headcount increased.",
+    "Capital expenditure of ${amount} million was spent on facilities and equipment.",
+    "Management believes cash on hand is sufficient for the next twelve months.",
+    "General and administrative expenses declined due to lower professional fees.",
+]
+
+CURRENCIES = ["euro", "British pound", "Japanese yen", "Chinese renminbi", "Canadian dollar"]
+REGIONS = ["Americas", "Europe", "Greater China", "Japan", "Rest of Asia Pacific"]
+
+
+def _ix_number(rng, concept):
+    value = f"{rng.randint(100, 99999):,}"
+    return (f'<ix:nonFraction name="us-gaap:{concept}" contextRef="c-{rng.randint(1, 40)}" unitRef="usd" '
+            f'decimals="-6" scale="6">{value}</ix:nonFraction>')
+
+
+def _sentence(rng, templates):
+    return rng.choice(templates).format(currency=rng.choice(CURRENCIES), amount=rng.randint(5, 900),
+                                        pct=rng.randint(1, 30))
+
+
+def _paragraph(rng, depth, fx_density):
+    templates = FX_SENTENCES if rng.random() < fx_density else FILLER_SENTENCES
+    text = " ".join(_sentence(rng, templates) for _ in range(rng.randint(3, 6)))
+    text += f" Reported amount: {_ix_number(rng, 'OperatingIncomeLoss')}."
+    return "<div>" * depth + f"<p>{text}</p>" + "</div>" * depth
+
+
+def _table(rng, geographic):
+    if geographic:
+        header = ["Net sales by reportable segment", "Three Months Ended 2024", "Three Months Ended 2023"]
+        rows = [[region] + [_ix_number(rng, "Revenues") for _ in range(2)] for region in REGIONS]
+        rows.append(["Total net sales"] + [_ix_number(rng, "Revenues") for _ in range(2)])
+    else:
+        header = ["Balance sheet item", "2024", "2023"]
+        rows = [[item] + [_ix_number(rng, "Assets") for _ in range(2)]
+                for item in ["Cash and cash equivalents", "Accounts receivable", "Inventories", "Total assets"]]
+    cells = "".join(f"<th>{cell}</th>" for cell in header)
+    body = "".join("<tr>" + "".join(f"<td>{cell}</td>" for cell in row) + "</tr>" for row in rows)
+    return f"<table><tr>{cells}</tr>{body}</table>"
+
+
+def generate_filing(company, size_kb=BENCH_SIZE_KB, depth=BENCH_DEPTH, tables=BENCH_TABLES,
+                    fx_density=BENCH_FX_DENSITY, seed=BENCH_SEED, year=2024):
+    """
+    A deterministic iXBRL-style 10-Q: nested div paragraphs (a share fx_density of them about FX
+    risk) with ix:nonFraction facts, section headings and `tables` tables, every other one a
+    geographic revenue table, spread evenly through roughly size_kb of HTML.
+    """
+    rng = random.Random(f"{seed}-{company}")
+    blocks = []
+    size = 0
+    while size < size_kb * 1024:
+        if len(blocks) % 25 == 0:
+            blocks.append(f"<h2>{SECTIONS[(len(blocks) // 25) % len(SECTIONS)]}</h2>")
+        blocks.append(_paragraph(rng, depth, fx_density))
+        size += len(blocks[-1])
+    step = max(1, len(blocks) // (tables + 1))
+    for index in range(tables):
+        blocks.insert((index + 1) * step + index, _table(rng, geographic=index % 2 == 0))
+    return (f'<html xmlns:ix="http://www.xbrl.org/2013/inlineXBRL"><head><title>{company} Inc - 10-Q {year}</title>'
+            f'</head><body>{"".join(blocks)}</body></html>')
+
+
+def generate_statements(company, periods=4, extra_rows=40, seed=BENCH_SEED):
+    """
+    Balance sheet, cash flow and income statement CSVs in the layout the quantification script
+    reads: line items as rows (first column unnamed), one column per period.
+    """
+    rng = random.Random(f"{seed}-{company}-statements")
+    header = "," + ",".join(f"{2024 - period}-09-30" for period in range(periods))
+
+    def statement(key_rows):
+        rows = key_rows + [f"Line Item {index}" for index in range(extra_rows)]
+        return "\n".join([header] + [f"{row}," + ",".join(str(rng.randint(-5000, 90000) * 1000)
+                                                           for _ in range(periods)) for row in rows]) + "\n"
+
+    return {
+        "balance_sheet": statement(["Total Debt", "Net Debt"]),
+        "cash_flow": statement(["Free Cash Flow"]),
+        "income_statement": statement(["Net Income From Continuing Operation Net Minority Interest"]),
+    }
+
+
+def generate_report_text(company, sections=10, seed=BENCH_SEED):
+    """
+    Text as extracted from a generated FX risk report PDF, with every label the compile step reads.
+    """
+    rng = random.Random(f"{seed}-{company}-report")
+    from report_parsing import FX_RISK_FIELDS
+    lines = [f"FX Risk Rating Analysis for {company}", f"Company: {company}"]
+    for _ in range(sections):
+        for spec in FX_RISK_FIELDS.values():
+            label = spec if isinstance(spec, str) else spec[1]
+            lines.append(f"{label}: {rng.choice(['Low', 'Moderate', 'High'])}")
+            if not isinstance(spec, str):
+                lines.append(f"- {spec[0]}: {_sentence(rng, FX_SENTENCES)}")
+        lines.extend(_sentence(rng, FILLER_SENTENCES) for _ in range(5))
+    return "\n".join(lines) + "\n"
+
+
+def write_corpus(directory, companies=BENCH_COMPANIES, **filing_params):
+    """
+    Writes the synthetic corpus: raw filings (.txt, as downloaded), statement CSVs and report
+    texts. Returns the company names.
+    """
+    names = [f"SYN{index:03d}" for index in range(companies)]
+    for name in names:
+        filing_dir = os.path.join(directory, "annual_reports", name.lower(), "10-Q")
+        os.makedirs(filing_dir, exist_ok=True)
+        with open(os.path.join(filing_dir, f"{name.lower()}-10q.txt"), 'w', encoding='utf-8') as file:
+            file.write(generate_filing(name, **filing_params))
+        statements_dir = os.path.join(directory, "quantitative")
+        os.makedirs(statements_dir, exist_ok=True)
+        for statement, content in generate_statements(name, seed=filing_params.get("seed", BENCH_SEED)).items():
+            with open(os.path.join(statements_dir, f"{name}_{statement}.csv"), 'w', encoding='utf-8') as file:
+                file.write(content)
+        reports_dir = os.path.join(directory, "reports")
+        os.makedirs(reports_dir, exist_ok=True)
+        with open(os.path.join(reports_dir, f"{name}.txt"), 'w', encoding='utf-8') as file:
+            file.write(generate_report_text(name, seed=filing_params.get("seed", BENCH_SEED)))
+    return names
+
+
+# Stages. Each returns (items, input bytes, outputs); outputs are checksummed to catch behaviour changes.
+
+def bench_generate_html(directory, names):
+    convert = importlib.import_module("2_convert_ixbrl_to_html")
+    outputs, size = [], 0
+    for name in names:
+        source = os.path.join(directory, "annual_reports", name.lower(), "10-Q", f"{name.lower()}-10q.txt")
+        content = convert.read_file(source)
+        size += len(content)
+        html = convert.generate_html(content)
+        html_path = os.path.join(directory, "parsed_reports_html", name.lower(), f"{name.lower()}-10q.html")
+        os.makedirs(os.path.dirname(html_path), exist_ok=True)
+        convert.save_html(html, html_path)
+        outputs.append(hashlib.sha256(html.encode('utf-8')).hexdigest())
+    return len(names), size, outputs
+
+
+def _html_paths(directory, names):
+    return [os.path.join(directory, "parsed_reports_html", name.lower(), f"{name.lower()}-10q.html") for name in names]
+
+
+def bench_extract_fx(directory, names):
+    extract = importlib.import_module("3_extract_qualitative")
+    outputs = []
+    for path in _html_paths(directory, names):
+        company_name, document_year, text = extract.extract_fx_related_content_large_file(path)
+        # Paragraphs are collected in a set, so their order is not stable between processes
+        outputs.append([company_name, document_year, sorted(text.split("\n\n"))])
+    return len(names), sum(os.path.getsize(path) for path in _html_paths(directory, names)), outputs
+
+
+def bench_geographic_tables(directory, names):
+    tables = importlib.import_module("4a_extract_table_attempt3_(inactive)")
+    outputs = [tables.extract_geographic_revenue_tables(path) for path in _html_paths(directory, names)]
+    return len(names), sum(os.path.getsize(path) for path in _html_paths(directory, names)), outputs
+
+
+def bench_statements(directory, names):
+    quantification = importlib.import_module("_quantification_(inactive)")
+    quantification.output_folder_path = os.path.join(directory, "quantification_output")
+    os.makedirs(quantification.output_folder_path, exist_ok=True)
+    statements_dir = os.path.join(directory, "quantitative")
+    outputs, size = [], 0
+    for name in names:
+        paths = [os.path.join(statements_dir, f"{name}_{statement}.csv")
+                 for statement in ("balance_sheet", "cash_flow", "income_statement")]
+        size += sum(os.path.getsize(path) for path in paths)
+        outputs.append(quantification.analyze_company(name, *paths).round(6).to_csv())
+    return len(names), size, outputs
+
+
+def extract_value(text, label):
+    # The per-label search 6_compiled_document.py used before the single-pass scanner; kept as the baseline
+    try:
+        start = text.index(label) + len(label)
+        end = text.index("\n", start)
+        return text[start:end].strip()
+    except ValueError:
+        return "No Information/Not Found"
+
+
+def bench_extract_value(directory, names):
+    from report_parsing import FX_RISK_FIELDS, parse_labelled_fields
+    labels = [spec if isinstance(spec, str) else spec[0] for spec in FX_RISK_FIELDS.values()]
+    outputs, size = [], 0
+    for name in names:
+        with open(os.path.join(directory, "reports", f"{name}.txt"), encoding='utf-8') as file:
+            text = file.read()
+        size += len(text)
+        outputs.append([extract_value(text, label) for label in labels])
+        outputs.append(parse_labelled_fields(text))
+    return len(names), size, outputs
+
+
+STAGES = {
+    "generate_html": bench_generate_html,
+    "extract_fx_related_content": bench_extract_fx,
+    "extract_geographic_revenue_tables": bench_geographic_tables,
+    "statement_quantification": bench_statements,
+    "extract_value": bench_extract_value,
+}
+
+
+def run_stage(stage, directory, names, repeat=BENCH_REPEAT):
+    """
+    Runs one stage `repeat` times in the current (fresh) process and returns its measurements
+    for the fastest run. Peak RSS is the process high-water mark, so it includes the
+    interpreter and the stage's imports.
+    """
+    logging.disable(logging.INFO)
+    seconds = None
+    for _ in range(max(1, repeat)):
+        started = time.perf_counter()
+        items, size, outputs = STAGES[stage](directory, names)
+        elapsed = time.perf_counter() - started
+        seconds = elapsed if seconds is None else min(seconds, elapsed)
+    return {
+        "seconds": round(seconds, 4),
+        "items_per_s": round(items / seconds, 2) if seconds else None,
+        "mb_per_s": round(size / 1024 / 1024 / seconds, 2) if seconds else None,
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "checksum": hashlib.sha256(json.dumps(outputs, sort_keys=True, default=str).encode('utf-8')).hexdigest()[:16],
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def compare_with_history(run, history, tolerance=BENCH_TOLERANCE, window=5, min_delta=0.01):
+    """
+    Regressions against earlier runs with the same corpus settings: stages slower than the median
+    of the last `window` of them by more than `tolerance` (and at least min_delta seconds), or
+    whose output checksum changed since the latest one.
+    """
+    previous = [entry for entry in history if entry["corpus"] == run["corpus"]][-window:]
+    regressions = []
+    for stage, result in run["stages"].items():
+        before = [entry["stages"][stage] for entry in previous if stage in entry["stages"]]
+        if not before:
+            continue
+        median = sorted(entry["seconds"] for entry in before)[len(before) // 2]
+        if result["seconds"] > median * (1 + tolerance) and result["seconds"] - median >= min_delta:
+            regressions.append(f"{stage}: {result['seconds']}s against a median of {median}s")
+        if result["checksum"] != before[-1]["checksum"]:
+            regressions.append(f"{stage}: output checksum changed ({before[-1]['checksum']} -> {result['checksum']})")
+    return regressions
+
+
+def run_benchmarks(directory, history_path=BENCH_HISTORY, stages=tuple(STAGES), companies=BENCH_COMPANIES,
+                   size_kb=BENCH_SIZE_KB, depth=BENCH_DEPTH, tables=BENCH_TABLES, fx_density=BENCH_FX_DENSITY,
+                   seed=BENCH_SEED):
+    """
+    Generates the corpus, times every stage in its own process and appends the run to the JSON
+    history. Returns (run, regressions).
+    """
+    corpus = {"companies": companies, "size_kb": size_kb, "depth": depth, "tables": tables,
+              "fx_density": fx_density, "seed": seed}
+    names = write_corpus(directory, companies, size_kb=size_kb, depth=depth, tables=tables,
+                         fx_density=fx_density, seed=seed)
+
+    run = {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "commit": git_commit(), "corpus": corpus, "stages": {}}
+    # A fresh spawned process per stage keeps peak RSS and import state independent between stages
+    context = multiprocessing.get_context("spawn")
+    for stage in stages:
+        with context.Pool(1) as pool:
+            run["stages"][stage] = pool.apply(run_stage, (stage, directory, names))
+        print(f"{stage}: {run['stages'][stage]}")
+
+    history = []
+    if os.path.exists(history_path):
+        with open(history_path, 'r', encoding='utf-8') as file:
+            history = json.load(file)
+    regressions = compare_with_history(run, history)
+    history.append(run)
+    with open(history_path, 'w', encoding='utf-8') as file:
+        json.dump(history, file, indent=2)
+    for regression in regressions:
+        print(f"Regression: {regression}")
+    return run, regressions
+
+
+if __name__ == "__main__":
+    # Usage: python benchmarks.py [corpus_directory] [stage ...]
+    # Exits with status 1 when a stage regressed against the previous comparable run
+    directory = sys.argv[1] if len(sys.argv) > 1 else "benchmark_corpus"
+    _, found = run_benchmarks(directory, stages=sys.argv[2:] or tuple(STAGES))
+    sys.exit(1 if found else 0)
@@ -0,0 +1,104 @@
+import re
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import tiktoken
+except ImportError:  # Fall back to a character-based estimate when tiktoken is not installed
+    tiktoken = None
+
+# Paragraphs are separated by blank lines in the extracted qualitative text
+PARAGRAPH_SPLIT = re.compile(r'\n\s*\n')
+# Sentence boundary: terminal punctuation followed by whitespace and an upper-case letter, digit or quote
+SENTENCE_SPLIT = re.compile(r'(?<=[.!?])\s+(?=[A-Z0-9"(])')
+
+
+@lru_cache(maxsize=None)
+def get_encoding(model):
+    """
+    Returns the tiktoken encoding for the model, or None when tiktoken is unavailable.
+    """
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("o200k_base")
+
+
+def count_tokens(text, model="gpt-4o-mini"):
+    """
+    Counts tokens with the target model's tokenizer (about 4 characters per token without tiktoken).
+    """
+    encoding = get_encoding(model)
+    if encoding is None:
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def split_sentences(paragraph):
+    return [sentence for sentence in SENTENCE_SPLIT.split(paragraph) if sentence.strip()]
+
+
+def _split_oversized(text, max_tokens, model):
+    """
+    Splits a single paragraph that exceeds the budget, first on sentences and then on words.
+    """
+    pieces = []
+    for sentence in split_sentences(text):
+        if count_tokens(sentence, model) <= max_tokens:
+            pieces.append(sentence)
+            continue
+        # Running total of per-word counts (with the joining space), so each word is encoded once;
+        # the tokenizers split on spaces before merging, so the sum matches the joined text
+        current, current_tokens = [], 0
+        for word in sentence.split():
+            tokens = count_tokens(' ' + word if current else word, model)
+            if current and current_tokens + tokens > max_tokens:
+                pieces.append(' '.join(current))
+                current, current_tokens = [], count_tokens(word, model)
+            else:
+                current_tokens += tokens
+            current.append(word)
+        if current:
+            pieces.append(' '.join(current))
+    return pieces
+
+
+def chunk_by_tokens(text, max_tokens, model="gpt-4o-mini"):
+    """
+    Packs paragraphs (or sentences of oversized paragraphs) into chunks of at most max_tokens.
+    Boundaries always fall between paragraphs or sentences, never inside a word.
+    """
+    units = []
+    for paragraph in PARAGRAPH_SPLIT.split(text):
+        paragraph = re.sub(r'\s+', ' ', paragraph).strip()
+        if not paragraph:
+            continue
+        tokens = count_tokens(paragraph, model)
+        if tokens <= max_tokens:
+            units.append((paragraph, tokens))
+        else:
+            units.extend((piece, count_tokens(piece, model)) for piece in _split_oversized(paragraph, max_tokens, model))
+
+    chunks, current, current_tokens = [], [], 0
+    for unit, tokens in units:
+        # +2 accounts for the paragraph separator added when joining
+        if current and current_tokens + tokens + 2 > max_tokens:
+            chunks.append('\n\n'.join(current))
+            current, current_tokens = [], 0
+        current.append(unit)
+        current_tokens += tokens + 2
+    if current:
+        chunks.append('\n\n'.join(current))
+    return chunks
+
+
+def map_chunks(chunks, fn, max_workers=4):
+    """
+    Applies fn to every chunk in parallel threads and returns the results in chunk order.
+    """
+    if len(chunks) <= 1:
+        return [fn(chunk) for chunk in chunks]
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(chunks))) as executor:
+        return list(executor.map(fn, chunks))
@@ -0,0 +1,184 @@
+import re
+import sys
+import json
+import math
+import time
+from collections import Counter
+
+from chunking import PARAGRAPH_SPLIT, chunk_by_tokens, count_tokens
+
+# One query per analysis instruction in create_fx_risk_prompt, phrased with the vocabulary filings use
+ANALYSIS_QUERIES = [
+    "overall foreign exchange risk rating translational transactional economic exposure",
+    "currency exposure percentage of revenue costs transactions denominated in euro yen pound renminbi",
+    "impact of foreign currency exchange rate changes on net sales operating income quantitative",
+    "strategy management international operations foreign markets competitive position currency",
+    "historical exchange rate movements strengthening weakening dollar prior period comparison",
+    "hypothetical 10 percent change in exchange rates sensitivity fair value loss scenario",
+    "hedging foreign currency forward contracts options swaps notional amount designated cash flow hedges",
+    "industry competitors peers foreign exchange risk management practices",
+    "mitigate reduce foreign currency risk natural hedge diversification policy",
+    "current exchange rates spot rates reporting period translation adjustments",
+    "expected future impact of foreign currency fluctuations outlook forecast guidance",
+]
+
+STOPWORDS = {
+    "the", "of", "and", "a", "an", "in", "to", "for", "on", "by", "with", "as", "at", "or", "is", "are",
+    "was", "were", "be", "been", "our", "we", "its", "that", "this", "from", "which", "these", "such",
+}
+WORD_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text):
+    return [word for word in WORD_PATTERN.findall(text.lower()) if word not in STOPWORDS]
+
+
+def split_paragraphs(text):
+    return [re.sub(r'\s+', ' ', paragraph).strip() for paragraph in PARAGRAPH_SPLIT.split(text) if paragraph.strip()]
+
+
+class BM25Index:
+    """
+    Okapi BM25 over the paragraphs of one document.
+    """
+
+    def __init__(self, paragraphs, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.term_counts = [Counter(tokenize(paragraph)) for paragraph in paragraphs]
+        self.lengths = [sum(counts.values()) for counts in self.term_counts]
+        self.average_length = (sum(self.lengths) / len(self.lengths)) if self.lengths else 0
+        document_frequency = Counter()
+        for counts in self.term_counts:
+            document_frequency.update(counts.keys())
+        total = len(paragraphs)
+        self.idf = {term: math.log(1 + (total - df + 0.5) / (df + 0.5)) for term, df in document_frequency.items()}
+
+    def scores(self, query):
+        terms = [term for term in tokenize(query) if term in self.idf]
+        scores = []
+        for counts, length in zip(self.term_counts, self.lengths):
+            score = 0.0
+            norm = self.k1 * (1 - self.b + self.b * length / (self.average_length or 1))
+            for term in terms:
+                frequency = counts.get(term)
+                if frequency:
+                    score += self.idf[term] * frequency * (self.k1 + 1) / (frequency + norm)
+            scores.append(score)
+        return scores
+
+
+class EmbeddingReranker:
+    """
+    Reranks BM25 candidates by cosine similarity with a small local sentence-embedding model on CPU.
+    Requires the optional sentence-transformers package.
+    """
+
+    def __init__(self, model_name="sentence-transformers/all-MiniLM-L6-v2"):
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(model_name, device="cpu")
+
+    def rerank(self, query, paragraphs, candidate_ids):
+        if not candidate_ids:
+            return []
+        embeddings = self.model.encode([query] + [paragraphs[i] for i in candidate_ids],
+                                       normalize_embeddings=True, convert_to_numpy=True)
+        similarities = embeddings[1:] @ embeddings[0]
+        order = sorted(range(len(candidate_ids)), key=lambda i: -similarities[i])
+        return [candidate_ids[i] for i in order]
+
+
+def select_context(document, top_k=5, token_budget=8000, model="gpt-4o-mini", reranker=None, queries=ANALYSIS_QUERIES):
+    """
+    Keeps the top-k paragraphs per analysis instruction, up to the token budget.
+
+    Paragraphs are taken round-robin across instructions by rank so every instruction gets
+    evidence before any one of them fills the budget. The result keeps document order.
+    When nothing matches or fits, the leading paragraphs that fit the budget are sent instead,
+    so a document is never analysed as empty.
+    """
+    paragraphs = split_paragraphs(document)
+    if not paragraphs:
+        return document
+    index = BM25Index(paragraphs)
+
+    rankings = []
+    for query in queries:
+        scores = index.scores(query)
+        candidates = [i for i in sorted(range(len(paragraphs)), key=lambda i: -scores[i]) if scores[i] > 0]
+        if reranker is not None:
+            candidates = reranker.rerank(query, paragraphs, candidates[:top_k * 4])
+        rankings.append(candidates[:top_k])
+
+    selected, used_tokens = set(), 0
+    for rank in range(top_k):
+        for candidates in rankings:
+            if rank >= len(candidates) or candidates[rank] in selected:
+                continue
+            paragraph_id = candidates[rank]
+            tokens = count_tokens(paragraphs[paragraph_id], model)
+            if used_tokens + tokens > token_budget:
+                continue
+            selected.add(paragraph_id)
+            used_tokens += tokens
+    if not selected:
+        return leading_context(document, token_budget, model)
+    return '\n\n'.join(paragraphs[i] for i in sorted(selected))
+
+
+def leading_context(document, token_budget, model="gpt-4o-mini"):
+    """
+    The start of the document within the budget, cut on paragraph or sentence boundaries.
+    """
+    chunks = chunk_by_tokens(document, token_budget, model)
+    return chunks[0] if chunks else document
+
+
+def evaluate_selection(held_out_path, top_k=5, token_budget=8000, model="gpt-4o-mini", reranker=None):
+    """
+    Measures evidence recall and prompt-token reduction on a held-out set.
+
+    The held-out file is JSONL with one document per line:
+    {"text": ... or "path": ..., "evidence": ["sentence that must survive selection", ...]}
+    """
+    documents = evidence_total = evidence_kept = full_tokens = selected_tokens = 0
+    elapsed = 0.0
+    with open(held_out_path, 'r', encoding='utf-8') as file:
+        for line in file:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            text = record.get('text')
+            if text is None:
+                with open(record['path'], 'r', encoding='utf-8') as document_file:
+                    text = document_file.read()
+            started = time.perf_counter()
+            context = select_context(text, top_k, token_budget, model, reranker)
+            elapsed += time.perf_counter() - started
+
+            normalized_context = re.sub(r'\s+', ' ', context)
+            for evidence in record.get('evidence', []):
+                evidence_total += 1
+                evidence_kept += re.sub(r'\s+', ' ', evidence).strip() in normalized_context
+            full_tokens += count_tokens(text, model)
+            selected_tokens += count_tokens(context, model)
+            documents += 1
+
+    return {
+        "documents": documents,
+        "evidence_recall": evidence_kept / evidence_total if evidence_total else None,
+        "full_tokens": full_tokens,
+        "selected_tokens": selected_tokens,
+        "token_reduction": full_tokens / selected_tokens if selected_tokens else None,
+        "selection_seconds": elapsed,
+    }
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python context_retrieval.py held_out.jsonl [top_k] [token_budget]")
+        sys.exit(1)
+    result = evaluate_selection(sys.argv[1],
+                                top_k=int(sys.argv[2]) if len(sys.argv) > 2 else 5,
+                                token_budget=int(sys.argv[3]) if len(sys.argv) > 3 else 8000)
+    print(json.dumps(result, indent=2))
@@ -0,0 +1,218 @@
+import os
+import sys
+import csv
+import time
+import logging
+import torch
+
+from local_generation import generate_batch
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# Where ONNX exports are kept so a model is only exported once
+ONNX_EXPORT_DIR = os.getenv('FX_ONNX_EXPORT_DIR', 'onnx_exports')
+
+CPU_BACKENDS = ["eager", "int8", "onnx"]
+
+
+def rss_mb():
+    """
+    Resident set size of this process in MB (peak RSS when psutil and /proc are unavailable).
+    """
+    if psutil is not None:
+        return psutil.Process().memory_info().rss / 2**20
+    try:
+        with open('/proc/self/statm') as file:
+            return int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20
+    except (OSError, ValueError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def conv1d_to_linear(model):
+    """
+    Replaces transformers' Conv1D layers (used by GPT-2 style blocks, weight stored as in x out)
+    with equivalent nn.Linear layers, which dynamic quantization can handle. Returns the count.
+    """
+    try:
+        from transformers.pytorch_utils import Conv1D
+    except ImportError:
+        return 0
+    replaced = 0
+    for parent in list(model.modules()):
+        for name, child in list(parent.named_children()):
+            if isinstance(child, Conv1D):
+                linear = torch.nn.Linear(child.weight.shape[0], child.weight.shape[1])
+                with torch.no_grad():
+                    linear.weight.copy_(child.weight.t())
+                    linear.bias.copy_(child.bias)
+                setattr(parent, name, linear)
+                replaced += 1
+    return replaced
+
+
+def quantized_layer_names(model):
+    from torch.ao.nn.quantized.dynamic import Linear as DynamicQuantizedLinear
+
+    return [name for name, module in model.named_modules() if isinstance(module, DynamicQuantizedLinear)]
+
+
+def quantize_int8(model):
+    """
+    Dynamic int8 quantization of every Linear layer: weights are stored as int8 and activations
+    are quantized on the fly, which speeds up the matrix multiplications that dominate CPU time.
+    Conv1D projections are converted to Linear first. The quantized layer names are kept in
+    model.quantized_layers; a model with nothing to quantize raises RuntimeError instead of
+    silently running in float32.
+    """
+    from torch.ao.quantization import quantize_dynamic
+
+    converted = conv1d_to_linear(model)
+    model = quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    model.quantized_layers = quantized_layer_names(model)
+    if not model.quantized_layers:
+        raise RuntimeError(f"{type(model).__name__} has no Linear layers to quantize; int8 would run in float32")
+    logging.info(f"int8: quantized {len(model.quantized_layers)} Linear layers "
+                 f"({converted} converted from Conv1D)")
+    return model
+
+
+def export_dir_for(model_name, export_dir=ONNX_EXPORT_DIR):
+    return os.path.join(export_dir, model_name.replace('/', '__'))
+
+
+def load_onnx_model(model_name, is_encoder_decoder, export_dir=ONNX_EXPORT_DIR, local_files_only=False):
+    """
+    Loads an ONNX Runtime model through optimum, exporting it on first use and reusing the export afterwards.
+    """
+    try:
+        from optimum.onnxruntime import ORTModelForCausalLM, ORTModelForSeq2SeqLM
+    except ImportError:
+        raise ImportError("The onnx backend needs `pip install optimum[onnxruntime]`")
+
+    model_class = ORTModelForSeq2SeqLM if is_encoder_decoder else ORTModelForCausalLM
+    path = export_dir_for(model_name, export_dir)
+    if os.path.isdir(path) and any(name.endswith('.onnx') for name in os.listdir(path)):
+        logging.info(f"Loading cached ONNX export from {path}")
+        return model_class.from_pretrained(path)
+
+    logging.info(f"Exporting {model_name} to ONNX in {path}")
+    model = model_class.from_pretrained(model_name, export=True, local_files_only=local_files_only)
+    model.save_pretrained(path)
+    return model
+
+
+def load_cpu_model(model_name, model_class, backend="eager", export_dir=ONNX_EXPORT_DIR, num_threads=None,
+                   local_files_only=False):
+    """
+    Loads a local model for CPU inference with the chosen backend:
+    "eager" (float32 PyTorch), "int8" (dynamically quantized PyTorch) or "onnx" (ONNX Runtime).
+    All three expose the same generate() interface. local_files_only skips the Hugging Face Hub
+    and resolves the model from the local cache only.
+    """
+    if backend not in CPU_BACKENDS:
+        raise ValueError(f"CPU backend {backend} is not supported. Choose one of: {', '.join(CPU_BACKENDS)}")
+    if num_threads:
+        torch.set_num_threads(num_threads)
+
+    if backend == "onnx":
+        from transformers import AutoConfig
+
+        is_encoder_decoder = AutoConfig.from_pretrained(model_name, local_files_only=local_files_only).is_encoder_decoder
+        return load_onnx_model(model_name, is_encoder_decoder, export_dir, local_files_only)
+
+    model = model_class.from_pretrained(model_name, torch_dtype=torch.float32, local_files_only=local_files_only).eval()
+    return quantize_int8(model) if backend == "int8" else model
+
+
+def compare_outputs(reference_outputs, candidate_outputs):
+    """
+    Agreement between two lists of generated answers: share of identical answers and the
+    mean word-level Jaccard overlap.
+    """
+    if not reference_outputs:
+        return {"exact_match": None, "token_overlap": None}
+    exact = 0
+    overlaps = []
+    for reference, candidate in zip(reference_outputs, candidate_outputs):
+        reference, candidate = reference or "", candidate or ""
+        exact += reference.strip() == candidate.strip()
+        reference_words, candidate_words = set(reference.split()), set(candidate.split())
+        union = reference_words | candidate_words
+        overlaps.append(len(reference_words & candidate_words) / len(union) if union else 1.0)
+    return {"exact_match": round(exact / len(reference_outputs), 3),
+            "token_overlap": round(sum(overlaps) / len(overlaps), 3)}
+
+
+def check_equivalence(reference_model, candidate_model, tokenizer, texts, max_input_length=512, **generate_kwargs):
+    """
+    Generates the same texts with the eager model and an optimized one and reports how closely they agree.
+    Use greedy decoding so differences come from the backend rather than sampling.
+    """
+    reference = generate_batch(texts, reference_model, tokenizer, max_input_length, **generate_kwargs)
+    candidate = generate_batch(texts, candidate_model, tokenizer, max_input_length, **generate_kwargs)
+    return compare_outputs(reference, candidate)
+
+
+def benchmark_cpu_backends(model_name, model_class, tokenizer, texts, backends=CPU_BACKENDS, output_csv=None,
+                           max_input_length=512, **generate_kwargs):
+    """
+    Loads the model with each backend and reports load time, mean latency per text, RSS growth
+    and agreement with the eager outputs, so the fastest backend that keeps answer quality can be chosen.
+    """
+    rows = []
+    reference_outputs = None
+    for backend in backends:
+        row = {"model": model_name, "backend": backend, "texts": len(texts)}
+        try:
+            rss_before = rss_mb()
+            started = time.perf_counter()
+            model = load_cpu_model(model_name, model_class, backend)
+            row["load_s"] = round(time.perf_counter() - started, 2)
+            row["rss_mb"] = round(rss_mb() - rss_before, 1)
+            if backend == "int8":
+                row["quantized_layers"] = len(model.quantized_layers)
+
+            # One warm-up call so one-off initialisation is not counted as latency
+            generate_batch(texts[:1], model, tokenizer, max_input_length, **generate_kwargs)
+            started = time.perf_counter()
+            outputs = [generate_batch([text], model, tokenizer, max_input_length, **generate_kwargs)[0]
+                       for text in texts]
+            row["latency_s"] = round((time.perf_counter() - started) / len(texts), 3)
+
+            if reference_outputs is None:
+                reference_outputs = outputs
+            row.update(compare_outputs(reference_outputs, outputs))
+            del model
+        except (ImportError, RuntimeError, OSError) as e:
+            row["error"] = str(e)
+        rows.append(row)
+        print(row)
+
+    if output_csv:
+        columns = ["model", "backend", "texts", "load_s", "rss_mb", "quantized_layers", "latency_s", "exact_match",
+                   "token_overlap", "error"]
+        with open(output_csv, 'w', newline='', encoding='utf-8') as file:
+            writer = csv.DictWriter(file, fieldnames=columns)
+            writer.writeheader()
+            writer.writerows(rows)
+    return rows
+
+
+if __name__ == "__main__":
+    # Usage: python cpu_inference.py [t5-small|gpt2] [output.csv]
+    from transformers import AutoTokenizer, AutoModelForSeq2SeqLM, AutoModelForCausalLM
+
+    name = sys.argv[1] if len(sys.argv) > 1 else "t5-small"
+    seq2seq = name.startswith("t5")
+    sample = ["summarize: The company reports revenue in euro and sterling and hedges 60% of forecast "
+              "transactions with forward contracts. A 10% weaker dollar would reduce operating profit by 2%.",
+              "summarize: Translation differences on foreign subsidiaries were recognised in other comprehensive "
+              "income. The group does not hedge its net investment in overseas operations."]
+    generation = {"max_length": 60, "num_beams": 1} if seq2seq else {"max_new_tokens": 40, "do_sample": False}
+    benchmark_cpu_backends(name, AutoModelForSeq2SeqLM if seq2seq else AutoModelForCausalLM,
+                           AutoTokenizer.from_pretrained(name), sample,
+                           output_csv=sys.argv[2] if len(sys.argv) > 2 else None, **generation)
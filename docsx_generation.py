@@ -1,7 +1,24 @@
 from docx import Document
 from docx.shared import Pt
 from docx.enum.text import WD_PARAGRAPH_ALIGNMENT
+from docx.oxml import parse_xml
+from docx.oxml.ns import nsdecls, qn
+from xml.sax.saxutils import escape
 import os
+import sys
+import copy
+import time
+import threading
+import tracemalloc
+from markdown_blocks import parse_markdown, runs_text
+
+# 'template' builds the body XML in bulk on a template loaded once per thread;
+# 'paragraph' is the original one-add_paragraph-per-line DOCXReport
+DOCX_MODE = os.getenv('FX_DOCX_MODE', 'template')
+# Optional styled .docx to build reports on (its existing content is kept as a cover);
+# the python-docx default template is used when unset
+DOCX_TEMPLATE = os.getenv('FX_DOCX_TEMPLATE')
+DOCX_MODES = ["template", "paragraph"]
 
 class DOCXReport:
     def __init__(self, company_name):
@@ -47,20 +64,179 @@ class DOCXReport:
         run = paragraph.add_run(f"{number}. {text}")
         run.font.size = Pt(12)
 
-    def save(self, filename):
-        output_directory = "LLM_result"
-        os.makedirs(output_directory, exist_ok=True)
-
-        docx_path = os.path.join(output_directory, filename)
+    def save(self, docx_path):
+        if os.path.dirname(docx_path):
+            os.makedirs(os.path.dirname(docx_path), exist_ok=True)
         self.document.save(docx_path)
         print(f"Document saved at {docx_path}")
 
-def save_output_to_docx(title, analysis_data, company_name, output_path):
-    # Initialize the DOCX report object with the company name
-    docx_report = DOCXReport(company_name)
-    docx_report.add_chapter(title, analysis_data)
-    
-    # Save the DOCX to the specified output path
-    docx_report.save(output_path)
-    
+
+def _run_xml(text, bold=False):
+    properties = "<w:rPr><w:b/></w:rPr>" if bold else ""
+    # Line breaks inside a run (table cells with <br>) become <w:br/>
+    text = '</w:t><w:br/><w:t xml:space="preserve">'.join(escape(part) for part in text.split("\n"))
+    return f'<w:r>{properties}<w:t xml:space="preserve">{text}</w:t></w:r>'
+
+
+def _paragraph_xml(runs, style=None, centered=False):
+    properties = (f'<w:pStyle w:val="{style}"/>' if style else "") + ('<w:jc w:val="center"/>' if centered else "")
+    properties = f"<w:pPr>{properties}</w:pPr>" if properties else ""
+    return f"<w:p>{properties}{''.join(_run_xml(text, bold) for text, bold in runs)}</w:p>"
+
+
+def _table_xml(rows):
+    columns = max(len(row) for row in rows)
+    grid = "".join('<w:gridCol/>' for _ in range(columns))
+    body = []
+    for row_index, row in enumerate(rows):
+        cells = []
+        for i in range(columns):
+            # The header row is bold throughout, as in the PDF
+            runs = [(text, bold or row_index == 0) for text, bold in (row[i] if i < len(row) else [])]
+            cells.append(f'<w:tc><w:tcPr><w:tcW w:w="0" w:type="auto"/></w:tcPr>{_paragraph_xml(runs)}</w:tc>')
+        body.append(f"<w:tr>{''.join(cells)}</w:tr>")
+    return (f'<w:tbl><w:tblPr><w:tblStyle w:val="TableGrid"/><w:tblW w:w="0" w:type="auto"/></w:tblPr>'
+            f"<w:tblGrid>{grid}</w:tblGrid>{''.join(body)}</w:tbl>")
+
+
+def report_body_xml(title, analysis_data, company_name):
+    """
+    The WordprocessingML for one report: the title block, the chapter heading and the analysis
+    markdown, parsed once into blocks. Headings keep the levels of the paragraph path.
+    """
+    parts = [
+        _paragraph_xml([(f"FX Risk Rating Analysis for {company_name}", False)], "Heading1", centered=True),
+        _paragraph_xml([(f"Company: {company_name}", False)], centered=True),
+        _paragraph_xml([("Report Date: August 2024", False)], centered=True),
+        "<w:p/>",
+        _paragraph_xml([(title, False)], "Heading2"),
+    ]
+    for block in parse_markdown(analysis_data):
+        if block.kind == "heading":
+            parts.append(_paragraph_xml([(runs_text(block.runs), False)], f"Heading{min(block.level, 9)}"))
+        elif block.kind == "bullet":
+            style = "ListBullet" if block.level == 0 else f"ListBullet{min(block.level + 1, 3)}"
+            parts.append(_paragraph_xml(block.runs, style))
+        elif block.kind == "table":
+            parts.append(_table_xml(block.rows))
+        elif block.kind == "blank":
+            parts.append("<w:p/>")
+        else:
+            parts.append(_paragraph_xml(block.runs))
+    return "".join(parts)
+
+
+class DOCXTemplate:
+    """
+    A styled base document loaded once per thread and reused for every report.
+
+    Loading a .docx package (styles, numbering, theme) is the fixed cost of each report, so the
+    template is opened once and only its body is reset from a snapshot between reports. Report
+    content is built as one XML string and parsed in a single call instead of one python-docx
+    object per line. render() rewrites the shared body in place, so an instance must not be used
+    by two threads at once; get_template keeps one per thread.
+    """
+
+    def __init__(self, template_path=None):
+        self.document = Document(template_path)
+        self.body = self.document.element.body
+        self._snapshot = [copy.deepcopy(child) for child in self.body]
+
+    def _reset(self):
+        for child in list(self.body):
+            self.body.remove(child)
+        for child in self._snapshot:
+            self.body.append(copy.deepcopy(child))
+
+    def _append(self, body_xml):
+        # Content goes before the final section properties, as add_paragraph would put it
+        sections = self.body.find(qn("w:sectPr"))
+        for element in parse_xml(f"<w:body {nsdecls('w')}>{body_xml}</w:body>"):
+            if sections is not None:
+                sections.addprevious(element)
+            else:
+                self.body.append(element)
+
+    def render(self, reports, output_path):
+        """
+        Writes reports, a list of (title, analysis_data, company_name), to one .docx with a
+        page break between companies.
+        """
+        self._reset()
+        page_break = '<w:p><w:r><w:br w:type="page"/></w:r></w:p>'
+        self._append(page_break.join(report_body_xml(*report) for report in reports))
+        if os.path.dirname(output_path):
+            os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        self.document.save(output_path)
+
+
+# Templates are kept per thread: with FX_RENDER_WORKERS=0 the analysis threads render reports concurrently
+_local = threading.local()
+
+
+def get_template(template_path=None):
+    template_path = template_path or DOCX_TEMPLATE
+    templates = getattr(_local, "templates", None)
+    if templates is None:
+        templates = _local.templates = {}
+    if template_path not in templates:
+        templates[template_path] = DOCXTemplate(template_path)
+    return templates[template_path]
+
+
+def save_reports_to_docx(reports, output_path, template_path=None):
+    """
+    One consolidated DOCX for several companies; reports is a list of (title, analysis_data, company_name).
+    """
+    get_template(template_path).render(reports, output_path)
+    print(f"Consolidated DOCX with {len(reports)} reports saved at {output_path}")
+
+
+def save_output_to_docx(title, analysis_data, company_name, output_path, mode=None):
+    if (mode or DOCX_MODE) == "template":
+        get_template().render([(title, analysis_data, company_name)], output_path)
+    else:
+        # Initialize the DOCX report object with the company name
+        docx_report = DOCXReport(company_name)
+        docx_report.add_chapter(title, analysis_data)
+
+        # Save the DOCX to the specified output path
+        docx_report.save(output_path)
+
     print(f"DOCX saved at {output_path}")
+
+
+def benchmark_docx(analysis_data, reports=20, output_directory="docx_benchmark", modes=DOCX_MODES):
+    """
+    Mean time and peak traced memory per report for each DOCX mode, plus one consolidated file.
+    """
+    os.makedirs(output_directory, exist_ok=True)
+    results = []
+    for mode in modes:
+        tracemalloc.start()
+        started = time.perf_counter()
+        for index in range(reports):
+            save_output_to_docx("FX Risk Analysis Report", analysis_data, f"COMPANY{index}",
+                                os.path.join(output_directory, f"{mode}_{index}.docx"), mode=mode)
+        seconds = time.perf_counter() - started
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        results.append({"mode": mode, "reports": reports, "ms_per_report": round(1000 * seconds / reports, 2),
+                        "peak_mb": round(peak / 1024 / 1024, 2)})
+
+    started = time.perf_counter()
+    save_reports_to_docx([("FX Risk Analysis Report", analysis_data, f"COMPANY{index}") for index in range(reports)],
+                         os.path.join(output_directory, "consolidated.docx"))
+    results.append({"mode": "consolidated", "reports": reports,
+                    "ms_per_report": round(1000 * (time.perf_counter() - started) / reports, 2)})
+    for row in results:
+        print(row)
+    return results
+
+
+if __name__ == "__main__":
+    # Usage: python docsx_generation.py path/to/analysis.md [reports]
+    if len(sys.argv) < 2:
+        raise SystemExit("Usage: python docsx_generation.py path/to/analysis.md [reports]")
+    with open(sys.argv[1], encoding='utf-8') as file:
+        benchmark_docx(file.read(), int(sys.argv[2]) if len(sys.argv) > 2 else 20)
@@ -0,0 +1,245 @@
+import os
+import csv
+import json
+import time
+import datetime
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Default endpoint used by the analysis scripts
+DEFAULT_API_URL = "https://api.exchangerate-api.com/v4/latest"
+
+# Directory where dated rate snapshots are written
+DEFAULT_SNAPSHOT_DIR = "fx_rate_snapshots"
+
+
+def create_session(pool_size=4, retries=3):
+    """
+    Creates a pooled HTTP session with retries on transient errors.
+    """
+    session = requests.Session()
+    retry = Retry(total=retries, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504])
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def select_rates(rates, target_currencies):
+    """
+    Maps each target currency to its rate, using 'N/A' for currencies missing from the table.
+    Returns {} when no rate table is available, as the analysis did before the shared provider.
+    """
+    if not rates:
+        return {}
+    return {currency: rates.get(currency, 'N/A') for currency in target_currencies}
+
+
+class ExchangeRateProvider:
+    """
+    Serves exchange rates from a TTL cache shared across the run.
+
+    The full rate table for a base currency is fetched once through a pooled session,
+    kept in memory for `ttl_seconds` and written to a snapshot file keyed by date.
+    When the API is unreachable (or `offline` is set) the most recent snapshot is used.
+    """
+
+    def __init__(self, api_url=DEFAULT_API_URL, ttl_seconds=3600, snapshot_dir=DEFAULT_SNAPSHOT_DIR,
+                 session=None, offline=False):
+        self.api_url = api_url.rstrip("/")
+        self.ttl_seconds = ttl_seconds
+        self.snapshot_dir = snapshot_dir
+        self.session = session
+        self.offline = offline
+        self._cache = {}  # base currency -> (fetched_at, rates)
+        self._failed = set()  # base currencies with neither a response nor a snapshot this run
+        self._in_flight = {}  # base currency -> Event set when its fetch finishes
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "fetches": 0, "snapshot_loads": 0, "failures": 0}
+
+    def get_rates(self, base_currency):
+        """
+        Returns the full rate table for the base currency.
+
+        The fetch runs outside the lock; threads asking for the same base currency meanwhile wait
+        for it instead of fetching again. A base currency that could not be fetched and has no
+        snapshot is remembered as failed for the rest of the run and served as {}.
+        """
+        while True:
+            with self._lock:
+                cached = self._cache.get(base_currency)
+                if cached and time.monotonic() - cached[0] < self.ttl_seconds:
+                    self.stats["hits"] += 1
+                    return cached[1]
+                if base_currency in self._failed:
+                    return {}
+                in_flight = self._in_flight.get(base_currency)
+                if in_flight is None:
+                    in_flight = self._in_flight[base_currency] = threading.Event()
+                    break
+            in_flight.wait()
+
+        rates = None
+        try:
+            if not self.offline:
+                rates = self._fetch(base_currency)
+            if rates is None:
+                rates = self._load_latest_snapshot(base_currency)
+        finally:
+            with self._lock:
+                if rates is None:
+                    self._failed.add(base_currency)
+                    self.stats["failures"] += 1
+                else:
+                    self._cache[base_currency] = (time.monotonic(), rates)
+                del self._in_flight[base_currency]
+            in_flight.set()
+        return rates if rates is not None else {}
+
+    def get_exchange_rates(self, base_currency, target_currencies):
+        """
+        Returns exchange rates for the base currency against the target currencies.
+        """
+        return select_rates(self.get_rates(base_currency), target_currencies)
+
+    def prefetch(self, base_currencies):
+        """
+        Loads the rate tables for several base currencies up front so later lookups are cache hits.
+        """
+        for base_currency in set(base_currencies):
+            self.get_rates(base_currency)
+
+    def clear(self):
+        """
+        Drops the in-memory cache and the remembered failures; snapshots on disk are kept.
+        """
+        with self._lock:
+            self._cache.clear()
+            self._failed.clear()
+
+    def _fetch(self, base_currency):
+        if self.session is None:
+            self.session = create_session()
+        try:
+            response = self.session.get(f"{self.api_url}/{base_currency}", timeout=10)
+            response.raise_for_status()  # Raise an HTTPError for bad responses
+            data = response.json()
+        except (requests.exceptions.RequestException, ValueError) as e:
+            print(f"Error fetching exchange rates: {e}")
+            return None
+
+        self.stats["fetches"] += 1
+        rates = data.get('rates', {})
+        self._save_snapshot(base_currency, data.get('date'), rates)
+        return rates
+
+    def _snapshot_path(self, base_currency, date):
+        return os.path.join(self.snapshot_dir, f"{base_currency}_{date}.json")
+
+    def _save_snapshot(self, base_currency, date, rates):
+        if not self.snapshot_dir:
+            return
+        date = date or datetime.date.today().isoformat()
+        path = self._snapshot_path(base_currency, date)
+        tmp_path = path + ".tmp"
+        try:
+            os.makedirs(self.snapshot_dir, exist_ok=True)
+            with open(tmp_path, 'w', encoding='utf-8') as file:
+                json.dump({"base": base_currency, "date": date, "rates": rates}, file)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            # The fetched rates are still served; only the offline fallback is lost
+            print(f"Error saving exchange rate snapshot {path}: {e}")
+
+    def _load_latest_snapshot(self, base_currency):
+        if not self.snapshot_dir or not os.path.isdir(self.snapshot_dir):
+            return None
+        prefix = f"{base_currency}_"
+        snapshots = sorted(name for name in os.listdir(self.snapshot_dir)
+                           if name.startswith(prefix) and name.endswith(".json"))
+        if not snapshots:
+            return None
+        with open(os.path.join(self.snapshot_dir, snapshots[-1]), 'r', encoding='utf-8') as file:
+            data = json.load(file)
+        self.stats["snapshot_loads"] += 1
+        return data.get('rates', {})
+
+
+class HistoricalRateFile:
+    """
+    Serves exchange rates from a local file so runs can be reproduced exactly.
+
+    Accepts either a snapshot JSON written by ExchangeRateProvider
+    ({"base": ..., "date": ..., "rates": {...}}) or a CSV with columns
+    date, base, currency, rate. For CSV files each base currency uses its latest
+    date on or before `as_of`. A base currency without a table of its own is
+    derived as cross rates from the most recent table that quotes it.
+    """
+
+    def __init__(self, path, as_of=None):
+        self.path = path
+        self.as_of = as_of
+        self.tables = self._load()  # base currency -> (date, rates)
+
+    def _load(self):
+        if self.path.endswith(".json"):
+            with open(self.path, 'r', encoding='utf-8') as file:
+                data = json.load(file)
+            return {data['base']: (data.get('date'), data['rates'])}
+
+        tables = {}
+        with open(self.path, 'r', encoding='utf-8', newline='') as file:
+            for row in csv.DictReader(file):
+                if self.as_of and row['date'] > self.as_of:
+                    continue
+                key = (row['date'], row['base'])
+                tables.setdefault(key, {})[row['currency']] = float(row['rate'])
+        if not tables:
+            raise ValueError(f"No exchange rates found in {self.path} on or before {self.as_of}")
+        # Ascending dates, so the latest table of each base currency is kept
+        return {base: (date, tables[(date, base)]) for date, base in sorted(tables)}
+
+    def get_rates(self, base_currency):
+        if base_currency in self.tables:
+            return self.tables[base_currency][1]
+        for date, base in sorted(((date, base) for base, (date, _) in self.tables.items()), reverse=True):
+            table = self.tables[base][1]
+            base_rate = table.get(base_currency)
+            if base_rate:
+                rates = {currency: rate / base_rate for currency, rate in table.items()}
+                rates[base] = 1 / base_rate
+                return rates
+        return {}
+
+    def get_exchange_rates(self, base_currency, target_currencies):
+        return select_rates(self.get_rates(base_currency), target_currencies)
+
+    def prefetch(self, base_currencies):
+        pass
+
+
+_providers = {}
+
+
+def get_default_provider(api_url=DEFAULT_API_URL):
+    """
+    Returns the provider shared by the whole run.
+
+    Set FX_RATE_FILE to a historical rate file for reproducible runs, or
+    FX_RATE_OFFLINE=1 to serve only from existing snapshots.
+    """
+    rate_file = os.getenv('FX_RATE_FILE')
+    key = rate_file or api_url
+    if key not in _providers:
+        if rate_file:
+            _providers[key] = HistoricalRateFile(rate_file, as_of=os.getenv('FX_RATE_AS_OF'))
+        else:
+            _providers[key] = ExchangeRateProvider(
+                api_url,
+                ttl_seconds=float(os.getenv('FX_RATE_TTL', 3600)),
+                snapshot_dir=os.getenv('FX_RATE_SNAPSHOT_DIR', DEFAULT_SNAPSHOT_DIR),
+                offline=os.getenv('FX_RATE_OFFLINE') == '1',
+            )
+    return _providers[key]
@@ -0,0 +1,206 @@
+import os
+import sys
+import json
+import time
+import queue
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from llm_backends import TransformersBackend
+
+# Defaults for `python inference_server.py`; the model is loaded once and shared by every request
+SERVER_MODEL = os.getenv('FX_SERVER_MODEL', 'meta-llama/Llama-2-7b-chat-hf')
+MAX_BATCH_SIZE = int(os.getenv('FX_SERVER_MAX_BATCH', 8))
+MAX_WAIT_MS = float(os.getenv('FX_SERVER_MAX_WAIT_MS', 50))
+MAX_NEW_TOKENS_LIMIT = int(os.getenv('FX_SERVER_MAX_NEW_TOKENS', 512))
+
+
+class PendingRequest:
+    def __init__(self, messages, max_tokens, params):
+        self.messages = messages
+        self.max_tokens = max_tokens
+        self.params = params
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class DynamicBatcher:
+    """
+    Collects concurrent chat requests into batches for one loaded TransformersBackend.
+
+    A batch starts with the first waiting request and takes every request that arrives within
+    `max_wait` seconds, up to `max_batch_size`. Requests with different sampling settings are
+    generated in separate groups; each answer is cut to its own max_new_tokens.
+    """
+
+    def __init__(self, backend, max_batch_size=MAX_BATCH_SIZE, max_wait=MAX_WAIT_MS / 1000):
+        self.backend = backend
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._queue = queue.Queue()
+        self.stats = {"requests": 0, "batches": 0, "generate_seconds": 0.0}
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def submit(self, messages, max_tokens, params):
+        """
+        Queues a request and blocks until its batch has been generated; returns the usage dict.
+        """
+        request = PendingRequest(messages, max_tokens, params)
+        self._queue.put(request)
+        request.done.wait()
+        if request.error:
+            raise request.error
+        return request.result
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            groups = {}
+            for request in self._collect():
+                key = (request.params.get("temperature"), request.params.get("top_p"))
+                groups.setdefault(key, []).append(request)
+            for group in groups.values():
+                self._generate(group)
+
+    def _generate(self, group):
+        started = time.perf_counter()
+        try:
+            results = self.backend.generate_with_usage([request.messages for request in group],
+                                                       [request.max_tokens for request in group],
+                                                       **group[0].params)
+            for request, result in zip(group, results):
+                request.result = result
+        except Exception as e:
+            for request in group:
+                request.error = e
+        self.stats["requests"] += len(group)
+        self.stats["batches"] += 1
+        self.stats["generate_seconds"] += time.perf_counter() - started
+        for request in group:
+            request.done.set()
+
+
+class InferenceHandler(BaseHTTPRequestHandler):
+    """
+    OpenAI-compatible /v1/chat/completions backed by the server's DynamicBatcher.
+
+    Requests with "stream": true are answered as server-sent events once their batch finishes,
+    so streaming clients work unchanged but receive the answer in one burst.
+    """
+
+    def do_GET(self):
+        if self.path.endswith("/models"):
+            self._send_json(200, {"object": "list", "data": [{"id": self.server.model_name, "object": "model"}]})
+        elif self.path.endswith("/stats"):
+            stats = dict(self.server.batcher.stats)
+            stats["mean_batch_size"] = round(stats["requests"] / stats["batches"], 2) if stats["batches"] else 0.0
+            self._send_json(200, stats)
+        else:
+            self.send_error(404)
+
+    def do_POST(self):
+        if not self.path.endswith("/chat/completions"):
+            self.send_error(404)
+            return
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            request = json.loads(self.rfile.read(length) or b"{}")
+            messages = request['messages']
+        except (ValueError, KeyError, TypeError):
+            self._send_json(400, {"error": {"message": "Request must be JSON with a messages list"}})
+            return
+
+        # Only an absent (or null) limit falls back to the server default; 0 is rejected below
+        requested = next((request[key] for key in ("max_tokens", "max_completion_tokens")
+                          if request.get(key) is not None), self.server.max_new_tokens)
+        if isinstance(requested, bool) or not isinstance(requested, int) or requested < 1:
+            self._send_json(400, {"error": {"message": f"max_tokens must be a positive integer, got {requested!r}"}})
+            return
+        max_tokens = min(requested, self.server.max_new_tokens)
+        # response_format is passed on so the backend warns that it cannot honour it
+        params = {key: request[key] for key in ("temperature", "top_p", "response_format")
+                  if request.get(key) is not None}
+        try:
+            result = self.server.batcher.submit(messages, max_tokens, params)
+        except Exception as e:
+            self._send_json(500, {"error": {"message": f"Generation failed: {e}"}})
+            return
+
+        completion_id = f"chatcmpl-local-{int(time.time() * 1000)}"
+        finish_reason = "length" if result["completion_tokens"] >= max_tokens else "stop"
+        if request.get('stream'):
+            self._send_stream(completion_id, result["text"], finish_reason)
+            return
+        self._send_json(200, {
+            "id": completion_id,
+            "object": "chat.completion",
+            "model": self.server.model_name,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": result["text"]},
+                         "finish_reason": finish_reason}],
+            "usage": {"prompt_tokens": result["prompt_tokens"], "completion_tokens": result["completion_tokens"],
+                      "total_tokens": result["prompt_tokens"] + result["completion_tokens"]},
+        })
+
+    def _send_stream(self, completion_id, content, finish_reason):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        for delta, reason in [({"role": "assistant", "content": content}, None), ({}, finish_reason)]:
+            chunk = {"id": completion_id, "object": "chat.completion.chunk",
+                     "choices": [{"index": 0, "delta": delta, "finish_reason": reason}]}
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode('utf-8'))
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+        self.close_connection = True
+
+    def _send_json(self, status, body):
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_inference_server(backend, port=0, host="127.0.0.1", max_batch_size=MAX_BATCH_SIZE,
+                           max_wait=MAX_WAIT_MS / 1000, max_new_tokens=MAX_NEW_TOKENS_LIMIT):
+    """
+    Serves a loaded TransformersBackend in a background thread and returns the server; the base URL is
+    f"http://{host}:{server.server_port}/v1". max_new_tokens caps what any single request may ask for.
+    """
+    server = ThreadingHTTPServer((host, port), InferenceHandler)
+    server.model_name = backend.model
+    server.max_new_tokens = max_new_tokens
+    server.batcher = DynamicBatcher(backend, max_batch_size, max_wait)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    # Usage: python inference_server.py [port]
+    # Then point the analysis at it: FX_LLM_BACKEND=openai-http OPENAI_API_BASE=http://127.0.0.1:8001/v1
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8001
+    server = start_inference_server(TransformersBackend(SERVER_MODEL), port)
+    print(f"Serving {SERVER_MODEL} on http://127.0.0.1:{server.server_port}/v1 "
+          f"(batches of up to {MAX_BATCH_SIZE}, {MAX_WAIT_MS:g} ms window)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,274 @@
+import os
+import sys
+import json
+import time
+import atexit
+import pstats
+import logging
+import cProfile
+import inspect
+import functools
+import tempfile
+import threading
+from contextlib import contextmanager
+
+
+def _temporary_trace_path():
+    """
+    A JSONL trace file for this run, removed at exit. The path is exported as FX_TRACE so worker
+    processes started afterwards (forked or spawned) append to the same file and their spans
+    reach the summary.
+    """
+    handle, path = tempfile.mkstemp(prefix="fx_trace_", suffix=".jsonl")
+    os.close(handle)
+    os.environ['FX_TRACE'] = path
+    owner = os.getpid()
+
+    def remove():
+        if os.getpid() == owner and os.path.exists(path):
+            os.remove(path)
+
+    atexit.register(remove)
+    return path
+
+
+# Every finished span is appended to this JSONL file (one per line, from every process); when unset,
+# a temporary file is created on the first span and removed at exit
+TRACE_PATH = os.getenv('FX_TRACE')
+# FX_PROFILE=1 runs cProfile inside profiled() blocks and writes <name>.prof files to FX_PROFILE_DIR
+PROFILE = os.getenv('FX_PROFILE') == '1'
+PROFILE_DIR = os.getenv('FX_PROFILE_DIR', 'profiles')
+
+# Third-party loggers whose DEBUG output (one line per HTTP request) drowns the scripts' own messages
+NOISY_LOGGERS = ["urllib3", "httpx", "httpcore", "filelock", "huggingface_hub", "openai", "fsspec", "PIL"]
+
+
+def quiet_http_loggers(level=logging.WARNING):
+    for name in NOISY_LOGGERS:
+        logging.getLogger(name).setLevel(level)
+
+
+class Span:
+    def __init__(self, name, attributes, parent):
+        self.name = name
+        self.attributes = attributes
+        self.parent = parent
+        self.counters = {}
+        self.start = time.time()
+        self._started = time.perf_counter()
+        self.seconds = None
+        self.error = None
+
+    def record(self):
+        return {"name": self.name, "start": self.start, "seconds": round(self.seconds, 6), "pid": os.getpid(),
+                "tid": threading.get_ident(), "thread": threading.current_thread().name, "parent": self.parent,
+                "error": self.error,
+                "attributes": self.attributes, "counters": self.counters}
+
+
+class Tracer:
+    """
+    Span timings and counters for the processing stages.
+
+    `with tracer.span("extract", company=..., file=...)` times a block; spans nest per thread.
+    `tracer.count("paragraphs_kept", n)` adds to the innermost open span and to the run totals.
+    Finished spans are kept in memory and appended to a JSONL file (the given path, or a temporary
+    file created when the first span opens), so spans from worker processes end up in the same
+    trace. While a span is open its thread is
+    renamed after it, which makes `py-spy dump` show which stage and file each thread is on.
+    """
+
+    def __init__(self, path=TRACE_PATH):
+        self.path = path
+        # The trace file may hold earlier runs; records() only returns spans started since this
+        self.created = time.time()
+        self.spans = []
+        self.counters = {}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def trace_path(self):
+        """
+        The JSONL trace file, creating a temporary one on first use when no path was given.
+        """
+        with self._lock:
+            if self.path is None:
+                # A worker started after the parent's first span inherits its file through FX_TRACE
+                self.path = os.getenv('FX_TRACE') or _temporary_trace_path()
+            return self.path
+
+    def _stack(self):
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+        return self._local.stack
+
+    @contextmanager
+    def span(self, name, **attributes):
+        # Opened before the span's work starts any worker process, so the workers inherit the path
+        self.trace_path()
+        stack = self._stack()
+        span = Span(name, attributes, stack[-1].name if stack else None)
+        thread = threading.current_thread()
+        thread_name = thread.name
+        label = attributes.get("file") or attributes.get("company")
+        thread.name = f"{name}:{os.path.basename(str(label))}" if label else name
+        stack.append(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            span.seconds = time.perf_counter() - span._started
+            stack.pop()
+            thread.name = thread_name
+            self._finish(span)
+
+    def count(self, name, value=1):
+        stack = self._stack()
+        if stack:
+            stack[-1].counters[name] = stack[-1].counters.get(name, 0) + value
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def _finish(self, span):
+        record = span.record()
+        with self._lock:
+            self.spans.append(record)
+            if self.path:
+                # One short write per line in append mode, so several processes can share the file
+                with open(self.path, 'a', encoding='utf-8') as file:
+                    file.write(json.dumps(record, default=str) + "\n")
+
+    def records(self):
+        """
+        Every span of the run: read back from the JSONL trace (all processes) when there is one.
+        """
+        if self.path and os.path.exists(self.path):
+            return [record for record in load_trace(self.path) if record["start"] >= self.created]
+        with self._lock:
+            return list(self.spans)
+
+    def summary(self, top=10):
+        return summarize(self.records(), top)
+
+
+def load_trace(path):
+    with open(path, 'r', encoding='utf-8') as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+
+def summarize(records, top=10):
+    """
+    A text summary: time per span name, the slowest individual spans with their company/file,
+    and counter totals.
+    """
+    if not records:
+        return "No spans recorded"
+    stages = {}
+    counters = {}
+    for record in records:
+        stage = stages.setdefault(record["name"], {"count": 0, "seconds": 0.0, "max": 0.0, "errors": 0})
+        stage["count"] += 1
+        stage["seconds"] += record["seconds"]
+        stage["max"] = max(stage["max"], record["seconds"])
+        stage["errors"] += 1 if record.get("error") else 0
+        for name, value in record.get("counters", {}).items():
+            counters[name] = counters.get(name, 0) + value
+
+    lines = ["Stage                          spans    total s     mean s      max s  errors"]
+    for name, stage in sorted(stages.items(), key=lambda item: -item[1]["seconds"]):
+        lines.append(f"{name:<30} {stage['count']:>5} {stage['seconds']:>10.2f} {stage['seconds'] / stage['count']:>10.3f} "
+                     f"{stage['max']:>10.3f} {stage['errors']:>7}")
+
+    # Per-file spans are the finest unit of work; company spans are listed only when there are none
+    leaves = ([record for record in records if record["attributes"].get("file")]
+              or [record for record in records if record["attributes"].get("company")])
+    if leaves:
+        lines.append(f"Slowest {min(top, len(leaves))} files/companies:")
+        for record in sorted(leaves, key=lambda record: -record["seconds"])[:top]:
+            label = record["attributes"].get("file") or record["attributes"].get("company")
+            lines.append(f"  {record['seconds']:>9.3f}s  {record['name']:<24} {label}")
+    if counters:
+        lines.append("Counters: " + ", ".join(f"{name}={value:g}" for name, value in sorted(counters.items())))
+    return "\n".join(lines)
+
+
+def export_chrome_trace(records, output_path):
+    """
+    Writes spans in the Chrome trace event format (chrome://tracing, Perfetto, speedscope).
+    """
+    events = [{"name": record["name"], "cat": record["name"], "ph": "X",
+               "ts": int(record["start"] * 1e6), "dur": int(record["seconds"] * 1e6),
+               "pid": record["pid"], "tid": record["tid"],
+               "args": dict(record["attributes"], **record.get("counters", {}),
+                            **({"error": record["error"]} if record.get("error") else {}))}
+              for record in records]
+    threads = {(record["pid"], record["tid"]): record["thread"] for record in records}
+    events += [{"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}}
+               for (pid, tid), name in threads.items()]
+    with open(output_path, 'w', encoding='utf-8') as file:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, file)
+
+
+@contextmanager
+def profiled(name, enabled=None):
+    """
+    Profiles the block with cProfile when FX_PROFILE=1 (or enabled=True) and writes
+    PROFILE_DIR/<name>.prof, readable with `python -m pstats` or snakeviz. Does nothing otherwise,
+    so it can wrap whole stages permanently.
+    """
+    if not (PROFILE if enabled is None else enabled):
+        yield
+        return
+    profile = cProfile.Profile()
+    profile.enable()
+    try:
+        yield
+    finally:
+        profile.disable()
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        path = os.path.join(PROFILE_DIR, f"{name}.{os.getpid()}.prof")
+        profile.dump_stats(path)
+        logging.info(f"Profile written to {path}")
+
+
+tracer = Tracer()
+if hasattr(os, "register_at_fork"):
+    # Forked workers share the parent's file even when the fork comes before the first span
+    os.register_at_fork(before=tracer.trace_path)
+span = tracer.span
+count = tracer.count
+
+
+def traced(name, **attribute_arguments):
+    """
+    Decorator that runs the function in a span; each attribute is taken from the named argument,
+    e.g. @traced("extract", file="html_path").
+    """
+    def decorate(function):
+        signature = inspect.signature(function)
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            arguments = signature.bind_partial(*args, **kwargs).arguments
+            attributes = {attribute: arguments.get(argument) for attribute, argument in attribute_arguments.items()}
+            with tracer.span(name, **attributes):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+if __name__ == "__main__":
+    # Usage: python instrumentation.py trace.jsonl [trace.json]
+    #        python instrumentation.py profile.prof   top functions of a cProfile dump
+    if len(sys.argv) < 2:
+        raise SystemExit("Usage: python instrumentation.py trace.jsonl [chrome_trace.json] | profile.prof")
+    if sys.argv[1].endswith(".prof"):
+        pstats.Stats(sys.argv[1]).sort_stats("cumulative").print_stats(25)
+    else:
+        spans = load_trace(sys.argv[1])
+        print(summarize(spans, top=15))
+        if len(sys.argv) > 2:
+            export_chrome_trace(spans, sys.argv[2])
+            print(f"Chrome trace written to {sys.argv[2]}")
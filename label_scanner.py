@@ -0,0 +1,80 @@
+import re
+from collections import namedtuple
+
+NOT_FOUND = "No Information/Not Found"
+
+# One label occurrence: where it starts, the rest of its line and the section label it falls under
+Occurrence = namedtuple("Occurrence", ["label", "start", "value", "section"])
+
+
+class LabelScanner:
+    """
+    Finds every occurrence of a fixed set of labels in one pass over the text.
+
+    All labels are compiled into a single alternation, longest first, which the regex engine
+    searches with a first-character prefilter. Labels that are prefixes of, or contained in, a
+    longer label are recorded from the longer match, as separate text.index() scans would have
+    found them. Each occurrence remembers the most recent `section_labels` occurrence before it,
+    so a repeated label such as "Assessment" can be resolved per section.
+    """
+
+    def __init__(self, labels, section_labels=()):
+        self.labels = sorted(set(labels) | set(section_labels), key=len, reverse=True)
+        self.section_labels = set(section_labels)
+        self.pattern = re.compile("|".join(re.escape(label) for label in self.labels))
+        # For each label, the shorter labels inside it and their offsets
+        self.nested = {label: [(other, offset) for other in self.labels if other != label
+                               for offset in self._offsets(label, other)]
+                       for label in self.labels}
+
+    @staticmethod
+    def _offsets(text, label):
+        offsets, start = [], text.find(label)
+        while start != -1:
+            offsets.append(start)
+            start = text.find(label, start + 1)
+        return offsets
+
+    def scan(self, text):
+        """
+        Returns {label: [Occurrence, ...]} in text order for every label found.
+        """
+        found = {}
+        seen = set()
+        for match in self.pattern.finditer(text):
+            longest, start = match.group(), match.start()
+            for label, offset in [(longest, 0)] + self.nested[longest]:
+                if (label, start + offset) not in seen:
+                    seen.add((label, start + offset))
+                    found.setdefault(label, []).append(start + offset)
+
+        # Walk the occurrences in position order to attach values and section context
+        events = sorted((start, label) for label, starts in found.items() for start in starts)
+        occurrences = {}
+        section = None
+        for start, label in events:
+            end = text.find("\n", start + len(label))
+            value = text[start + len(label):end].strip() if end != -1 else None
+            occurrences.setdefault(label, []).append(Occurrence(label, start, value, section))
+            if label in self.section_labels:
+                section = label
+        return occurrences
+
+
+def resolve_fields(occurrences, fields):
+    """
+    Maps each field to a value. A field is a label, or (label, section) to take the first
+    occurrence of label inside that section; missing labels give NOT_FOUND.
+    """
+    values = {}
+    for name, spec in fields.items():
+        label, section = (spec, None) if isinstance(spec, str) else spec
+        candidates = [occurrence for occurrence in occurrences.get(label, [])
+                      if section is None or occurrence.section == section]
+        value = candidates[0].value if candidates else None
+        values[name] = value if value is not None else NOT_FOUND
+    return values
+
+
+def section_labels_of(fields):
+    return {spec[1] for spec in fields.values() if not isinstance(spec, str)}
@@ -5,11 +5,14 @@ import os
 # Use a smaller model if possible
 model_id = "meta-llama/Llama-2-7b-chat-hf"  # Consider a smaller model if available
 
+# float16 is only fast on GPU; on CPU it is slow or unsupported, so fall back to float32
+use_cuda = torch.cuda.is_available()
+
 pipeline = transformers.pipeline(
     "text-generation",
     model=model_id,
-    model_kwargs={"torch_dtype": torch.float16},
-    device="cuda" if torch.cuda.is_available() else "cpu",  # Ensure GPU usage if available
+    model_kwargs={"torch_dtype": torch.float16 if use_cuda else torch.float32},
+    device="cuda" if use_cuda else "cpu",  # Ensure GPU usage if available
     use_auth_token=os.getenv('HF_TOKEN')
 )
 
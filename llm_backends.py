@@ -0,0 +1,294 @@
+import os
+import sys
+import json
+import time
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import requests
+
+from streaming import StreamError, stream_chat_completion
+
+
+class BackendError(Exception):
+    pass
+
+
+def format_chat_prompt(messages):
+    """
+    Plain "role: content" prompt used by models without a chat template (as in llama_2.py).
+    """
+    return "\n".join(f"{message['role']}: {message['content']}" for message in messages) + "\nassistant:"
+
+
+class LLMBackend:
+    """
+    Common interface for every model backend.
+
+    generate() returns the full completion for one conversation, batch_generate() answers a
+    list of conversations in order, and stream() yields the completion piece by piece.
+    """
+
+    name = "base"
+    # Generation parameters the backend cannot honour; requesting one logs a warning (once) and it is ignored
+    unsupported_params = ()
+
+    def __init__(self, model):
+        self.model = model
+        self._warned = set()
+
+    def _check_params(self, params):
+        for key in self.unsupported_params:
+            if params.get(key) and key not in self._warned:
+                self._warned.add(key)
+                logging.warning(f"The {self.name} backend does not support {key}; it is ignored, so the "
+                                f"output only follows the instructions in the prompt")
+
+    def generate(self, messages, max_tokens=None, **params):
+        raise NotImplementedError
+
+    def batch_generate(self, conversations, max_tokens=None, **params):
+        return [self.generate(messages, max_tokens, **params) for messages in conversations]
+
+    def stream(self, messages, max_tokens=None, **params):
+        yield self.generate(messages, max_tokens, **params)
+
+
+class OpenAICompatibleBackend(LLMBackend):
+    """
+    Any server speaking the OpenAI /chat/completions protocol: OpenAI itself, the local
+    inference server or the mock server.
+    """
+
+    name = "openai"
+
+    def __init__(self, model="gpt-4o-mini", api_base=None, api_key=None, max_workers=8, timeout=300):
+        super().__init__(model)
+        self.api_base = (api_base or os.getenv('OPENAI_API_BASE', 'https://api.openai.com/v1')).rstrip('/')
+        self.api_key = api_key or os.getenv('OPENAI_API_KEY', '')
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers["Authorization"] = f"Bearer {self.api_key}"
+
+    def _payload(self, messages, max_tokens, params):
+        payload = {"model": self.model, "messages": messages, **params}
+        if max_tokens:
+            payload["max_tokens"] = max_tokens
+        return payload
+
+    def generate(self, messages, max_tokens=None, **params):
+        try:
+            response = self.session.post(f"{self.api_base}/chat/completions",
+                                         json=self._payload(messages, max_tokens, params), timeout=self.timeout)
+            response.raise_for_status()
+            return response.json()['choices'][0]['message']['content']
+        except requests.exceptions.RequestException as e:
+            raise BackendError(f"{self.name} request failed: {e}")
+        except (ValueError, KeyError, IndexError, TypeError) as e:
+            raise BackendError(f"{self.name} returned a malformed response: {e!r}")
+
+    def batch_generate(self, conversations, max_tokens=None, **params):
+        # Requests are independent, so they are simply issued concurrently
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            return list(executor.map(lambda messages: self.generate(messages, max_tokens, **params), conversations))
+
+    def stream(self, messages, max_tokens=None, **params):
+        if max_tokens:
+            params["max_tokens"] = max_tokens
+        try:
+            yield from stream_chat_completion(self.api_base, self.api_key, self.model, messages, params,
+                                              self.session, self.timeout)
+        except (requests.exceptions.RequestException, StreamError) as e:
+            raise BackendError(f"{self.name} stream failed: {e}")
+
+
+class HFInferenceBackend(LLMBackend):
+    """
+    Hugging Face hosted Inference API (text-generation task), as used in hugging_face_api.py.
+    """
+
+    name = "hf-inference"
+    unsupported_params = ("response_format",)
+
+    def __init__(self, model="meta-llama/Meta-Llama-3.1-8B-Instruct", api_token=None, max_workers=4, timeout=300):
+        super().__init__(model)
+        self.url = f"https://api-inference.huggingface.co/models/{model}"
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers["Authorization"] = f"Bearer {api_token or os.getenv('HF_TOKEN', '')}"
+
+    def generate(self, messages, max_tokens=None, **params):
+        self._check_params(params)
+        parameters = {"return_full_text": False, "max_new_tokens": max_tokens or 512}
+        parameters.update({key: value for key, value in params.items() if key in ("temperature", "top_p")})
+        try:
+            response = self.session.post(self.url, json={"inputs": format_chat_prompt(messages),
+                                                         "parameters": parameters}, timeout=self.timeout)
+            response.raise_for_status()
+            return response.json()[0]['generated_text']
+        except (requests.exceptions.RequestException, ValueError, KeyError, IndexError, TypeError) as e:
+            raise BackendError(f"{self.name} request failed: {e!r}")
+
+    def batch_generate(self, conversations, max_tokens=None, **params):
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            return list(executor.map(lambda messages: self.generate(messages, max_tokens, **params), conversations))
+
+
+class TransformersBackend(LLMBackend):
+    """
+    In-process causal language model from `transformers`, run on CPU in float32, optionally
+    int8-quantized or through ONNX Runtime (cpu_backend, see cpu_inference.py).
+    """
+
+    name = "transformers"
+    unsupported_params = ("response_format",)
+
+    def __init__(self, model="microsoft/Phi-3-mini-128k-instruct", tokenizer=None, hf_model=None, num_threads=None,
+                 cpu_backend=None):
+        super().__init__(model)
+        import torch
+        from transformers import AutoModelForCausalLM, AutoTokenizer
+        from cpu_inference import load_cpu_model
+
+        self.torch = torch
+        if num_threads:
+            torch.set_num_threads(num_threads)
+        self.tokenizer = tokenizer or AutoTokenizer.from_pretrained(model)
+        self.hf_model = hf_model.eval() if hf_model is not None else load_cpu_model(
+            model, AutoModelForCausalLM, cpu_backend or os.getenv('FX_CPU_BACKEND', 'eager'))
+        # Decoder-only batches must be padded on the left so generation continues from real tokens
+        self.tokenizer.padding_side = "left"
+        if self.tokenizer.pad_token is None:
+            self.tokenizer.pad_token = self.tokenizer.eos_token
+
+    def _prompt(self, messages):
+        if getattr(self.tokenizer, "chat_template", None):
+            return self.tokenizer.apply_chat_template(messages, tokenize=False, add_generation_prompt=True)
+        return format_chat_prompt(messages)
+
+    def _generation_kwargs(self, max_tokens, params):
+        kwargs = {"max_new_tokens": max_tokens or 256, "pad_token_id": self.tokenizer.pad_token_id}
+        if params.get("temperature"):
+            kwargs.update(do_sample=True, temperature=params["temperature"], top_p=params.get("top_p", 1.0))
+        return kwargs
+
+    def generate_with_usage(self, conversations, max_tokens=None, **params):
+        """
+        Answers the conversations in one padded generate call. max_tokens may be a list with one
+        limit per conversation; the batch runs to the largest and each answer is cut to its own limit.
+        Returns one {"text", "prompt_tokens", "completion_tokens"} dict per conversation.
+        """
+        self._check_params(params)
+        limits = max_tokens if isinstance(max_tokens, list) else [max_tokens or 256] * len(conversations)
+        inputs = self.tokenizer([self._prompt(messages) for messages in conversations],
+                                return_tensors="pt", padding=True)
+        with self.torch.inference_mode():
+            outputs = self.hf_model.generate(**inputs, **self._generation_kwargs(max(limits), params))
+        prompt_length = inputs["input_ids"].shape[1]
+        results = []
+        for row, limit in enumerate(limits):
+            new_tokens = outputs[row, prompt_length:prompt_length + limit]
+            results.append({"text": self.tokenizer.decode(new_tokens, skip_special_tokens=True),
+                            "prompt_tokens": int(inputs["attention_mask"][row].sum()),
+                            "completion_tokens": int((new_tokens != self.tokenizer.pad_token_id).sum())})
+        return results
+
+    def batch_generate(self, conversations, max_tokens=None, **params):
+        return [result["text"] for result in self.generate_with_usage(conversations, max_tokens, **params)]
+
+    def generate(self, messages, max_tokens=None, **params):
+        return self.batch_generate([messages], max_tokens, **params)[0]
+
+    def stream(self, messages, max_tokens=None, **params):
+        from transformers import TextIteratorStreamer
+
+        self._check_params(params)
+        inputs = self.tokenizer(self._prompt(messages), return_tensors="pt")
+        streamer = TextIteratorStreamer(self.tokenizer, skip_prompt=True, skip_special_tokens=True)
+        kwargs = dict(inputs, streamer=streamer, **self._generation_kwargs(max_tokens, params))
+
+        def run():
+            with self.torch.inference_mode():
+                self.hf_model.generate(**kwargs)
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        yield from streamer
+        thread.join()
+
+
+class MockBackend(LLMBackend):
+    """
+    Deterministic offline backend: the same conversation always yields the same text.
+    """
+
+    name = "mock"
+    unsupported_params = ("response_format",)
+
+    def __init__(self, model="mock", latency=0.0):
+        super().__init__(model)
+        self.latency = latency
+
+    def generate(self, messages, max_tokens=None, **params):
+        self._check_params(params)
+        time.sleep(self.latency)
+        digest = hashlib.sha256(json.dumps(messages, sort_keys=True).encode('utf-8')).hexdigest()[:12]
+        ratings = ["Low", "Moderate", "High"]
+        return (f"### Mock FX Risk Analysis\n"
+                f"**Overall FX Risk Rating**: {ratings[int(digest, 16) % 3]}\n"
+                f"- **Executive Summary**: Deterministic mock response {digest}.\n")
+
+    def stream(self, messages, max_tokens=None, **params):
+        for word in self.generate(messages, max_tokens, **params).split(" "):
+            yield word + " "
+
+
+BACKENDS = {
+    "openai": OpenAICompatibleBackend,
+    "hf-inference": HFInferenceBackend,
+    "transformers": TransformersBackend,
+    "mock": MockBackend,
+}
+
+
+def get_backend(name, **kwargs):
+    if name not in BACKENDS:
+        raise ValueError(f"Backend {name} is not supported. Choose one of: {', '.join(BACKENDS)}")
+    return BACKENDS[name](**kwargs)
+
+
+def benchmark_backends(backends, conversations, max_tokens=256):
+    """
+    Runs the same conversations through each backend and reports latency and throughput side by side.
+    """
+    results = []
+    for backend in backends:
+        row = {"backend": backend.name, "model": backend.model, "requests": len(conversations)}
+        try:
+            started = time.perf_counter()
+            first = backend.generate(conversations[0], max_tokens)
+            row["single_latency_s"] = round(time.perf_counter() - started, 3)
+
+            started = time.perf_counter()
+            outputs = backend.batch_generate(conversations, max_tokens)
+            elapsed = time.perf_counter() - started
+            row["batch_total_s"] = round(elapsed, 3)
+            row["requests_per_s"] = round(len(conversations) / elapsed, 2) if elapsed else None
+            row["output_chars"] = len(first) + sum(len(output) for output in outputs)
+        except BackendError as e:
+            row["error"] = str(e)
+        results.append(row)
+        print(row)
+    return results
+
+
+if __name__ == "__main__":
+    # Usage: python llm_backends.py mock openai transformers ...
+    names = sys.argv[1:] or ["mock"]
+    sample = [[{"role": "system", "content": "You are an expert financial analyst specializing in FX risk management."},
+               {"role": "user", "content": f"Summarise the FX risk of a company with {share}% of revenue in EUR."}]
+              for share in (10, 25, 40, 60)]
+    benchmark_backends([get_backend(name) for name in names], sample, max_tokens=128)
@@ -0,0 +1,247 @@
+import re
+import time
+import logging
+from bisect import bisect_left
+import torch
+
+from chunking import SENTENCE_SPLIT
+
+# Questions asked of every chunk by the local summarization models
+ANALYSIS_PROMPTS = {
+    'Company': "Extract the company name from the document",
+    'Year': "Extract the year of the document from the text",
+    'Transaction Exposure': "Detail the transaction exposure of the company",
+    'Translation Exposure': "Detail the translation exposure of the company",
+    'Economic Exposure': "Detail the economic exposure of the company",
+    'Hedging Strategies': "List the hedging strategies used by the company",
+    'FX Risk Management Policies': "Describe the company's FX risk management policies"
+}
+
+
+def prepare_tokenizer(model, tokenizer):
+    """
+    Makes the tokenizer usable for padded batches. Decoder-only models (GPT-2, LLaMA) are padded
+    on the left so generation continues straight after the real prompt tokens.
+    """
+    if not model.config.is_encoder_decoder:
+        tokenizer.padding_side = "left"
+    if tokenizer.pad_token is None:
+        tokenizer.pad_token = tokenizer.eos_token
+    return tokenizer
+
+
+def prompt_prefix_ids(tokenizer, prompts, template):
+    """
+    Token ids of the text that precedes the chunk in each prompt; the template must end with {text}.
+    """
+    if not template.endswith("{text}"):
+        raise ValueError("The prompt template must end with {text}")
+    prefix = template[:-len("{text}")]
+    return {key: tokenizer(prefix.format(prompt=prompt), add_special_tokens=False)['input_ids']
+            for key, prompt in prompts.items()}
+
+
+def special_token_layout(tokenizer):
+    """
+    The special token ids a tokenizer adds before and after a single sequence (e.g. T5 appends </s>).
+    """
+    plain = tokenizer("a", add_special_tokens=False)['input_ids']
+    wrapped = tokenizer("a", add_special_tokens=True)['input_ids']
+    for start in range(len(wrapped) - len(plain) + 1):
+        if wrapped[start:start + len(plain)] == plain:
+            return wrapped[:start], wrapped[start + len(plain):]
+    return [], []
+
+
+def chunk_token_ids(text, tokenizer, max_length=512, reserved_tokens=0, overlap_sentences=1):
+    """
+    Tokenizes the document once and cuts it into chunks that fill the model input exactly.
+
+    Each chunk holds max_length minus the reserved prompt tokens and the model's special tokens.
+    The next chunk starts at the beginning of the last `overlap_sentences` sentences of the previous
+    one, so no text is lost to truncation and every sentence appears whole in some chunk.
+    Requires a fast tokenizer (offset mapping). Returns a list of 1-D token id tensors.
+    """
+    text = re.sub(r'\s+', ' ', text).strip()
+    encoding = tokenizer(text, add_special_tokens=False, return_offsets_mapping=True, verbose=False)
+    ids, offsets = encoding['input_ids'], encoding['offset_mapping']
+    special_prefix, special_suffix = special_token_layout(tokenizer)
+    budget = max_length - reserved_tokens - len(special_prefix) - len(special_suffix)
+    if budget <= 0:
+        raise ValueError(f"max_length {max_length} leaves no room for text after {reserved_tokens} prompt tokens")
+
+    # Token positions where a sentence begins
+    boundary_chars = {match.end() for match in SENTENCE_SPLIT.finditer(text)}
+    sentence_starts = [index for index, (start, _) in enumerate(offsets) if start in boundary_chars]
+
+    chunks, start = [], 0
+    while start < len(ids):
+        end = min(start + budget, len(ids))
+        chunks.append(torch.tensor(ids[start:end], dtype=torch.long))
+        if end == len(ids):
+            break
+        inside = sentence_starts[bisect_left(sentence_starts, start + 1):bisect_left(sentence_starts, end)]
+        start = inside[-overlap_sentences] if overlap_sentences and len(inside) >= overlap_sentences else end
+    return chunks
+
+
+def generate_batch(texts, model, tokenizer, max_input_length=512, **generate_kwargs):
+    """
+    Tokenizes the texts as one padded batch and runs a single generate call over all of them.
+    """
+    prepare_tokenizer(model, tokenizer)
+    inputs = tokenizer(texts, return_tensors="pt", max_length=max_input_length, truncation=True, padding=True)
+    with torch.inference_mode():
+        outputs = model.generate(inputs.input_ids, attention_mask=inputs['attention_mask'],
+                                 pad_token_id=tokenizer.pad_token_id, **generate_kwargs)
+    return tokenizer.batch_decode(outputs, skip_special_tokens=True)
+
+
+def analyze_prompts_batched(text, model, tokenizer, prompts=ANALYSIS_PROMPTS, template="{prompt}: {text}",
+                            max_input_length=512, **generate_kwargs):
+    """
+    Answers every prompt for one chunk with a single batched generate call instead of one call per prompt.
+
+    Each prompt is prefixed to the chunk, so the encoder inputs differ per prompt and cannot share
+    one encoding; batching them lets the seven encoder and beam-search passes run as one set of
+    matrix multiplications. Returns {key: answer}, with None for every key if generation fails.
+    """
+    keys = list(prompts)
+    texts = [template.format(prompt=prompts[key], text=text) for key in keys]
+    try:
+        decoded = generate_batch(texts, model, tokenizer, max_input_length, **generate_kwargs)
+    except Exception as e:
+        logging.error(f"Error in analysis: {e}")
+        return {key: None for key in keys}
+    return dict(zip(keys, decoded))
+
+
+class BatchScheduler:
+    """
+    Groups generation requests from many documents into length-bucketed padded batches.
+
+    Requests are tokenized once, sorted by token length so each batch pads as little as possible,
+    generated batch by batch under torch.inference_mode() and scattered back to their documents.
+    """
+
+    def __init__(self, model, tokenizer, batch_size=16, max_input_length=512, **generate_kwargs):
+        self.model = model
+        self.tokenizer = prepare_tokenizer(model, tokenizer)
+        self.batch_size = batch_size
+        self.max_input_length = max_input_length
+        self.generate_kwargs = generate_kwargs
+        self.requests = []  # (document_id, key, text or token ids)
+        self.stats = {}
+
+    def add(self, document_id, key, text):
+        self.requests.append((document_id, key, text))
+
+    def add_ids(self, document_id, key, input_ids):
+        """
+        Queues an already tokenized request (including special tokens); it is not tokenized again.
+        """
+        self.requests.append((document_id, key, list(input_ids)))
+
+    def _encode(self):
+        text_indices = [i for i, (_, _, item) in enumerate(self.requests) if isinstance(item, str)]
+        input_ids = [item for _, _, item in self.requests]
+        if text_indices:
+            encoded = self.tokenizer([self.requests[i][2] for i in text_indices],
+                                     max_length=self.max_input_length, truncation=True)['input_ids']
+            for index, ids in zip(text_indices, encoded):
+                input_ids[index] = ids
+        return input_ids
+
+    def run(self):
+        """
+        Runs every queued request and returns {document_id: [(key, output), ...]} in insertion order.
+        """
+        outputs = [None] * len(self.requests)
+        started = time.perf_counter()
+        input_ids = self._encode() if self.requests else []
+        order = sorted(range(len(self.requests)), key=lambda i: len(input_ids[i]))
+        batches = [order[i:i + self.batch_size] for i in range(0, len(order), self.batch_size)]
+
+        for batch in batches:
+            padded = self.tokenizer.pad({"input_ids": [input_ids[i] for i in batch]}, return_tensors="pt")
+            try:
+                with torch.inference_mode():
+                    generated = self.model.generate(padded['input_ids'], attention_mask=padded['attention_mask'],
+                                                    pad_token_id=self.tokenizer.pad_token_id, **self.generate_kwargs)
+                decoded = self.tokenizer.batch_decode(generated, skip_special_tokens=True)
+            except Exception as e:
+                logging.error(f"Error in batched analysis: {e}")
+                decoded = [None] * len(batch)
+            for index, text in zip(batch, decoded):
+                outputs[index] = text
+
+        elapsed = time.perf_counter() - started
+        self.stats = {"requests": len(self.requests), "batches": len(batches), "seconds": elapsed,
+                      "requests_per_s": len(self.requests) / elapsed if elapsed else 0.0}
+        logging.info(f"Generated {len(self.requests)} requests in {len(batches)} batches "
+                     f"({self.stats['requests_per_s']:.2f} requests/s)")
+
+        results = {}
+        for (document_id, key, _), output in zip(self.requests, outputs):
+            results.setdefault(document_id, []).append((key, output))
+        self.requests = []
+        return results
+
+
+def analyze_documents_batched(documents, model, tokenizer, prompts=ANALYSIS_PROMPTS, template="{prompt}: {text}",
+                              batch_size=16, max_input_length=512, **generate_kwargs):
+    """
+    Asks every prompt of every chunk of every document through one BatchScheduler.
+
+    `documents` maps a document id to its list of chunks, either strings or token id tensors from
+    chunk_token_ids(). Answers for the same key are joined across chunks in chunk order, as
+    process_text_files did per document.
+    """
+    scheduler = BatchScheduler(model, tokenizer, batch_size, max_input_length, **generate_kwargs)
+    prefix_ids = special_prefix = special_suffix = None
+    for document_id, chunks in documents.items():
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                for key, prompt in prompts.items():
+                    scheduler.add(document_id, key, template.format(prompt=prompt, text=chunk))
+                continue
+            if prefix_ids is None:
+                prefix_ids = prompt_prefix_ids(tokenizer, prompts, template)
+                special_prefix, special_suffix = special_token_layout(tokenizer)
+            chunk_ids = chunk.tolist()
+            for key in prompts:
+                scheduler.add_ids(document_id, key, special_prefix + prefix_ids[key] + chunk_ids + special_suffix)
+
+    merged = {}
+    for document_id, answers in scheduler.run().items():
+        document_results = {}
+        for key, answer in answers:
+            if answer is None:
+                continue
+            document_results[key] = answer if key not in document_results else document_results[key] + "\n" + answer
+        merged[document_id] = document_results
+    return merged, scheduler.stats
+
+
+def chunk_for_prompts(text, tokenizer, prompts=ANALYSIS_PROMPTS, template="{prompt}: {text}",
+                      max_length=512, overlap_sentences=1):
+    """
+    Token-aligned chunks sized so the longest prompt prefix plus the chunk fills max_length exactly.
+    """
+    reserved = max(len(ids) for ids in prompt_prefix_ids(tokenizer, prompts, template).values())
+    return chunk_token_ids(text, tokenizer, max_length, reserved, overlap_sentences)
+
+
+def benchmark_batching(chunks, model, tokenizer, prompts=ANALYSIS_PROMPTS, template="{prompt}: {text}",
+                       batch_size=16, **generate_kwargs):
+    """
+    Reports chunks/sec for the same chunks generated one request at a time and in batches.
+    """
+    report = {}
+    for label, size in [("unbatched", 1), ("batched", batch_size)]:
+        _, stats = analyze_documents_batched({"benchmark": chunks}, model, tokenizer, prompts, template,
+                                             batch_size=size, **generate_kwargs)
+        report[label] = {"chunks_per_s": len(chunks) / stats["seconds"] if stats["seconds"] else 0.0, **stats}
+        print(f"{label}: {report[label]['chunks_per_s']:.3f} chunks/s "
+              f"({stats['requests']} requests in {stats['batches']} batches, {stats['seconds']:.1f}s)")
+    return report
@@ -0,0 +1,66 @@
+import re
+from collections import namedtuple
+
+# One rendered unit of the analysis:
+#   kind  - "heading", "paragraph", "bullet", "table" or "blank"
+#   level - heading level (1-6) or bullet indent depth, 0 otherwise
+#   runs  - [(text, bold), ...] for headings, paragraphs and bullets
+#   rows  - table rows, each a list of cells given as runs
+Block = namedtuple("Block", ["kind", "level", "runs", "rows"])
+
+HEADING = re.compile(r'^(#{1,6})\s+(.*)$')
+BULLET = re.compile(r'^(\s*)([-*+])\s+(.*)$')
+TABLE_ROW = re.compile(r'^\s*\|(.*)\|\s*$')
+TABLE_SEPARATOR = re.compile(r'^\s*\|?\s*:?-{3,}:?\s*(\|\s*:?-{3,}:?\s*)*\|?\s*$')
+HTML_BREAK = re.compile(r'<br\s*/?>', re.IGNORECASE)
+
+
+def parse_runs(text):
+    """
+    Splits inline markdown into (text, bold) runs; **bold** is the only inline style kept.
+    """
+    runs = []
+    for index, part in enumerate(text.split("**")):
+        if part:
+            runs.append((part, index % 2 == 1))
+    return runs
+
+
+def _table_cells(line):
+    return [parse_runs(HTML_BREAK.sub("\n", cell.strip())) for cell in TABLE_ROW.match(line).group(1).split("|")]
+
+
+def parse_markdown(text):
+    """
+    Parses the analysis markdown once into a list of Blocks, one per line except tables,
+    whose consecutive rows form a single block.
+    """
+    blocks = []
+    table_rows = []
+    for line in text.splitlines():
+        if TABLE_ROW.match(line):
+            if not TABLE_SEPARATOR.match(line):
+                table_rows.append(_table_cells(line))
+            continue
+        if table_rows:
+            blocks.append(Block("table", 0, [], table_rows))
+            table_rows = []
+
+        heading = HEADING.match(line)
+        bullet = BULLET.match(line)
+        if not line.strip():
+            blocks.append(Block("blank", 0, [], []))
+        elif heading:
+            blocks.append(Block("heading", len(heading.group(1)), parse_runs(heading.group(2).strip()), []))
+        elif bullet:
+            depth = len(bullet.group(1).expandtabs(4)) // 2
+            blocks.append(Block("bullet", depth, parse_runs(bullet.group(3)), []))
+        else:
+            blocks.append(Block("paragraph", 0, parse_runs(line.strip()), []))
+    if table_rows:
+        blocks.append(Block("table", 0, [], table_rows))
+    return blocks
+
+
+def runs_text(runs):
+    return "".join(text for text, _ in runs)
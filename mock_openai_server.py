@@ -0,0 +1,114 @@
+import os
+import sys
+import json
+import time
+import random
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Canned analysis returned for every request; the company name is filled in from the prompt
+MOCK_ANALYSIS = """### FX Risk Analysis for {company}
+- **Risk Rating**: Moderate
+- **Executive Summary**: Mock analysis generated locally for pipeline testing.
+"""
+
+
+def find_company_name(messages):
+    for message in messages:
+        for line in message.get('content', '').splitlines():
+            if 'Company Name:' in line:
+                return line.split('Company Name:', 1)[1].strip()
+    return "UNKNOWN"
+
+
+class MockOpenAIHandler(BaseHTTPRequestHandler):
+    """
+    Minimal OpenAI-compatible /v1/chat/completions endpoint.
+
+    The server attributes `latency` (seconds per request), `failure_rate` (share of requests
+    answered with 429) and `retry_after` (the Retry-After header sent with them) simulate a
+    rate-limited API. Requests with "stream": true are answered as server-sent events, one word
+    every `token_delay` seconds.
+    """
+
+    def do_POST(self):
+        if not self.path.endswith("/chat/completions"):
+            self.send_error(404)
+            return
+        length = int(self.headers.get('Content-Length', 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+
+        if random.random() < self.server.failure_rate:
+            self._send_json(429, {"error": {"message": "Rate limit reached"}}, {"Retry-After": self.server.retry_after})
+            return
+
+        time.sleep(self.server.latency)
+        content = MOCK_ANALYSIS.format(company=find_company_name(request.get('messages', [])))
+        self.server.request_count += 1
+        if request.get('stream'):
+            self._send_stream(content)
+            return
+        self._send_json(200, {
+            "id": f"chatcmpl-mock-{self.server.request_count}",
+            "object": "chat.completion",
+            "model": request.get('model', 'mock'),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content},
+                         "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 0, "completion_tokens": len(content.split()), "total_tokens": 0},
+        })
+
+    def _send_stream(self, content):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        for word in content.split(" "):
+            chunk = {"object": "chat.completion.chunk",
+                     "choices": [{"index": 0, "delta": {"content": word + " "}, "finish_reason": None}]}
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode('utf-8'))
+            self.wfile.flush()
+            time.sleep(self.server.token_delay)
+        final = {"object": "chat.completion.chunk", "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+        self.wfile.write(f"data: {json.dumps(final)}\n\n".encode('utf-8'))
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+        self.close_connection = True
+
+    def _send_json(self, status, body, headers=None):
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_mock_server(port=0, latency=0.5, failure_rate=0.0, token_delay=0.01, retry_after="0.1"):
+    """
+    Starts the mock server in a background thread and returns it; the base URL is
+    f"http://127.0.0.1:{server.server_port}/v1".
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", port), MockOpenAIHandler)
+    server.latency = latency
+    server.failure_rate = failure_rate
+    server.token_delay = token_delay
+    server.retry_after = retry_after
+    server.request_count = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8000
+    server = start_mock_server(port, latency=float(os.getenv('MOCK_LATENCY', 0.5)),
+                               failure_rate=float(os.getenv('MOCK_FAILURE_RATE', 0.0)))
+    print(f"Mock OpenAI server listening on http://127.0.0.1:{server.server_port}/v1")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
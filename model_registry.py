@@ -0,0 +1,205 @@
+import os
+import sys
+import json
+import time
+import uuid
+import logging
+import threading
+from collections import OrderedDict
+
+from cpu_inference import load_cpu_model, rss_mb
+
+# Local models by the names the NLP scripts use: (checkpoint, tokenizer class, model class)
+MODEL_SPECS = {
+    "GPT-2": ("gpt2", "GPT2TokenizerFast", "GPT2LMHeadModel"),
+    "T5": ("t5-small", "T5TokenizerFast", "T5ForConditionalGeneration"),
+    "LLaMA": ("facebook/llama", "AutoTokenizer", "AutoModelForSeq2SeqLM"),
+}
+
+# Resolve models from the local Hugging Face cache only (set FX_HF_OFFLINE=0 for the first download)
+HF_OFFLINE = os.getenv('FX_HF_OFFLINE', '1') == '1'
+MEMORY_BUDGET_MB = float(os.getenv('FX_MODEL_MEMORY_MB', 4096))
+
+
+def force_offline():
+    """
+    Stops the Hugging Face libraries from sending HEAD requests and taking download locks on every load.
+    The environment variables only take effect for libraries imported afterwards, so loads also pass
+    local_files_only=True.
+    """
+    os.environ['HF_HUB_OFFLINE'] = '1'
+    os.environ['TRANSFORMERS_OFFLINE'] = '1'
+
+
+def model_memory_mb(model):
+    """
+    Memory held by a model's tensors, or None if it has no PyTorch state (e.g. ONNX Runtime models).
+    """
+    if not hasattr(model, 'state_dict'):
+        return None
+    total = 0
+    for value in model.state_dict().values():
+        if hasattr(value, 'element_size'):
+            total += value.numel() * value.element_size()
+    return total / 2**20
+
+
+class ModelRegistry:
+    """
+    Loads each local model once, on first use, and keeps it in memory for later runs.
+
+    Models are evicted least recently used first once the loaded models exceed the memory budget;
+    the model just requested is never evicted. Safe to share between threads.
+    """
+
+    def __init__(self, memory_budget_mb=MEMORY_BUDGET_MB, cpu_backend=None, offline=HF_OFFLINE, specs=None):
+        self.memory_budget_mb = memory_budget_mb
+        self.cpu_backend = cpu_backend or os.getenv('FX_CPU_BACKEND', 'eager')
+        self.offline = offline
+        self.specs = specs or MODEL_SPECS
+        self._models = OrderedDict()  # name -> (model, tokenizer, size_mb)
+        self._lock = threading.RLock()
+        self.stats = {"loads": 0, "hits": 0, "evictions": 0, "load_seconds": 0.0}
+        if offline:
+            force_offline()
+
+    def _load(self, name):
+        import transformers
+
+        checkpoint, tokenizer_class, model_class = self.specs[name]
+        rss_before = rss_mb()
+        started = time.perf_counter()
+        try:
+            tokenizer = getattr(transformers, tokenizer_class).from_pretrained(checkpoint, local_files_only=self.offline)
+            model = load_cpu_model(checkpoint, getattr(transformers, model_class), self.cpu_backend,
+                                   local_files_only=self.offline)
+        except OSError as e:
+            if self.offline:
+                raise OSError(f"{checkpoint} is not in the local Hugging Face cache; run once with FX_HF_OFFLINE=0 "
+                              f"to download it ({e})")
+            raise
+        elapsed = time.perf_counter() - started
+        size_mb = model_memory_mb(model)
+        if size_mb is None:
+            size_mb = max(rss_mb() - rss_before, 0.0)
+        self.stats["loads"] += 1
+        self.stats["load_seconds"] += elapsed
+        logging.info(f"Loaded {name} ({checkpoint}, {self.cpu_backend}) in {elapsed:.1f}s, {size_mb:.0f} MB")
+        return model, tokenizer, size_mb
+
+    def _evict(self, keep):
+        while self.memory_mb() > self.memory_budget_mb and len(self._models) > 1:
+            name = next(iter(self._models))
+            if name == keep:
+                self._models.move_to_end(name)
+                continue
+            del self._models[name]
+            self.stats["evictions"] += 1
+            logging.info(f"Evicted {name} from the model registry")
+
+    def get(self, name):
+        """
+        Returns (model, tokenizer) for a model name in the registry specs, loading it if needed.
+        """
+        if name not in self.specs:
+            raise ValueError(f"Model {name} is not supported.")
+        with self._lock:
+            if name in self._models:
+                self._models.move_to_end(name)
+                self.stats["hits"] += 1
+            else:
+                self._models[name] = self._load(name)
+                self._evict(keep=name)
+            model, tokenizer, _ = self._models[name]
+            return model, tokenizer
+
+    def memory_mb(self):
+        return sum(size for _, _, size in self._models.values())
+
+    def loaded(self):
+        return list(self._models)
+
+    def clear(self):
+        with self._lock:
+            self._models.clear()
+
+
+_default_registry = None
+
+
+def get_registry():
+    """
+    The process-wide registry, so every script and worker job in one process shares loaded models.
+    """
+    global _default_registry
+    if _default_registry is None:
+        _default_registry = ModelRegistry()
+    return _default_registry
+
+
+def submit_job(job_directory, model_name, input_directory, output_directory):
+    """
+    Queues an NLP run for a running worker by writing a job file; returns the job file path.
+    """
+    os.makedirs(job_directory, exist_ok=True)
+    job_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}-{model_name}"
+    job = {"model": model_name, "input_directory": input_directory, "output_directory": output_directory}
+    temporary_path = os.path.join(job_directory, f"{job_id}.tmp")
+    with open(temporary_path, 'w', encoding='utf-8') as file:
+        json.dump(job, file)
+    # Renamed into place so the worker never reads a half-written job
+    job_path = os.path.join(job_directory, f"{job_id}.job.json")
+    os.replace(temporary_path, job_path)
+    return job_path
+
+
+def run_worker(job_directory, registry=None, poll_interval=2.0, max_jobs=None):
+    """
+    Long-lived worker: keeps models warm in a registry and runs each job file dropped into
+    job_directory through NLP.process_text_files, writing <job>.done.json (or .failed.json) next to it.
+    """
+    from NLP import process_text_files
+
+    registry = registry or get_registry()
+    os.makedirs(job_directory, exist_ok=True)
+    processed = 0
+    print(f"Model worker watching {job_directory}")
+    while max_jobs is None or processed < max_jobs:
+        jobs = sorted(name for name in os.listdir(job_directory) if name.endswith('.job.json'))
+        if not jobs:
+            time.sleep(poll_interval)
+            continue
+        for name in jobs:
+            job_path = os.path.join(job_directory, name)
+            with open(job_path, 'r', encoding='utf-8') as file:
+                job = json.load(file)
+            started = time.perf_counter()
+            loads_before = registry.stats["loads"]
+            try:
+                process_text_files(job["input_directory"], job["output_directory"], job["model"], registry=registry)
+                status = {"status": "done"}
+            except Exception as e:
+                logging.error(f"Job {name} failed: {e}")
+                status = {"status": "failed", "error": str(e)}
+            status.update(job, seconds=round(time.perf_counter() - started, 2),
+                          model_loaded=registry.stats["loads"] > loads_before)
+            suffix = '.done.json' if status["status"] == "done" else '.failed.json'
+            with open(job_path.replace('.job.json', suffix), 'w', encoding='utf-8') as file:
+                json.dump(status, file, indent=2)
+            os.remove(job_path)
+            processed += 1
+            print(f"{name}: {status['status']} in {status['seconds']}s")
+    return processed
+
+
+if __name__ == "__main__":
+    # Usage: python model_registry.py worker [job_directory]
+    #        python model_registry.py submit MODEL input_directory output_directory [job_directory]
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    command = sys.argv[1] if len(sys.argv) > 1 else "worker"
+    if command == "worker":
+        run_worker(sys.argv[2] if len(sys.argv) > 2 else 'nlp_jobs')
+    elif command == "submit":
+        print(submit_job(sys.argv[5] if len(sys.argv) > 5 else 'nlp_jobs', sys.argv[2], sys.argv[3], sys.argv[4]))
+    else:
+        raise SystemExit(f"Unknown command {command}")
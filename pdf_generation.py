@@ -1,10 +1,27 @@
 from fpdf import FPDF
 import os
+import re
+from markdown_blocks import parse_markdown, runs_text
+
+LINE_HEIGHT = 8
+TABLE_LINE_HEIGHT = 6
+
+# Typographic characters LLMs like to emit that the built-in latin-1 fonts cannot encode
+LATIN1_REPLACEMENTS = str.maketrans({"\u2018": "'", "\u2019": "'", "\u201c": '"', "\u201d": '"',
+                                     "\u2013": "-", "\u2014": "-", "\u2022": "-", "\u2026": "...",
+                                     "\u2264": "<=", "\u2265": ">=", "\u00a0": " "})
+
+WORD_OR_SPACE = re.compile(r'\n|[^\S\n]+|[^\s]+')
+
+def to_latin1(text):
+    return text.translate(LATIN1_REPLACEMENTS).encode('latin1', 'replace').decode('latin1')
 
 class PDF(FPDF):
     def __init__(self, company_name):
         super().__init__()
         self.company_name = company_name
+        self._style = None
+        self._widths = {}  # (text, bold, size) -> string width
 
     def header(self):
         self.set_font("Arial", "B", 16)
@@ -52,23 +69,108 @@ class PDF(FPDF):
     def add_chapter(self, title, body):
         self.add_page()
         self.chapter_title(title)
-        # Replace Markdown-style headers with actual bold/large text
-        for line in body.splitlines():
-            if line.startswith("### "):
-                self.section_title(line.replace("### ", "").strip())
-            elif line.startswith("#### "):
-                self.sub_section_title(line.replace("#### ", "").strip())
-            elif "**" in line:
-                bold_parts = line.split("**")
-                for i, part in enumerate(bold_parts):
-                    if i % 2 == 0:
-                        self.chapter_body(part)
-                    else:
-                        self.set_font("Arial", "B", 12)
-                        self.chapter_body(part)
-                        self.set_font("Arial", "", 12)
+        # The markdown is parsed once and each block is emitted with as few layout calls as possible
+        self.render_blocks(parse_markdown(to_latin1(body)))
+
+    def use_style(self, bold, size=12):
+        if self._style != (bold, size):
+            self.set_font("Arial", "B" if bold else "", size)
+            self._style = (bold, size)
+
+    def string_width(self, text, bold=False, size=12):
+        # Words repeat a lot in an analysis, so their widths are measured once per style
+        key = (text, bold, size)
+        if key not in self._widths:
+            self.use_style(bold, size)
+            self._widths[key] = self.get_string_width(text)
+        return self._widths[key]
+
+    def wrap_runs(self, runs, max_width, size=12):
+        """
+        Breaks runs into lines no wider than max_width using cached word widths.
+        Each line is a list of (text, bold, width) segments, one per change of style.
+        """
+        lines, line, line_width = [], [], 0.0
+        for text, bold in runs:
+            for token in WORD_OR_SPACE.findall(text):
+                if token == "\n":
+                    lines.append(line)
+                    line, line_width = [], 0.0
+                    continue
+                width = self.string_width(token, bold, size)
+                if line_width + width > max_width and not token.isspace() and line:
+                    lines.append(line)
+                    line, line_width = [], 0.0
+                if token.isspace() and not line:
+                    continue
+                if line and line[-1][1] == bold:
+                    line[-1] = (line[-1][0] + token, bold, line[-1][2] + width)
+                else:
+                    line.append((token, bold, width))
+                line_width += width
+        lines.append(line)
+        # Trailing spaces take no room at the end of a line
+        for segments in lines:
+            if segments and segments[-1][0] != segments[-1][0].rstrip():
+                text, bold, _ = segments[-1]
+                segments[-1] = (text.rstrip(), bold, self.string_width(text.rstrip(), bold, size))
+        return lines
+
+    def write_runs(self, runs, indent=0):
+        x = self.l_margin + indent
+        for segments in self.wrap_runs(runs, self.w - self.r_margin - x):
+            self.set_x(x)
+            for text, bold, width in segments:
+                self.use_style(bold)
+                self.cell(width, LINE_HEIGHT, text)
+            self.ln(LINE_HEIGHT)
+        self.ln(1)
+
+    def render_table(self, rows, size=10):
+        columns = max(len(row) for row in rows)
+        widest = [max((self.string_width(runs_text(row[i]), True, size) for row in rows if i < len(row)), default=1) + 4
+                  for i in range(columns)]
+        # Columns get their natural width when it fits, otherwise a share proportional to it
+        total = sum(widest)
+        col_widths = widest if total <= self.epw else [self.epw * width / total for width in widest]
+
+        for row_index, row in enumerate(rows):
+            # The header row is bold throughout
+            cells = [[(text, bold or row_index == 0) for text, bold in (row[i] if i < len(row) else [])]
+                     for i in range(columns)]
+            wrapped = [self.wrap_runs(cell, width - 2, size) for cell, width in zip(cells, col_widths)]
+            row_height = max(len(lines) for lines in wrapped) * TABLE_LINE_HEIGHT + 2
+            if self.get_y() + row_height > self.page_break_trigger:
+                self.add_page()
+            x, y = self.l_margin, self.get_y()
+            for lines, width in zip(wrapped, col_widths):
+                self.rect(x, y, width, row_height)
+                for line_number, segments in enumerate(lines):
+                    self.set_xy(x + 1, y + 1 + line_number * TABLE_LINE_HEIGHT)
+                    for text, bold, segment_width in segments:
+                        self.use_style(bold, size)
+                        self.cell(segment_width, TABLE_LINE_HEIGHT, text)
+                x += width
+            self.set_xy(self.l_margin, y + row_height)
+        self.ln(2)
+
+    def render_blocks(self, blocks):
+        for block in blocks:
+            if block.kind == "heading":
+                title = runs_text(block.runs)
+                if block.level >= 4:
+                    self.sub_section_title(title)
+                else:
+                    self.section_title(title)
+                self._style = None
+            elif block.kind == "bullet":
+                self.write_runs([("- ", False)] + block.runs, indent=5 * (block.level + 1))
+            elif block.kind == "table":
+                self.render_table(block.rows)
+            elif block.kind == "blank":
+                self.ln(LINE_HEIGHT + 1)
             else:
-                self.chapter_body(line)
+                self.write_runs(block.runs)
 
 def save_output_to_pdf(title, analysis_data, company_name, output_path):
     # Initialize the PDF object with the company name
@@ -0,0 +1,433 @@
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import logging
+import queue
+import threading
+import importlib
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed, wait, FIRST_COMPLETED
+
+from instrumentation import profiled, span, tracer
+
+# Every stage reads and writes under one root instead of hard-coded absolute paths
+PIPELINE_ROOT = os.getenv('FX_PIPELINE_ROOT', '.')
+PIPELINE_STATE_NAME = "pipeline_state.json"
+# Comma-separated tickers to restrict a run to; every ticker in 1_download_fillings.CIK_LOOKUP when unset
+PIPELINE_TICKERS = os.getenv('FX_PIPELINE_TICKERS', '')
+# Comma-separated stages to rebuild even when their inputs are unchanged. Downloads have no local
+# inputs, so a nightly update sets FX_PIPELINE_REFRESH=download to check for new filings.
+PIPELINE_REFRESH = os.getenv('FX_PIPELINE_REFRESH', '')
+PIPELINE_WORKERS = int(os.getenv('FX_PIPELINE_WORKERS', 4))
+# Companies extracted but not yet picked up by an analysis worker in `python pipeline.py stream`
+STREAM_QUEUE_SIZE = int(os.getenv('FX_STREAM_QUEUE_SIZE', 4))
+
+DOWNLOAD_DIR = "annual_reports"
+HTML_DIR = "parsed_reports_html"
+QUALITATIVE_DIR = "extracted_qualitative_data"
+ANALYSIS_DIR = "fx_risk_analysis_output"
+BASE_CURRENCY = 'USD'
+EXCHANGE_RATE_API = "https://api.exchangerate-api.com/v4/latest"
+
+
+def load_script(name):
+    # The stage scripts start with a digit, so they cannot be imported with an import statement
+    return importlib.import_module(name)
+
+
+def run_partition(stage_name, run, root, key):
+    # Runs in the pool worker, so the span and the optional profile cover exactly one partition
+    with span(f"partition.{stage_name}", partition=key), profiled(f"{stage_name}.{key.replace(os.sep, '_')}"):
+        run(root, key)
+
+
+def files_under(path, suffix=None):
+    """
+    The file itself, or every file below a directory in a stable order; [] when it does not exist.
+    """
+    if os.path.isfile(path):
+        return [path]
+    found = []
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        found.extend(os.path.join(root, file) for file in sorted(files) if suffix is None or file.endswith(suffix))
+    return found
+
+
+def subdirectories(path):
+    return sorted(name for name in os.listdir(path) if os.path.isdir(os.path.join(path, name))) \
+        if os.path.isdir(path) else []
+
+
+class Stage:
+    """
+    One step of the pipeline, built separately for each of its partitions.
+
+    partitions(root) lists the partition keys (tickers, or accessions for per-filing stages).
+    inputs(root, key) and outputs(root, key) give the paths one partition reads and writes;
+    directories stand for every file below them. run(root, key) builds one partition, in a
+    thread or process pool according to `executor`. finish(root), when given, runs once after
+    the stage's partitions and before their outputs are recorded. Bumping `version` rebuilds
+    every partition of the stage.
+    """
+
+    def __init__(self, name, version, partitions, inputs, outputs, run, depends_on=(), executor="thread",
+                 finish=None):
+        self.name = name
+        self.version = version
+        self.partitions = partitions
+        self.inputs = inputs
+        self.outputs = outputs
+        self.run = run
+        self.depends_on = tuple(depends_on)
+        self.executor = executor
+        self.finish = finish
+
+
+class Pipeline:
+    """
+    Runs stages in dependency order and rebuilds only stale partitions.
+
+    A partition is stale when it has never been built, its stage version changed, the content
+    hash of its inputs changed, or one of its recorded outputs is missing. Because downstream
+    inputs are upstream outputs, a partition that is rebuilt with identical output leaves
+    everything after it untouched. File hashes are cached by size and modification time, and
+    the state is saved to pipeline_state.json under the root after every stage.
+    """
+
+    def __init__(self, stages, root=PIPELINE_ROOT, max_workers=PIPELINE_WORKERS, state_path=None):
+        self.stages = {stage.name: stage for stage in stages}
+        self.root = root
+        self.max_workers = max_workers
+        self.state_path = state_path or os.path.join(root, PIPELINE_STATE_NAME)
+        self.order = self._topological_order()
+        self.state = {"stages": {}, "files": {}}
+        # stream() hashes files and saves state from consumer threads while the main thread records
+        self._state_lock = threading.RLock()
+        if os.path.exists(self.state_path):
+            with open(self.state_path, 'r', encoding='utf-8') as file:
+                self.state = json.load(file)
+
+    def _topological_order(self):
+        order, visiting = [], set()
+
+        def visit(name):
+            if name in order:
+                return
+            if name in visiting:
+                raise ValueError(f"Pipeline stages form a cycle through {name}")
+            if name not in self.stages:
+                raise ValueError(f"Unknown pipeline stage {name}")
+            visiting.add(name)
+            for dependency in self.stages[name].depends_on:
+                visit(dependency)
+            visiting.discard(name)
+            order.append(name)
+
+        for name in self.stages:
+            visit(name)
+        return order
+
+    def _relative(self, path):
+        return os.path.relpath(path, self.root)
+
+    def file_sha256(self, path):
+        stat = os.stat(path)
+        relative = self._relative(path)
+        with self._state_lock:
+            cached = self.state["files"].get(relative)
+        if cached and cached[0] == stat.st_size and cached[1] == stat.st_mtime_ns:
+            return cached[2]
+        digest = hashlib.sha256()
+        with open(path, 'rb') as file:
+            for block in iter(lambda: file.read(1 << 20), b""):
+                digest.update(block)
+        with self._state_lock:
+            self.state["files"][relative] = [stat.st_size, stat.st_mtime_ns, digest.hexdigest()]
+        return digest.hexdigest()
+
+    def input_digest(self, stage, key):
+        digest = hashlib.sha256(json.dumps([stage.name, stage.version, key]).encode('utf-8'))
+        for path in stage.inputs(self.root, key):
+            for file_path in files_under(path):
+                digest.update(f"{self._relative(file_path)}\0{self.file_sha256(file_path)}\n".encode('utf-8'))
+        return digest.hexdigest()
+
+    def stale_digest(self, stage, key, refresh=False):
+        """
+        The partition's input digest when it needs building, otherwise None.
+        """
+        digest = self.input_digest(stage, key)
+        with self._state_lock:
+            record = self.state["stages"].get(stage.name, {}).get(key)
+        if (refresh or record is None or record["inputs"] != digest
+                or not all(os.path.exists(os.path.join(self.root, path)) for path in record["outputs"])):
+            return digest
+        return None
+
+    def plan(self, stage, refresh=False):
+        """
+        Returns ([(key, input digest) for stale partitions], partition keys).
+        """
+        keys = stage.partitions(self.root)
+        stale = [(key, digest) for key in keys for digest in [self.stale_digest(stage, key, refresh)] if digest]
+        return stale, keys
+
+    def _build(self, stage, stale):
+        executor_class = ProcessPoolExecutor if stage.executor == "process" else ThreadPoolExecutor
+        built, failed = [], []
+        if not stale:
+            return built, failed
+        with executor_class(max_workers=min(self.max_workers, len(stale))) as executor:
+            futures = {executor.submit(run_partition, stage.name, stage.run, self.root, key): (key, digest)
+                       for key, digest in stale}
+            for future in as_completed(futures):
+                key, digest = futures[future]
+                try:
+                    future.result()
+                    built.append((key, digest))
+                except Exception as e:
+                    logging.error(f"{stage.name} failed for {key}: {e}")
+                    failed.append(key)
+        return built, failed
+
+    def run(self, stage_names=None, refresh=()):
+        """
+        Builds the stale partitions of the selected stages (all by default) and returns
+        {stage: {"built", "up_to_date", "failed", "seconds"}}.
+        """
+        summary = {}
+        for name in self.order:
+            if stage_names and name not in stage_names:
+                continue
+            stage = self.stages[name]
+            started = time.perf_counter()
+            with span(f"stage.{name}"):
+                stale, keys = self.plan(stage, refresh=name in refresh)
+                built, failed = self._build(stage, stale)
+                if stage.finish and built:
+                    stage.finish(self.root)
+            self._record(stage, built, keys)
+
+            summary[name] = {"built": len(built), "up_to_date": len(keys) - len(stale), "failed": len(failed),
+                             "seconds": round(time.perf_counter() - started, 2)}
+            logging.info(f"{name}: {summary[name]}")
+        return summary
+
+    def _record(self, stage, built, keys):
+        with self._state_lock:
+            records = self.state["stages"].setdefault(stage.name, {})
+            for key, digest in built:
+                records[key] = {"version": stage.version, "inputs": digest, "built_at": time.time(),
+                                "outputs": [self._relative(file_path) for path in stage.outputs(self.root, key)
+                                            for file_path in files_under(path)]}
+            # Partitions that no longer exist upstream are forgotten
+            self.state["stages"][stage.name] = {key: records[key] for key in keys if key in records}
+            self.save_state()
+
+    def stream(self, producer_name, consumer_name, refresh=(), queue_size=STREAM_QUEUE_SIZE):
+        """
+        Runs two stages with the same partition keys as a producer-consumer pipeline.
+
+        Each producer partition (e.g. one company's extraction) is handed to the consumer stage
+        (its analysis) through a bounded queue as soon as it is built, instead of after the whole
+        producer stage. New producer partitions are only started while the queue has room, so a
+        slow consumer holds extraction back rather than letting finished work pile up. Consumer
+        partitions whose inputs came out unchanged are skipped, as in run(). Returns the same
+        summary as run() plus the seconds until the first consumer partition finished.
+        """
+        producer, consumer = self.stages[producer_name], self.stages[consumer_name]
+        started = time.perf_counter()
+        handoff = queue.Queue(maxsize=queue_size)
+        consumed, consumer_failed, first_result = [], [], []
+        lock = threading.Lock()
+
+        def consume():
+            while True:
+                key = handoff.get()
+                if key is None:
+                    return
+                # Any error is the partition's failure; a dead consumer thread would leave the producer
+                # blocked on a full queue
+                try:
+                    # e.g. a company whose filings had no FX-related text to analyse
+                    if key not in consumer.partitions(self.root):
+                        continue
+                    digest = self.stale_digest(consumer, key, refresh=consumer_name in refresh)
+                    if not digest:
+                        continue
+                    run_partition(consumer_name, consumer.run, self.root, key)
+                    with lock:
+                        consumed.append((key, digest))
+                        first_result[:] = first_result or [time.perf_counter() - started]
+                except Exception as e:
+                    logging.error(f"{consumer_name} failed for {key}: {e}")
+                    with lock:
+                        consumer_failed.append(key)
+
+        consumers = [threading.Thread(target=consume, daemon=True) for _ in range(self.max_workers)]
+        for thread in consumers:
+            thread.start()
+
+        stale, producer_keys = self.plan(producer, refresh=producer_name in refresh)
+        stale_keys = {key for key, _ in stale}
+        # Partitions already produced may still be waiting for the consumer, e.g. after a failed run
+        for key in producer_keys:
+            if key not in stale_keys:
+                handoff.put(key)
+
+        produced, producer_failed = [], []
+        executor_class = ProcessPoolExecutor if producer.executor == "process" else ThreadPoolExecutor
+        with executor_class(max_workers=self.max_workers) as executor:
+            waiting, running = list(stale), {}
+            while waiting or running:
+                while waiting and len(running) < self.max_workers:
+                    key, digest = waiting.pop(0)
+                    running[executor.submit(run_partition, producer_name, producer.run, self.root, key)] = (key, digest)
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    key, digest = running.pop(future)
+                    try:
+                        future.result()
+                        produced.append((key, digest))
+                        # Blocks while the queue is full, which stops new producer partitions starting
+                        handoff.put(key)
+                    except Exception as e:
+                        logging.error(f"{producer_name} failed for {key}: {e}")
+                        producer_failed.append(key)
+        self._record(producer, produced, producer_keys)
+
+        for _ in consumers:
+            handoff.put(None)
+        for thread in consumers:
+            thread.join()
+        if consumer.finish and consumed:
+            consumer.finish(self.root)
+        self._record(consumer, consumed, consumer.partitions(self.root))
+
+        summary = {
+            producer_name: {"built": len(produced), "up_to_date": len(producer_keys) - len(stale),
+                            "failed": len(producer_failed)},
+            consumer_name: {"built": len(consumed), "failed": len(consumer_failed)},
+            "first_result_seconds": round(first_result[0], 2) if first_result else None,
+            "seconds": round(time.perf_counter() - started, 2),
+        }
+        logging.info(f"{producer_name} -> {consumer_name}: {summary}")
+        return summary
+
+    def save_state(self):
+        with self._state_lock:
+            self.state["files"] = {path: entry for path, entry in self.state["files"].items()
+                                   if os.path.exists(os.path.join(self.root, path))}
+            tmp_path = self.state_path + ".tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as file:
+                json.dump(self.state, file, indent=2)
+            os.replace(tmp_path, self.state_path)
+
+
+# Stage definitions. Run functions are module-level so process pools can pickle them.
+
+def tickers(root):
+    if PIPELINE_TICKERS:
+        return [ticker.strip() for ticker in PIPELINE_TICKERS.split(",") if ticker.strip()]
+    return list(dict.fromkeys(load_script("1_download_fillings").CIK_LOOKUP))
+
+
+def download_partition(root, ticker):
+    load_script("1_download_fillings").download_ticker(ticker, os.path.join(root, DOWNLOAD_DIR, ticker))
+
+
+def filings(root):
+    # One partition per downloaded filing, keyed by its path below the download directory
+    download_dir = os.path.join(root, DOWNLOAD_DIR)
+    return [os.path.relpath(path, download_dir) for path in files_under(download_dir, ".txt")]
+
+
+def html_path_of(root, filing):
+    return os.path.join(root, HTML_DIR, filing[:-len(".txt")] + ".html")
+
+
+def convert_partition(root, filing):
+    if not load_script("2_convert_ixbrl_to_html").convert_filing(os.path.join(root, DOWNLOAD_DIR, filing),
+                                                                 html_path_of(root, filing)):
+        raise ValueError(f"could not convert {filing} to HTML")
+
+
+def extract_partition(root, ticker):
+    output_company_path = os.path.join(root, QUALITATIVE_DIR, ticker)
+    # The output name depends on the extracted company name and year, so old text is removed first
+    shutil.rmtree(output_company_path, ignore_errors=True)
+    load_script("3_extract_qualitative").extract_company(os.path.join(root, HTML_DIR, ticker), output_company_path)
+
+
+def analyze_partition(root, ticker):
+    analysis = load_script("5_openAI_structured")
+    output_company_folder = os.path.join(root, ANALYSIS_DIR, ticker)
+    os.makedirs(output_company_folder, exist_ok=True)
+    for file_path in files_under(os.path.join(root, QUALITATIVE_DIR, ticker), ".txt"):
+        fx_risk_rating = analysis.rate_fx_risk(analysis.read_document(file_path), BASE_CURRENCY, EXCHANGE_RATE_API,
+                                               ticker.upper())
+        analysis.save_reports(fx_risk_rating, ticker.upper(), output_company_folder)
+
+
+def finish_analysis(root):
+    # Reports render in the background; they must exist before the stage's outputs are recorded
+    analysis = load_script("5_openAI_structured")
+    analysis.get_render_queue().close()
+    analysis.save_token_usage(os.path.join(root, ANALYSIS_DIR))
+    # Written after the reports so the compile stage finds a table newer than every PDF
+    if analysis.OUTPUT_FORMAT == 'json':
+        analysis.write_results_table(os.path.join(root, ANALYSIS_DIR))
+
+
+def compiled_csv_path(root):
+    return os.path.join(root, ANALYSIS_DIR, load_script("6_compiled_document").COMPILED_CSV_NAME)
+
+
+def compile_partition(root, key):
+    load_script("6_compiled_document").process_all_pdfs(os.path.join(root, ANALYSIS_DIR))
+
+
+FX_PIPELINE = [
+    Stage("download", 1, tickers, lambda root, ticker: [],
+          lambda root, ticker: [os.path.join(root, DOWNLOAD_DIR, ticker)], download_partition),
+    Stage("convert", 1, filings, lambda root, filing: [os.path.join(root, DOWNLOAD_DIR, filing)],
+          lambda root, filing: [html_path_of(root, filing)], convert_partition,
+          depends_on=["download"], executor="process"),
+    Stage("extract", 1, lambda root: subdirectories(os.path.join(root, HTML_DIR)),
+          lambda root, ticker: [os.path.join(root, HTML_DIR, ticker)],
+          lambda root, ticker: [os.path.join(root, QUALITATIVE_DIR, ticker)], extract_partition,
+          depends_on=["convert"], executor="process"),
+    Stage("analyze", 1, lambda root: subdirectories(os.path.join(root, QUALITATIVE_DIR)),
+          lambda root, ticker: [os.path.join(root, QUALITATIVE_DIR, ticker)],
+          lambda root, ticker: [os.path.join(root, ANALYSIS_DIR, ticker)], analyze_partition,
+          depends_on=["extract"], finish=finish_analysis),
+    Stage("compile", 1, lambda root: ["all"],
+          lambda root, key: files_under(os.path.join(root, ANALYSIS_DIR), ".pdf"),
+          lambda root, key: [compiled_csv_path(root)], compile_partition, depends_on=["analyze"]),
+]
+
+
+if __name__ == "__main__":
+    # Usage: python pipeline.py [stage ...]   build the stale partitions of every (or the given) stage
+    #        python pipeline.py stream        as above, but each company goes on to analysis as soon as
+    #                                         its extraction finishes
+    #        python pipeline.py plan          list stale partitions given the files on disk now
+    # Nightly: FX_PIPELINE_REFRESH=download python pipeline.py
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    pipeline = Pipeline(FX_PIPELINE)
+    refresh = [name for name in PIPELINE_REFRESH.split(",") if name]
+    if sys.argv[1:2] == ["stream"]:
+        pipeline.run(["download", "convert"], refresh=refresh)
+        pipeline.stream("extract", "analyze", refresh=refresh)
+        pipeline.run(["compile"], refresh=refresh)
+    elif sys.argv[1:2] == ["plan"]:
+        for name in pipeline.order:
+            stale, keys = pipeline.plan(pipeline.stages[name], refresh=name in PIPELINE_REFRESH.split(","))
+            print(f"{name}: {len(stale)} of {len(keys)} partitions stale {[key for key, _ in stale][:10]}")
+    else:
+        pipeline.run(sys.argv[1:] or None, refresh=refresh)
+    if sys.argv[1:2] != ["plan"]:
+        print(tracer.summary())
@@ -0,0 +1,104 @@
+import os
+import csv
+import time
+import threading
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+from instrumentation import span
+
+RENDER_TIMES_NAME = "render_times.csv"
+RENDER_COLUMNS = ["Company", "Format", "Path", "Render_s", "Error"]
+
+
+def render_document(kind, title, analysis, company_name, output_path):
+    """
+    Renders one report file; runs inside a worker process. Returns the timing row.
+    """
+    started = time.perf_counter()
+    error = ""
+    try:
+        with span("render", company=company_name, format=kind):
+            if kind == "pdf":
+                from pdf_generation import save_output_to_pdf
+                save_output_to_pdf(title, analysis, company_name, output_path)
+            else:
+                from docsx_generation import save_output_to_docx
+                save_output_to_docx(title, analysis, company_name, output_path)
+    except Exception as e:
+        error = str(e)
+    return {"Company": company_name, "Format": kind, "Path": output_path,
+            "Render_s": round(time.perf_counter() - started, 3), "Error": error}
+
+
+class RenderQueue:
+    """
+    Renders PDF and DOCX reports in a process pool while the caller carries on with the next analysis.
+
+    Every submitted report becomes two tasks (PDF and DOCX) so both formats render at the same
+    time. close() waits for the queue to drain and writes one timing row per file. With
+    max_workers=0 reports are rendered inline, as before. When consolidated_path is set, close()
+    also writes every submitted report into that one DOCX. With max_pending, submit() blocks while
+    that many files are still waiting to render, so analysis cannot run arbitrarily far ahead.
+    """
+
+    def __init__(self, max_workers=None, times_path=None, consolidated_path=None, max_pending=None):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.times_path = times_path
+        self.consolidated_path = consolidated_path
+        self._reports = []
+        self._executor = None
+        self._futures = []
+        self._lock = threading.Lock()
+
+    def submit(self, title, analysis, company_name, pdf_path, docx_path):
+        if self.consolidated_path:
+            with self._lock:
+                self._reports.append((title, analysis, company_name))
+        for kind, path in [("pdf", pdf_path), ("docx", docx_path)]:
+            if self.max_workers == 0:
+                row = render_document(kind, title, analysis, company_name, path)
+                with self._lock:
+                    self._futures.append(row)
+                continue
+            if self.max_pending:
+                with self._lock:
+                    pending = [future for future in self._futures if not isinstance(future, dict) and not future.done()]
+                if len(pending) >= self.max_pending:
+                    wait(pending, return_when=FIRST_COMPLETED)
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+                self._futures.append(self._executor.submit(render_document, kind, title, analysis, company_name, path))
+
+    def close(self):
+        """
+        Waits for every queued report and returns the timing rows.
+        """
+        with self._lock:
+            futures, self._futures = self._futures, []
+            executor, self._executor = self._executor, None
+            reports, self._reports = self._reports, []
+        rows = [future if isinstance(future, dict) else future.result() for future in futures]
+        if executor is not None:
+            executor.shutdown()
+        for row in rows:
+            if row["Error"]:
+                print(f"Rendering {row['Path']} failed: {row['Error']}")
+        if reports:
+            from docsx_generation import save_reports_to_docx
+            save_reports_to_docx(reports, self.consolidated_path)
+        if rows and self.times_path:
+            self._write_times(rows)
+        if rows:
+            total = sum(row["Render_s"] for row in rows)
+            print(f"Rendered {len(rows)} report files ({total / len(rows):.2f}s per file)")
+        return rows
+
+    def _write_times(self, rows):
+        new_file = not os.path.exists(self.times_path)
+        with open(self.times_path, 'a', newline='', encoding='utf-8') as file:
+            writer = csv.DictWriter(file, fieldnames=RENDER_COLUMNS)
+            if new_file:
+                writer.writeheader()
+            writer.writerows(rows)
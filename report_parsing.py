@@ -0,0 +1,173 @@
+import os
+import re
+import sys
+import time
+
+from label_scanner import LabelScanner, resolve_fields, section_labels_of
+
+# Text extraction backend: pymupdf (fast, default) or pdfplumber (layout-aware, much slower)
+PDF_BACKEND = os.getenv('FX_PDF_BACKEND', 'pymupdf')
+
+# How far past an anchor a multi-line pattern may look, instead of scanning the whole document
+MATCH_WINDOW = 300
+
+
+def _extract_pymupdf(pdf_path):
+    import fitz  # PyMuPDF
+
+    with fitz.open(pdf_path) as pdf_document:
+        return "".join(page.get_text() for page in pdf_document)
+
+
+def _extract_pdfplumber(pdf_path):
+    import pdfplumber
+
+    with pdfplumber.open(pdf_path) as pdf:
+        return "\n".join((page.extract_text() or "") for page in pdf.pages) + "\n"
+
+
+PDF_BACKENDS = {"pymupdf": _extract_pymupdf, "pdfplumber": _extract_pdfplumber}
+
+# The PDF generator writes bold labels as separate runs, which PyMuPDF returns on their own
+# lines ("Hedging Ratio\n: 60%"); these rejoin a value or label with the line before it
+SPLIT_VALUE = re.compile(r'[ \t]*\n(?=:)')
+SPLIT_BULLET = re.compile(r'^([ \t]*[-•])[ \t]*\n', re.MULTILINE)
+
+
+def normalize_layout(text):
+    return SPLIT_BULLET.sub(r'\1 ', SPLIT_VALUE.sub('', text))
+
+
+def extract_text(pdf_path, backend=None):
+    backend = backend or PDF_BACKEND
+    if backend not in PDF_BACKENDS:
+        raise ValueError(f"PDF backend {backend} is not supported. Choose one of: {', '.join(PDF_BACKENDS)}")
+    return normalize_layout(PDF_BACKENDS[backend](pdf_path))
+
+
+# Column -> label, or (label, section label) for labels repeated under each risk type
+FX_RISK_FIELDS = {
+    "Company": "Company:",
+    "Category": "Category:",
+    "Sub-Category": "Sub-Category:",
+    "Overall_Rating": "Overall FX Risk Rating",
+    "Hedging_Ratio": "Hedging Ratio",
+    "Best_Scenario_number": "Best-Case Scenario",
+    "Best_Scenario_text": "Best-Case Scenario Impact",
+    "Worst_Scenario_number": "Worst-Case Scenario",
+    "Worst_Scenario_text": "Worst-Case Scenario Impact",
+    "Likely_Scenario_number": "Most Likely Scenario",
+    "Likely_Scenario_text": "Most Likely Scenario Impact",
+    "Translational_Rating": "Translational Risk",
+    "Translational_Reason": ("Assessment", "Translational Risk"),
+    "Transactional_Rating": "Transactional Risk",
+    "Transactional_Reason": ("Assessment", "Transactional Risk"),
+    "Economic_Category": "Economic Risk",
+    "Economic_Reason": ("Assessment", "Economic Risk"),
+    "Distribution_of_Revenue_by_Currency": "Key Currencies Exposure",
+    "Hedging_Strategy_Type": "Hedging Ratio",
+    "Mitigation_Strategies": "Mitigation Strategies",
+    "FX_Sensitivity_Analysis": "Sensitivity Analysis",
+    "Industry_Benchmarking": "Industry Benchmarking",
+    "Historical_FX_Impact": "Historical Data Analysis",
+    "Real_Time_Data_Integration": "Real-Time Data Integration",
+}
+
+# Compiled once; every document is then scanned in a single pass
+FX_RISK_SCANNER = LabelScanner([spec if isinstance(spec, str) else spec[0] for spec in FX_RISK_FIELDS.values()],
+                               section_labels_of(FX_RISK_FIELDS))
+
+
+def parse_labelled_fields(text):
+    """
+    Field values read from the rest of each label's line (used by 6_compiled_document.py).
+    """
+    return resolve_fields(FX_RISK_SCANNER.scan(text), FX_RISK_FIELDS)
+
+
+# Column -> (compiled pattern, group). Patterns that span lines are bounded to MATCH_WINDOW
+# characters after their anchor rather than using DOTALL over the whole document.
+FX_RISK_PATTERNS = {
+    "Company": (re.compile(r'Company\s*:\s*([A-Za-z0-9\s]+)', re.IGNORECASE), 1),
+    "Overall_Rating": (re.compile(r'(Overall\s+FX\s+)?Risk\s+Rating\s*:\s*\n?\s*([A-Za-z]+)', re.IGNORECASE), 2),
+    "Hedging_Ratio": (re.compile(r'hedging\s+(coverage\s*(is\s*)?)?(applies|at|over|above|below)?\s*(approximately\s*)?'
+                                 r'([0-9]+%-[0-9]+%|[0-9]+%)', re.IGNORECASE), 5),
+    "Best_Scenario": (re.compile(r'Best[-\s]?Case\s*:\s*([^\n]+)', re.IGNORECASE), 1),
+    "Worst_Scenario": (re.compile(r'Worst[-\s]?Case\s*:\s*([^\n]+)', re.IGNORECASE), 1),
+    "Likely_Scenario": (re.compile(r'Most[-\s]?Likely\s*:\s*([^\n]+)', re.IGNORECASE), 1),
+    "Translational_Risk": (re.compile(r'Translational\s*Risk\s*[:\-\s]*\n?\s*(Falls under\s*)?([A-Za-z]+)\s*Risk',
+                                      re.IGNORECASE), 2),
+    "Transactional_Risk": (re.compile(r'Transactional\s*Risk\s*[:\-\s]*\n?[\s\S]{0,%d}?\b([A-Za-z]+\s+Risk)\b'
+                                      % MATCH_WINDOW, re.IGNORECASE), 1),
+    "Economic_Risk": (re.compile(r'Economic\s*Risk\s*:\s*([A-Za-z\s]+)', re.IGNORECASE), 1),
+    "Hedging_Strategy_Type": (re.compile(r'Hedging\s*(Strategies|Strategy)\s*(involves|using)?\s*([\w\s,]+)',
+                                         re.IGNORECASE), 3),
+    "Mitigation_Strategies": (re.compile(r'Mitigation\s*Strategies\s*:\s*([^\n]+)', re.IGNORECASE), 1),
+    "FX_Sensitivity_Analysis": (re.compile(r'Sensitivity\s*Analysis\s*:\s*([^\n]+)', re.IGNORECASE), 1),
+    "Industry_Benchmarking": (re.compile(r'Industry\s*Benchmarking\s*:\s*([^\n]+)', re.IGNORECASE), 1),
+    "Historical_FX_Impact": (re.compile(r'Historical\s*Data\s*Analysis\s*:\s*([^\n]+)', re.IGNORECASE), 1),
+    "Real_Time_Data_Integration": (re.compile(r'Real[-\s]?Time\s*Data\s*Integration\s*:\s*([^\n]+)',
+                                              re.IGNORECASE), 1),
+}
+
+# Column order of the CSV written by data_visualization.py
+PATTERN_COLUMNS = ["Company", "Overall_Rating", "Hedging_Ratio", "Best_Scenario", "Worst_Scenario", "Likely_Scenario",
+                   "Translational_Risk", "Transactional_Risk", "Economic_Risk", "Distribution_of_Revenue_by_Currency",
+                   "Hedging_Strategy_Type", "Mitigation_Strategies", "FX_Sensitivity_Analysis", "Industry_Benchmarking",
+                   "Historical_FX_Impact", "Real_Time_Data_Integration", "Additional_Currency_Exposures"]
+
+CURRENCY_DISTRIBUTION = re.compile(r'(EUR|JPY|GBP|CNH|AUD|USD|British Pound|Euro|Japanese Yen|Other currencies)'
+                                   r'\s*:\s*([0-9]+%)', re.IGNORECASE)
+
+
+def parse_pattern_fields(text):
+    """
+    Field values found by the regex table (used by data_visualization.py); "Unknown" when absent.
+    """
+    data = {}
+    for name, (pattern, group) in FX_RISK_PATTERNS.items():
+        match = pattern.search(text)
+        data[name] = match.group(group).strip() if match else "Unknown"
+    for name in ("Translational_Risk", "Transactional_Risk"):
+        if data[name] != "Unknown":
+            data[name] += " Risk"
+
+    distribution = CURRENCY_DISTRIBUTION.findall(text)
+    data["Distribution_of_Revenue_by_Currency"] = "; ".join(f"{currency}: {share}" for currency, share in distribution) or None
+    data["Additional_Currency_Exposures"] = None  # Placeholder, can be filled based on document specifics
+    return {column: data[column] for column in PATTERN_COLUMNS}
+
+
+def benchmark_parsing(pdf_paths, backends=tuple(PDF_BACKENDS)):
+    """
+    Mean text extraction and parse time per report for each backend.
+    """
+    results = []
+    for backend in backends:
+        row = {"backend": backend, "reports": len(pdf_paths)}
+        try:
+            extract_seconds = parse_seconds = 0.0
+            for pdf_path in pdf_paths:
+                started = time.perf_counter()
+                text = extract_text(pdf_path, backend)
+                extracted = time.perf_counter()
+                parse_labelled_fields(text)
+                parse_pattern_fields(text)
+                extract_seconds += extracted - started
+                parse_seconds += time.perf_counter() - extracted
+            row["extract_ms"] = round(1000 * extract_seconds / len(pdf_paths), 2)
+            row["parse_ms"] = round(1000 * parse_seconds / len(pdf_paths), 2)
+        except ImportError as e:
+            row["error"] = str(e)
+        results.append(row)
+        print(row)
+    return results
+
+
+if __name__ == "__main__":
+    # Usage: python report_parsing.py fx_risk_analysis_output
+    directory = sys.argv[1] if len(sys.argv) > 1 else "fx_risk_analysis_output"
+    paths = [os.path.join(root, file) for root, _, files in os.walk(directory) for file in files if file.endswith(".pdf")]
+    if not paths:
+        raise SystemExit(f"No PDF reports found under {directory}")
+    benchmark_parsing(paths)
@@ -0,0 +1,99 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+
+def make_cache_key(model, messages, generation_params=None):
+    """
+    Hashes everything that determines a completion: model, system and user messages
+    (the rendered prompt, including the exchange-rate snapshot) and generation parameters.
+    """
+    payload = json.dumps({"model": model, "messages": messages, "params": generation_params or {}},
+                         sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """
+    Persistent SQLite cache of LLM responses keyed by content hash.
+
+    Entries are evicted least-recently-used first once the cache holds more than
+    `max_entries` responses or `max_bytes` of response text.
+    """
+
+    def __init__(self, path="llm_response_cache.sqlite", max_entries=None, max_bytes=512 * 1024 * 1024):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.stats = {"hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                model TEXT,
+                content TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_access ON responses(last_access)")
+        self._conn.commit()
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute("SELECT content FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.stats["misses"] += 1
+                return None
+            self._conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+            self.stats["hits"] += 1
+            return row[0]
+
+    def put(self, key, content, model=None):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, model, content, size, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model, content, len(content.encode('utf-8')), now, now),
+            )
+            self.stats["writes"] += 1
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        count, total_size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        if (self.max_entries is None or count <= self.max_entries) and \
+                (self.max_bytes is None or total_size <= self.max_bytes):
+            return
+        rows = self._conn.execute("SELECT key, size FROM responses ORDER BY last_access ASC").fetchall()
+        for key, size in rows:
+            if (self.max_entries is None or count <= self.max_entries) and \
+                    (self.max_bytes is None or total_size <= self.max_bytes):
+                break
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            count -= 1
+            total_size -= size
+            self.stats["evictions"] += 1
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def summary(self):
+        lookups = self.stats["hits"] + self.stats["misses"]
+        hit_rate = self.stats["hits"] / lookups if lookups else 0.0
+        return f"Response cache: {self.stats['hits']} hits, {self.stats['misses']} misses " \
+               f"({hit_rate:.0%} hit rate), {self.stats['writes']} writes, {self.stats['evictions']} evictions"
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,132 @@
+import os
+import csv
+import json
+import time
+import threading
+import datetime
+import requests
+
+from chunking import count_tokens
+
+# Sent after the partial answer when resuming an interrupted generation
+CONTINUE_INSTRUCTION = "Continue exactly where you stopped. Do not repeat anything you have already written."
+
+METRICS_COLUMNS = ["Company", "Started", "Resumed", "TTFT_s", "Total_s", "Output_Tokens", "Tokens_per_s"]
+
+
+class StreamError(Exception):
+    """
+    The stream ended without a complete answer: no [DONE], a finish other than "stop"
+    (e.g. "length") or an unreadable chunk.
+    """
+
+
+def stream_chat_completion(api_base, api_key, model, messages, generation_params=None, session=None, timeout=300):
+    """
+    Yields content deltas from an OpenAI-compatible streaming chat completion (server-sent events).
+
+    Raises StreamError after the last delta unless the server sent [DONE] and the final
+    finish_reason was "stop", so a dropped connection or a truncated answer is never taken
+    for a finished one.
+    """
+    session = session or requests.Session()
+    payload = {"model": model, "messages": messages, "stream": True, **(generation_params or {})}
+    with session.post(f"{api_base.rstrip('/')}/chat/completions", json=payload, stream=True, timeout=timeout,
+                      headers={"Authorization": f"Bearer {api_key}"}) as response:
+        response.raise_for_status()
+        done, finish_reason = False, None
+        for line in response.iter_lines():
+            # Decoded here: requests only decodes when the server names a charset
+            line = line.decode('utf-8')
+            if not line.startswith("data:"):
+                continue
+            data = line[len("data:"):].strip()
+            if data == "[DONE]":
+                done = True
+                break
+            try:
+                choice = json.loads(data)["choices"][0]
+            except (ValueError, KeyError, IndexError, TypeError) as e:
+                raise StreamError(f"Malformed stream chunk {data[:200]!r}: {e!r}") from e
+            finish_reason = choice.get("finish_reason") or finish_reason
+            delta = choice.get("delta") or {}
+            if delta.get("content"):
+                yield delta["content"]
+    if not done:
+        raise StreamError("Stream closed before [DONE]")
+    if finish_reason != "stop":
+        raise StreamError(f"Stream finished with finish_reason={finish_reason!r}")
+
+
+class MetricsTable:
+    """
+    Appends one latency row per completion to a CSV file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def record(self, row):
+        with self._lock:
+            new_file = not os.path.exists(self.path)
+            with open(self.path, 'a', newline='', encoding='utf-8') as file:
+                writer = csv.DictWriter(file, fieldnames=METRICS_COLUMNS)
+                if new_file:
+                    writer.writeheader()
+                writer.writerow(row)
+
+
+def stream_to_file(messages, partial_path, api_base, api_key, model, company_name,
+                   metrics=None, generation_params=None, session=None, resume=True):
+    """
+    Streams a completion into partial_path as tokens arrive and returns the full text.
+
+    If partial_path already holds output from an interrupted run, the model is asked to
+    continue after it instead of regenerating. The partial file is removed on success and
+    kept when the stream fails (RequestException or StreamError), so the next run resumes
+    from it. With resume=False an old partial file is discarded and the answer regenerated,
+    for outputs such as JSON that cannot be stitched together from two responses.
+    """
+    previous = ""
+    if os.path.exists(partial_path):
+        if resume:
+            with open(partial_path, 'r', encoding='utf-8') as file:
+                previous = file.read()
+        else:
+            os.remove(partial_path)
+    if previous:
+        messages = messages + [{"role": "assistant", "content": previous},
+                               {"role": "user", "content": CONTINUE_INSTRUCTION}]
+
+    started_at = datetime.datetime.now().isoformat(timespec='seconds')
+    started = time.perf_counter()
+    first_token_at = None
+    pieces = []
+    with open(partial_path, 'a', encoding='utf-8') as file:
+        for delta in stream_chat_completion(api_base, api_key, model, messages, generation_params, session):
+            if first_token_at is None:
+                first_token_at = time.perf_counter()
+            pieces.append(delta)
+            file.write(delta)
+            file.flush()
+    finished = time.perf_counter()
+
+    generated = "".join(pieces)
+    content = previous + generated
+    os.remove(partial_path)
+
+    if metrics is not None:
+        output_tokens = count_tokens(generated, model)
+        ttft = (first_token_at or finished) - started
+        generation_time = finished - (first_token_at or finished)
+        metrics.record({
+            "Company": company_name,
+            "Started": started_at,
+            "Resumed": bool(previous),
+            "TTFT_s": round(ttft, 3),
+            "Total_s": round(finished - started, 3),
+            "Output_Tokens": output_tokens,
+            "Tokens_per_s": round(output_tokens / generation_time, 1) if generation_time > 0 else None,
+        })
+    return content
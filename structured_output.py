@@ -0,0 +1,298 @@
+import os
+import json
+
+# File names used in the analysis output folder
+RESULTS_TABLE_NAME = "fx_risk_results.parquet"
+JSON_SUFFIX = "_FX_Risk_Analysis.json"
+
+RATING = {"type": "string", "enum": ["Low", "Moderate", "High"]}
+TEXT = {"type": "string"}
+NULLABLE_NUMBER = {"type": ["number", "null"]}
+
+
+def _object(properties):
+    # Strict structured outputs require every property to be listed and no extras allowed
+    return {"type": "object", "properties": properties,
+            "required": list(properties), "additionalProperties": False}
+
+
+RISK_TYPE = _object({"category": RATING, "reason": TEXT})
+SCENARIO = _object({"impact_percent": NULLABLE_NUMBER, "description": TEXT})
+
+FX_ANALYSIS_SCHEMA = _object({
+    "company": TEXT,
+    "industry": TEXT,
+    "region": TEXT,
+    "overall_rating": RATING,
+    "executive_summary": TEXT,
+    "risk_types": _object({
+        "translational": RISK_TYPE,
+        "transactional": RISK_TYPE,
+        "economic": RISK_TYPE,
+    }),
+    "currency_distribution": {
+        "type": "array",
+        "items": _object({"currency": TEXT, "share_percent": NULLABLE_NUMBER, "impact": TEXT}),
+    },
+    "hedging": _object({
+        "ratio_percent": NULLABLE_NUMBER,
+        "strategy_type": {"type": "string", "enum": ["Basic", "Intermediate", "Advanced", "None"]},
+        "instruments": TEXT,
+        "effectiveness": TEXT,
+    }),
+    "scenarios": _object({
+        "best_case": SCENARIO,
+        "worst_case": SCENARIO,
+        "most_likely": SCENARIO,
+    }),
+    "sensitivity_analysis": TEXT,
+    "historical_fx_impact": TEXT,
+    "industry_benchmarking": TEXT,
+    "mitigation_strategies": TEXT,
+    "real_time_data_integration": TEXT,
+    "forecast": TEXT,
+})
+
+JSON_OUTPUT_INSTRUCTION = (
+    "Return the analysis as a single JSON object that follows the fx_risk_analysis schema. "
+    "Use plain text inside string fields and null for percentages the document does not support."
+)
+
+
+def response_format():
+    """
+    The response_format parameter that asks the API for schema-constrained JSON.
+    """
+    return {"type": "json_schema",
+            "json_schema": {"name": "fx_risk_analysis", "strict": True, "schema": FX_ANALYSIS_SCHEMA}}
+
+
+def _type_matches(value, expected):
+    checks = {
+        "object": lambda v: isinstance(v, dict),
+        "array": lambda v: isinstance(v, list),
+        "string": lambda v: isinstance(v, str),
+        "number": lambda v: isinstance(v, (int, float)) and not isinstance(v, bool),
+        "null": lambda v: v is None,
+    }
+    expected = expected if isinstance(expected, list) else [expected]
+    return any(checks[name](value) for name in expected)
+
+
+def _validate(value, schema, path, errors):
+    if not _type_matches(value, schema["type"]):
+        errors.append(f"{path}: expected {schema['type']}, got {type(value).__name__}")
+        return
+    if "enum" in schema and value not in schema["enum"]:
+        errors.append(f"{path}: {value!r} is not one of {schema['enum']}")
+    if isinstance(value, dict):
+        for key in schema.get("required", []):
+            if key not in value:
+                errors.append(f"{path}.{key}: missing")
+        for key, item in value.items():
+            if key in schema["properties"]:
+                _validate(item, schema["properties"][key], f"{path}.{key}", errors)
+            elif schema.get("additionalProperties") is False:
+                errors.append(f"{path}.{key}: unexpected field")
+    elif isinstance(value, list):
+        for index, item in enumerate(value):
+            _validate(item, schema["items"], f"{path}[{index}]", errors)
+
+
+def parse_analysis(content):
+    """
+    Parses and validates a JSON analysis; raises ValueError listing every schema violation.
+    """
+    try:
+        data = json.loads(content)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Response is not valid JSON: {e}")
+    errors = []
+    _validate(data, FX_ANALYSIS_SCHEMA, "$", errors)
+    if errors:
+        raise ValueError("Response does not match the FX analysis schema: " + "; ".join(errors))
+    return data
+
+
+def _percent(value):
+    return "Not stated" if value is None else f"{value:g}%"
+
+
+def analysis_to_markdown(data):
+    """
+    Renders the JSON analysis as the markdown the PDF and DOCX generators expect.
+    """
+    risk_types = data["risk_types"]
+    hedging = data["hedging"]
+    scenarios = data["scenarios"]
+    lines = [
+        "### Company Profile",
+        f"- **Company Name**: {data['company']}",
+        f"- **Industry**: {data['industry']}",
+        f"- **Region**: {data['region']}",
+        "",
+        "### Risk Rating",
+        f"**Overall FX Risk Rating**: {data['overall_rating']}",
+        f"- **Translational Risk**: {risk_types['translational']['category']}",
+        f"  - **Assessment**: {risk_types['translational']['reason']}",
+        f"- **Transactional Risk**: {risk_types['transactional']['category']}",
+        f"  - **Assessment**: {risk_types['transactional']['reason']}",
+        f"- **Economic Risk**: {risk_types['economic']['category']}",
+        f"  - **Assessment**: {risk_types['economic']['reason']}",
+        "",
+        "### Executive Summary",
+        data["executive_summary"],
+        "",
+        "### Key Currencies Exposure",
+    ]
+    for exposure in data["currency_distribution"]:
+        lines.append(f"- **{exposure['currency']}**: {_percent(exposure['share_percent'])} - {exposure['impact']}")
+    lines += [
+        "",
+        "### Hedging Strategies",
+        f"- **Hedging Ratio**: {_percent(hedging['ratio_percent'])}",
+        f"- **Hedging Strategy Type**: {hedging['strategy_type']}",
+        f"- **Instruments**: {hedging['instruments']}",
+        f"- **Effectiveness**: {hedging['effectiveness']}",
+        "",
+        "### Scenario Analysis",
+        f"- **Best-Case Scenario Impact**: {_percent(scenarios['best_case']['impact_percent'])} - {scenarios['best_case']['description']}",
+        f"- **Worst-Case Scenario Impact**: {_percent(scenarios['worst_case']['impact_percent'])} - {scenarios['worst_case']['description']}",
+        f"- **Most Likely Scenario Impact**: {_percent(scenarios['most_likely']['impact_percent'])} - {scenarios['most_likely']['description']}",
+        "",
+    ]
+    for title, key in [("Sensitivity Analysis", "sensitivity_analysis"),
+                       ("Historical Data Analysis", "historical_fx_impact"),
+                       ("Industry Benchmarking", "industry_benchmarking"),
+                       ("Mitigation Strategies", "mitigation_strategies"),
+                       ("Real-Time Data Integration", "real_time_data_integration"),
+                       ("Forecast and Projections", "forecast")]:
+        lines += [f"### {title}", data[key], ""]
+    return "\n".join(lines)
+
+
+def analysis_to_row(company_name, data):
+    """
+    Flattens the JSON analysis into one row of the results table; to_compiled_columns and
+    to_pattern_columns project the table onto the CSV layouts of the two compile scripts.
+    """
+    risk_types = data["risk_types"]
+    scenarios = data["scenarios"]
+    return {
+        "Company": company_name,
+        "Industry": data["industry"],
+        "Region": data["region"],
+        "Overall_Rating": data["overall_rating"],
+        "Hedging_Ratio": data["hedging"]["ratio_percent"],
+        "Hedging_Strategy_Type": data["hedging"]["strategy_type"],
+        "Hedging_Effectiveness": data["hedging"]["effectiveness"],
+        "Best_Scenario_number": scenarios["best_case"]["impact_percent"],
+        "Best_Scenario_text": scenarios["best_case"]["description"],
+        "Worst_Scenario_number": scenarios["worst_case"]["impact_percent"],
+        "Worst_Scenario_text": scenarios["worst_case"]["description"],
+        "Likely_Scenario_number": scenarios["most_likely"]["impact_percent"],
+        "Likely_Scenario_text": scenarios["most_likely"]["description"],
+        "Translational_Rating": risk_types["translational"]["category"],
+        "Translational_Reason": risk_types["translational"]["reason"],
+        "Transactional_Rating": risk_types["transactional"]["category"],
+        "Transactional_Reason": risk_types["transactional"]["reason"],
+        "Economic_Category": risk_types["economic"]["category"],
+        "Economic_Reason": risk_types["economic"]["reason"],
+        "Distribution_of_Revenue_by_Currency": "; ".join(
+            f"{exposure['currency']}: {_percent(exposure['share_percent'])}" for exposure in data["currency_distribution"]),
+        "Mitigation_Strategies": data["mitigation_strategies"],
+        "FX_Sensitivity_Analysis": data["sensitivity_analysis"],
+        "Industry_Benchmarking": data["industry_benchmarking"],
+        "Historical_FX_Impact": data["historical_fx_impact"],
+        "Real_Time_Data_Integration": data["real_time_data_integration"],
+    }
+
+
+def save_analysis_json(data, company_name, output_company_folder):
+    output_path = os.path.join(output_company_folder, f"{company_name}{JSON_SUFFIX}")
+    with open(output_path, 'w', encoding='utf-8') as file:
+        json.dump(data, file, indent=2, ensure_ascii=False)
+    return output_path
+
+
+def write_results_table(output_root_directory):
+    """
+    Collects every per-company JSON analysis under the output folder into one columnar table.
+    Writes Parquet when pyarrow is available and CSV otherwise; returns the table path.
+    """
+    import pandas as pd
+
+    rows = []
+    for root, _, files in os.walk(output_root_directory):
+        for file in sorted(files):
+            if file.endswith(JSON_SUFFIX):
+                with open(os.path.join(root, file), 'r', encoding='utf-8') as json_file:
+                    rows.append(analysis_to_row(file[:-len(JSON_SUFFIX)], json.load(json_file)))
+    if not rows:
+        return None
+
+    df = pd.DataFrame(rows)
+    table_path = os.path.join(output_root_directory, RESULTS_TABLE_NAME)
+    try:
+        df.to_parquet(table_path, index=False)
+    except ImportError:
+        table_path = table_path.replace(".parquet", ".csv")
+        df.to_csv(table_path, index=False)
+    print(f"Results table saved to {table_path}")
+    return table_path
+
+
+def load_results_table(output_root_directory):
+    """
+    Reads the results table written by write_results_table. Returns None if there is none, or if
+    any PDF report under the folder is newer than it (for example from a later markdown-mode run),
+    so callers parse the reports instead of serving a stale table.
+    """
+    import pandas as pd
+
+    parquet_path = os.path.join(output_root_directory, RESULTS_TABLE_NAME)
+    csv_path = parquet_path.replace(".parquet", ".csv")
+    table_path = next((path for path in (parquet_path, csv_path) if os.path.exists(path)), None)
+    if table_path is None:
+        return None
+    table_mtime = os.path.getmtime(table_path)
+    for root, _, files in os.walk(output_root_directory):
+        for file in files:
+            if file.endswith(".pdf") and os.path.getmtime(os.path.join(root, file)) > table_mtime:
+                return None
+    return pd.read_parquet(table_path) if table_path == parquet_path else pd.read_csv(table_path)
+
+
+def _optional_percent(value):
+    # Table cells come back from pandas as NaN rather than None
+    return _percent(None if value is None or value != value else value)
+
+
+def to_compiled_columns(table):
+    """
+    The results table in the column set 6_compiled_document.py writes from PDFs
+    (report_parsing.FX_RISK_FIELDS); fields the JSON schema has no counterpart for are not found.
+    """
+    from report_parsing import FX_RISK_FIELDS
+    from label_scanner import NOT_FOUND
+
+    return table.reindex(columns=list(FX_RISK_FIELDS), fill_value=NOT_FOUND)
+
+
+def to_pattern_columns(table):
+    """
+    The results table in the column set data_visualization.py writes from PDFs
+    (report_parsing.PATTERN_COLUMNS), with values shaped like the regex matches.
+    """
+    from report_parsing import PATTERN_COLUMNS
+
+    table = table.copy()
+    table["Hedging_Ratio"] = table["Hedging_Ratio"].map(_optional_percent)
+    for scenario in ("Best", "Worst", "Likely"):
+        table[f"{scenario}_Scenario"] = [f"{_optional_percent(number)} - {text}" for number, text in
+                                         zip(table[f"{scenario}_Scenario_number"], table[f"{scenario}_Scenario_text"])]
+    table["Translational_Risk"] = table["Translational_Rating"] + " Risk"
+    table["Transactional_Risk"] = table["Transactional_Rating"] + " Risk"
+    table["Economic_Risk"] = table["Economic_Category"]
+    table["Additional_Currency_Exposures"] = None
+    return table.reindex(columns=PATTERN_COLUMNS)
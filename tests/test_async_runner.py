@@ -0,0 +1,146 @@
+import json
+import time
+import asyncio
+import threading
+import email.utils
+from http.server import ThreadingHTTPServer
+
+from async_runner import AsyncAnalysisRunner, TokenBucket, parse_retry_after, run_analysis_jobs
+from mock_openai_server import MockOpenAIHandler, start_mock_server
+
+
+def make_jobs(count):
+    return [{"id": f"C{index}", "messages": [{"role": "user", "content": f"Company Name: C{index}"}]}
+            for index in range(count)]
+
+
+def run(server, jobs, on_result, **kwargs):
+    kwargs.setdefault("max_retries", 6)
+    kwargs.setdefault("base_delay", 0.01)
+    return run_analysis_jobs(jobs, on_result, api_base=f"http://127.0.0.1:{server.server_port}/v1",
+                             api_key="test", **kwargs)
+
+
+class Results:
+    def __init__(self):
+        self.items = {}
+        self.lock = threading.Lock()
+
+    def __call__(self, job, content, error):
+        with self.lock:
+            self.items[job["id"]] = (content, error)
+
+
+def test_429_responses_are_retried_until_every_job_completes():
+    server = start_mock_server(latency=0.01, failure_rate=0.5, retry_after="0.05")
+    try:
+        results = Results()
+        stats = run(server, make_jobs(12), results, max_in_flight=4, max_retries=20)
+    finally:
+        server.shutdown()
+    assert stats["completed"] == 12 and stats["failed"] == 0
+    assert stats["retries"] > 0
+    assert all(content and "FX Risk Analysis" in content and error is None
+               for content, error in results.items.values())
+
+
+def test_retries_exhausted_are_reported_per_job():
+    server = start_mock_server(latency=0.01, failure_rate=1.0, retry_after="0")
+    try:
+        results = Results()
+        stats = run(server, make_jobs(3), results, max_retries=2)
+    finally:
+        server.shutdown()
+    assert stats["failed"] == 3 and stats["retries"] == 6
+    assert all(content is None and error is not None for content, error in results.items.values())
+
+
+def test_http_date_and_malformed_retry_after_do_not_abort_the_run():
+    for retry_after in [email.utils.formatdate(time.time() + 0.2, usegmt=True), "soon"]:
+        server = start_mock_server(latency=0.01, failure_rate=0.5, retry_after=retry_after)
+        try:
+            results = Results()
+            stats = run(server, make_jobs(4), results, max_retries=20)
+        finally:
+            server.shutdown()
+        assert stats["completed"] == 4
+
+
+def test_parse_retry_after():
+    assert parse_retry_after("2") == 2.0
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("soon") is None
+    assert 0 < parse_retry_after(email.utils.formatdate(time.time() + 30, usegmt=True)) <= 30
+    assert parse_retry_after(email.utils.formatdate(time.time() - 30, usegmt=True)) == 0
+
+
+def test_backoff_is_capped_at_max_delay():
+    runner = AsyncAnalysisRunner("http://unused", "test", max_delay=5)
+    assert runner._backoff(0, retry_after=3600) == 5
+    assert all(0 <= runner._backoff(attempt) <= 5 for attempt in range(20))
+
+
+class MalformedHandler(MockOpenAIHandler):
+    # Answers C0 with a body that has no choices and everyone else with a normal completion
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+        if "C0" in request["messages"][0]["content"]:
+            self._send_json(200, {"unexpected": True})
+        else:
+            self._send_json(200, {"choices": [{"message": {"role": "assistant", "content": "ok"}}]})
+
+
+def test_malformed_body_fails_only_that_job():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), MalformedHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        results = Results()
+        stats = run(server, make_jobs(3), results)
+    finally:
+        server.shutdown()
+    assert stats["completed"] == 2 and stats["failed"] == 1
+    content, error = results.items["C0"]
+    assert content is None and isinstance(error, ValueError)
+
+
+def test_raising_result_handler_is_reported_as_a_job_failure():
+    server = start_mock_server(latency=0.01)
+    calls = []
+
+    def on_result(job, content, error):
+        calls.append((job["id"], content is not None, error))
+        if job["id"] == "C1" and content is not None:
+            raise OSError("disk full")
+
+    try:
+        stats = run(server, make_jobs(3), on_result)
+    finally:
+        server.shutdown()
+    assert stats["completed"] == 2 and stats["failed"] == 1 and stats["handler_errors"] == 1
+    failures = [call for call in calls if call[0] == "C1"]
+    assert failures[0][1] is True and failures[1][1] is False and isinstance(failures[1][2], OSError)
+
+
+def test_max_in_flight_bounds_concurrency():
+    server = start_mock_server(latency=0.2)
+    try:
+        started = time.monotonic()
+        stats = run(server, make_jobs(6), Results(), max_in_flight=2)
+        elapsed = time.monotonic() - started
+    finally:
+        server.shutdown()
+    assert stats["completed"] == 6
+    # Three rounds of two concurrent 0.2 s requests
+    assert elapsed >= 0.6
+
+
+def test_token_bucket_paces_requests_per_minute():
+    async def acquire_all():
+        bucket = TokenBucket(per_minute=600, capacity=1)
+        started = time.monotonic()
+        for _ in range(4):
+            await bucket.acquire()
+        return time.monotonic() - started
+
+    # One request immediately, then one every 0.1 s
+    assert asyncio.run(acquire_all()) >= 0.28
@@ -0,0 +1,84 @@
+import os
+import json
+
+from batch_api import load_state, reset_batch, run_batch
+
+
+def output_line(custom_id, content):
+    return {"custom_id": custom_id, "error": None,
+            "response": {"status_code": 200, "body": {"choices": [{"message": {"content": content}}]}}}
+
+
+def error_line(custom_id, message):
+    return {"custom_id": custom_id, "error": {"code": "server_error", "message": message}, "response": None}
+
+
+class FakeBatchClient:
+    """
+    Stands in for BatchClient: every batch completes on the first poll with canned result files.
+    """
+
+    def __init__(self, outputs, errors):
+        self.files = {"file-output": outputs, "file-error": errors}
+        self.uploads = []
+        self.created = []
+
+    def upload_file(self, path):
+        with open(path, 'r', encoding='utf-8') as file:
+            self.uploads.append([json.loads(line) for line in file])
+        return f"file-input-{len(self.uploads)}"
+
+    def create_batch(self, input_file_id):
+        self.created.append(input_file_id)
+        return {"id": f"batch-{len(self.created)}", "status": "validating"}
+
+    def get_batch(self, batch_id):
+        return {"id": batch_id, "status": "completed", "output_file_id": "file-output",
+                "error_file_id": "file-error", "request_counts": {}}
+
+    def download_file(self, file_id, path):
+        with open(path, 'w', encoding='utf-8') as file:
+            file.writelines(json.dumps(record) + "\n" for record in self.files[file_id])
+        return path
+
+
+def make_jobs(*ids):
+    return [{"id": custom_id, "messages": [{"role": "user", "content": custom_id}], "company_name": custom_id.upper()}
+            for custom_id in ids]
+
+
+def test_results_and_errors_are_ingested_and_a_rerun_does_not_resubmit(tmp_path):
+    client = FakeBatchClient([output_line("a", "report A")], [error_line("b", "model overloaded")])
+    results = []
+
+    def on_result(job, content, error):
+        results.append((job["id"], job["company_name"], content, error))
+
+    state = run_batch(make_jobs("a", "b"), str(tmp_path), client, "gpt-4o-mini", on_result, poll_interval=0)
+
+    assert sorted(results) == [("a", "A", "report A", None), ("b", "B", None, "model overloaded")]
+    assert state["status"] == "completed"
+    assert sorted(state["ingested"]) == ["a", "b"]
+    assert [line["custom_id"] for line in client.uploads[0]] == ["a", "b"]
+
+    run_batch(make_jobs("a", "b"), str(tmp_path), client, "gpt-4o-mini", on_result, poll_interval=0)
+    assert len(client.created) == 1
+    assert len(results) == 2
+
+
+def test_reset_batch_lets_the_next_run_submit_the_remaining_jobs(tmp_path):
+    client = FakeBatchClient([output_line("a", "report A")], [error_line("b", "model overloaded")])
+    run_batch(make_jobs("a", "b"), str(tmp_path), client, "gpt-4o-mini", lambda *_: None, poll_interval=0)
+    (tmp_path / "map").mkdir()
+
+    reset_batch(str(tmp_path))
+    assert load_state(os.path.join(tmp_path, "batch_state.json"))["batch_id"] is None
+    assert (tmp_path / "map").is_dir()
+
+    client.files = {"file-output": [output_line("b", "report B")], "file-error": []}
+    results = []
+    run_batch(make_jobs("b"), str(tmp_path), client, "gpt-4o-mini",
+              lambda job, content, error: results.append((job["id"], content, error)), poll_interval=0)
+    assert len(client.created) == 2
+    assert [line["custom_id"] for line in client.uploads[1]] == ["b"]
+    assert results == [("b", "report B", None)]
@@ -0,0 +1,129 @@
+import json
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from fx_rates import ExchangeRateProvider, HistoricalRateFile
+
+
+class RatesHandler(BaseHTTPRequestHandler):
+    """
+    Local stand-in for the exchange rate API: GET /<base> returns a fixed rate table.
+    """
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests.append(self.path)
+        time.sleep(server.latency)
+        if server.status != 200:
+            self.send_response(server.status)
+            self.end_headers()
+            return
+        body = json.dumps({"base": self.path.strip("/"), "date": "2024-08-01",
+                           "rates": {"USD": 1.0, "EUR": 0.9, "JPY": 150.0}}).encode('utf-8')
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_rates_server(latency=0.0, status=200):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), RatesHandler)
+    server.latency, server.status, server.requests, server.lock = latency, status, [], threading.Lock()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def make_provider(server, tmp_path, **kwargs):
+    # A plain session, so a failing stand-in is not retried
+    return ExchangeRateProvider(f"http://127.0.0.1:{server.server_port}", snapshot_dir=str(tmp_path / "snapshots"),
+                                session=requests.Session(), **kwargs)
+
+
+def test_repeated_lookups_are_served_from_the_cache(tmp_path):
+    server = start_rates_server()
+    try:
+        provider = make_provider(server, tmp_path)
+        assert provider.get_exchange_rates("USD", ["EUR", "GBP"]) == {"EUR": 0.9, "GBP": "N/A"}
+        assert provider.get_exchange_rates("USD", ["JPY"]) == {"JPY": 150.0}
+    finally:
+        server.shutdown()
+    assert server.requests == ["/USD"]
+    assert provider.stats["fetches"] == 1 and provider.stats["hits"] == 1
+    assert (tmp_path / "snapshots" / "USD_2024-08-01.json").exists()
+
+
+def test_concurrent_callers_share_one_fetch(tmp_path):
+    server = start_rates_server(latency=0.3)
+    try:
+        provider = make_provider(server, tmp_path)
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(provider.get_rates("USD"))) for _ in range(8)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+    finally:
+        server.shutdown()
+    assert server.requests == ["/USD"]
+    assert len(results) == 8 and all(rates["EUR"] == 0.9 for rates in results)
+    assert elapsed < 1.0
+
+
+def test_a_failed_base_currency_is_not_fetched_again(tmp_path):
+    server = start_rates_server(status=500)
+    try:
+        provider = make_provider(server, tmp_path)
+        assert provider.get_exchange_rates("USD", ["EUR"]) == {}
+        assert provider.get_exchange_rates("USD", ["EUR"]) == {}
+    finally:
+        server.shutdown()
+    assert server.requests == ["/USD"]
+    assert provider.stats["failures"] == 1
+
+
+def test_an_unwritable_snapshot_directory_does_not_stop_the_lookup(tmp_path):
+    (tmp_path / "snapshots").write_text("not a directory")
+    server = start_rates_server()
+    try:
+        provider = make_provider(server, tmp_path)
+        assert provider.get_exchange_rates("USD", ["EUR"]) == {"EUR": 0.9}
+    finally:
+        server.shutdown()
+
+
+def test_offline_lookups_use_the_latest_snapshot(tmp_path):
+    snapshots = tmp_path / "snapshots"
+    snapshots.mkdir()
+    for date, eur in [("2024-07-01", 0.8), ("2024-08-01", 0.9)]:
+        (snapshots / f"USD_{date}.json").write_text(json.dumps({"base": "USD", "date": date, "rates": {"EUR": eur}}))
+    provider = ExchangeRateProvider("http://127.0.0.1:9", snapshot_dir=str(snapshots), offline=True)
+    assert provider.get_exchange_rates("USD", ["EUR"]) == {"EUR": 0.9}
+    assert provider.stats["snapshot_loads"] == 1
+
+
+def test_historical_file_uses_the_table_of_the_requested_base(tmp_path):
+    path = tmp_path / "rates.csv"
+    path.write_text("date,base,currency,rate\n"
+                    "2024-07-01,USD,EUR,0.8\n"
+                    "2024-08-01,USD,EUR,0.9\n"
+                    "2024-08-01,USD,GBP,0.75\n"
+                    "2024-09-01,EUR,USD,1.2\n")
+    rates = HistoricalRateFile(str(path))
+    assert rates.get_exchange_rates("USD", ["EUR", "GBP"]) == {"EUR": 0.9, "GBP": 0.75}
+    assert rates.get_exchange_rates("EUR", ["USD"]) == {"USD": 1.2}
+    # GBP has no table of its own; it is derived from the latest table quoting it
+    assert rates.get_rates("GBP")["USD"] == 1 / 0.75
+
+    as_of = HistoricalRateFile(str(path), as_of="2024-07-15")
+    assert as_of.get_exchange_rates("USD", ["EUR"]) == {"EUR": 0.8}
+    assert as_of.get_exchange_rates("CHF", ["USD"]) == {}
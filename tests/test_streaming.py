@@ -0,0 +1,93 @@
+import io
+import json
+import threading
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+from mock_openai_server import MOCK_ANALYSIS, MockOpenAIHandler
+from streaming import CONTINUE_INSTRUCTION, MetricsTable, StreamError, stream_chat_completion, stream_to_file
+
+MESSAGES = [{"role": "user", "content": "Company Name: ACME"}]
+EXPECTED = MOCK_ANALYSIS.format(company="ACME")
+
+
+class RecordingHandler(MockOpenAIHandler):
+    # Keeps every request body so tests can check what was sent
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self.server.bodies.append(json.loads(body))
+        self.rfile = io.BytesIO(body)
+        super().do_POST()
+
+
+class CutOffHandler(MockOpenAIHandler):
+    # Sends the first few words and closes the connection without a finish_reason or [DONE]
+    def _send_stream(self, content):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        for word in content.split(" ")[:3]:
+            chunk = {"choices": [{"index": 0, "delta": {"content": word + " "}, "finish_reason": None}]}
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode('utf-8'))
+        self.wfile.flush()
+        self.close_connection = True
+
+
+def start(handler):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.latency, server.failure_rate, server.token_delay, server.request_count = 0.0, 0.0, 0.0, 0
+    server.bodies = []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}/v1"
+
+
+def test_complete_stream_yields_the_whole_answer():
+    server, api_base = start(RecordingHandler)
+    try:
+        pieces = list(stream_chat_completion(api_base, "test", "mock", MESSAGES))
+    finally:
+        server.shutdown()
+    assert "".join(pieces).strip() == EXPECTED.strip()
+    assert server.bodies[0]["stream"] is True
+
+
+def test_stream_cut_off_before_done_raises_and_keeps_the_partial_file(tmp_path):
+    server, api_base = start(CutOffHandler)
+    partial_path = tmp_path / "ACME.partial.md"
+    try:
+        with pytest.raises(StreamError):
+            list(stream_chat_completion(api_base, "test", "mock", MESSAGES))
+        with pytest.raises(StreamError):
+            stream_to_file(MESSAGES, str(partial_path), api_base, "test", "mock", "ACME")
+    finally:
+        server.shutdown()
+    assert partial_path.read_text(encoding='utf-8') == " ".join(EXPECTED.split(" ")[:3]) + " "
+
+
+def test_resume_sends_the_partial_answer_and_joins_the_output(tmp_path):
+    server, api_base = start(RecordingHandler)
+    partial_path = tmp_path / "ACME.partial.md"
+    partial_path.write_text("Earlier output. ", encoding='utf-8')
+    metrics = MetricsTable(str(tmp_path / "metrics.csv"))
+    try:
+        content = stream_to_file(MESSAGES, str(partial_path), api_base, "test", "mock", "ACME", metrics)
+    finally:
+        server.shutdown()
+    assert content == "Earlier output. " + "".join(word + " " for word in EXPECTED.split(" "))
+    assert server.bodies[0]["messages"][-2:] == [{"role": "assistant", "content": "Earlier output. "},
+                                                 {"role": "user", "content": CONTINUE_INSTRUCTION}]
+    assert not partial_path.exists()
+    assert "True" in (tmp_path / "metrics.csv").read_text(encoding='utf-8')
+
+
+def test_resume_false_discards_the_partial_answer(tmp_path):
+    server, api_base = start(RecordingHandler)
+    partial_path = tmp_path / "ACME.partial.json"
+    partial_path.write_text('{"company": "AC', encoding='utf-8')
+    try:
+        content = stream_to_file(MESSAGES, str(partial_path), api_base, "test", "mock", "ACME", resume=False)
+    finally:
+        server.shutdown()
+    assert content.strip() == EXPECTED.strip()
+    assert server.bodies[0]["messages"] == MESSAGES